@@ -8,6 +8,10 @@ admin.site.register(Program)
 admin.site.register(Admission)
 admin.site.register(Exam)
 admin.site.register(LearningSupportCenter)
+admin.site.register(RegionalCenter)
 admin.site.register(Faq)
 admin.site.register(NewsUpdate)
-admin.site.register(Feedback)
\ No newline at end of file
+admin.site.register(Feedback)
+admin.site.register(UpstreamSync)
+admin.site.register(CachedCompletion)
+admin.site.register(ModelVersion)
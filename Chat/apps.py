@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class ChatConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'Chat'
+
+    def ready(self):
+        from . import feeds, model_versions
+        model_versions.connect_signals()
+        feeds.restore_snapshots()
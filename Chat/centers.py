@@ -0,0 +1,125 @@
+from collections import defaultdict
+
+from .feeds import centers_snapshot, lsc_snapshot
+
+
+def clean_rc_name(rc_name):
+    """Normalize special characters like '–', non-breaking spaces and the Unicode replacement character."""
+    return rc_name.replace('–', '-').replace('\xa0', ' ').replace('\ufffd', '-').strip()
+
+
+def rc_short_name(rc_name):
+    """'REGIONAL CENTRE - ERNAKULAM' -> 'ernakulam', the part users type after 'lsc under'."""
+    cleaned = rc_name.replace('–', '-').replace('—', '-').replace('\xa0', ' ')
+    if '-' in cleaned:
+        return cleaned.split('-')[-1].strip().lower()
+    return cleaned.strip().lower()
+
+
+def lsc_rc_id(lsc):
+    """The LSC's regional center id as an int, or None."""
+    rc_id = lsc.get("lscrc")
+    if isinstance(rc_id, str) and rc_id.isdigit():
+        return int(rc_id)
+    if isinstance(rc_id, int):
+        return rc_id
+    return None
+
+
+def center_display_fields(center):
+    """Display fields of one regional center, or None if it has no usable name."""
+    # Try different possible field names
+    name = (center.get('rcname') or
+            center.get('name') or
+            center.get('center_name') or
+            'Unknown Center')
+    address = (center.get('rcaddress') or
+               center.get('address') or
+               center.get('center_address') or
+               'N/A')
+    headname = (center.get('headname') or
+                center.get('director_name') or
+                center.get('head_name') or
+                'N/A')
+    headnumber = (center.get('headnumber') or
+                  center.get('director_phone') or
+                  center.get('phone') or
+                  center.get('contact_number') or
+                  'N/A')
+    headmail = (center.get('headmail') or
+                center.get('director_email') or
+                center.get('email') or
+                center.get('contact_email') or
+                'N/A')
+
+    # Only include centers with a known name
+    if name == 'Unknown Center' or name == 'N/A':
+        return None
+    return {"name": name, "address": address, "director": headname, "phone": headnumber, "email": headmail}
+
+
+def format_center_html(center):
+    """Dropdown HTML for one regional center, or None if it has no usable name."""
+    fields = center_display_fields(center)
+    if fields is None:
+        return None
+    return f"""
+<div class="rc-item">
+  <div class="rc-header" onclick="toggleDropdown(this)">
+    <span class="rc-title">{fields['name']}</span>
+    <span class="rc-arrow">&#9660;</span>
+  </div>
+  <div class="rc-details" style="display: none; margin-top: 5px;">
+    <strong>Address:</strong> {fields['address']}<br>
+    <strong>RC Director:</strong> {fields['director']}<br>
+    <strong>Number:</strong> {fields['phone']}<br>
+    <strong>Email:</strong> <a href='mailto:{fields['email']}' style='color: #0066cc;'>{fields['email']}</a>
+  </div>
+</div>
+"""
+
+
+class CenterDirectory:
+    """Regional centers, normalized once per centers snapshot version."""
+
+    def __init__(self, centers):
+        self.raw_centers = centers
+        self.formatted_centers = []
+        self.rc_name_mapping = {}
+        self.rc_id_by_short_name = {}
+        for center in centers:
+            center_html = format_center_html(center)
+            if center_html:
+                self.formatted_centers.append(center_html)
+
+            rc_id = center.get("id")
+            rc_name = (
+                center.get("rcname")
+                or center.get("name")
+                or center.get("center_name")
+            )
+            if rc_id and rc_name:
+                rc_name = clean_rc_name(rc_name)
+                self.rc_name_mapping[rc_id] = rc_name
+                self.rc_id_by_short_name.setdefault(rc_short_name(rc_name), rc_id)
+
+    def find_rc_id(self, regional_center_name):
+        return self.rc_id_by_short_name.get(regional_center_name.strip().lower())
+
+
+class LscDirectory:
+    """Learning support centers grouped by regional center id, built once per LSC snapshot version."""
+
+    def __init__(self, lscs):
+        self.lscs = lscs
+        self.by_rc_id = defaultdict(list)
+        for lsc in lscs:
+            self.by_rc_id[lsc_rc_id(lsc)].append(lsc)
+
+
+def get_center_directory():
+    return centers_snapshot.derive(CenterDirectory)
+
+
+def get_lsc_directory():
+    return lsc_snapshot.derive(LscDirectory)
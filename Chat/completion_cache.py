@@ -0,0 +1,120 @@
+"""
+Persistent cache of Groq completions.
+
+call_groq_api hashes the model, messages and request parameters into a
+key and looks the completion up in the CachedCompletion table before
+calling Groq, so an identical prompt costs one database read instead of
+an LLM round trip, across restarts and across workers.
+
+With CHAT_COMPLETION_CACHE_NEAR_DUPLICATES on, a miss on the exact key
+falls back to any live entry for the same model whose normalized user
+query (lower-cased, punctuation stripped, whitespace collapsed) matches,
+so "What is SGOU?" and "what is sgou" share an answer.
+
+Entries expire after CHAT_COMPLETION_CACHE_TTL seconds and the table is
+kept under CHAT_COMPLETION_CACHE_MAX_ENTRIES by evicting the least
+recently used rows. Database errors are logged and treated as a miss;
+the cache never stands between a user and an answer.
+"""
+import hashlib
+import json
+import logging
+import re
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DatabaseError
+from django.db.models import F
+from django.utils import timezone
+
+from . import metrics
+from .models import CachedCompletion
+
+logger = logging.getLogger("chatbot")
+
+_PUNCTUATION = re.compile(r"[^\w\s]")
+
+
+def enabled():
+    return getattr(settings, "CHAT_COMPLETION_CACHE_ENABLED", True)
+
+
+def near_duplicates_enabled():
+    return getattr(settings, "CHAT_COMPLETION_CACHE_NEAR_DUPLICATES", False)
+
+
+def ttl():
+    return getattr(settings, "CHAT_COMPLETION_CACHE_TTL", 24 * 60 * 60)
+
+
+def max_entries():
+    return getattr(settings, "CHAT_COMPLETION_CACHE_MAX_ENTRIES", 5000)
+
+
+def completion_key(body):
+    """SHA-256 of a Groq request body: model, messages and every sampling parameter."""
+    canonical = json.dumps(body, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def normalize(query):
+    if not query:
+        return ""
+    text = _PUNCTUATION.sub(" ", query.lower())
+    return " ".join(text.split())[:CachedCompletion._meta.get_field("normalized_query").max_length]
+
+
+def lookup(body, user_query=None):
+    """Return the cached completion for a request body, or None."""
+    if not enabled():
+        return None
+    now = timezone.now()
+    try:
+        live = CachedCompletion.objects.filter(expires_at__gt=now)
+        entry = live.filter(key=completion_key(body)).first()
+        if entry is None and near_duplicates_enabled() and normalize(user_query):
+            entry = (
+                live.filter(model=body.get("model", ""), normalized_query=normalize(user_query))
+                .order_by("-last_used_at")
+                .first()
+            )
+        metrics.record_cache_lookup("completion", entry is not None)
+        if entry is None:
+            return None
+        CachedCompletion.objects.filter(pk=entry.pk).update(hits=F("hits") + 1, last_used_at=now)
+        return entry.response
+    except DatabaseError as e:
+        logger.warning("Completion cache lookup failed: %s", e)
+        return None
+
+
+def store(body, response, user_query=None):
+    """Cache a completion, then evict expired and least recently used entries past the size bound."""
+    if not enabled():
+        return
+    now = timezone.now()
+    try:
+        CachedCompletion.objects.update_or_create(
+            key=completion_key(body),
+            defaults={
+                "model": body.get("model", ""),
+                "normalized_query": normalize(user_query),
+                "response": response,
+                "last_used_at": now,
+                "expires_at": now + timedelta(seconds=ttl()),
+            },
+        )
+        evict(now)
+    except DatabaseError as e:
+        logger.warning("Storing a completion in the cache failed: %s", e)
+
+
+def evict(now=None):
+    """Delete expired entries and trim the table to max_entries(). Returns the number of rows deleted."""
+    now = now or timezone.now()
+    deleted, _ = CachedCompletion.objects.filter(expires_at__lte=now).delete()
+    overflow = CachedCompletion.objects.count() - max_entries()
+    if overflow > 0:
+        oldest = list(CachedCompletion.objects.order_by("last_used_at").values_list("pk", flat=True)[:overflow])
+        deleted += CachedCompletion.objects.filter(pk__in=oldest).delete()[0]
+    return deleted
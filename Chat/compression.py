@@ -0,0 +1,124 @@
+"""
+Content-Encoding negotiation for process_query answers.
+
+Listing answers are large and repetitive, so they compress very well.
+compress_response() picks brotli or gzip from the request's
+Accept-Encoding header and compresses complete answers of at least
+CHAT_COMPRESSION_MIN_BYTES. Pre-rendered fragments carry an EncodedBody,
+which compresses once per encoding and keeps the result, so repeated
+listings cost no compression CPU at all.
+
+brotli is optional; without it only gzip is offered.
+"""
+import functools
+import gzip
+import re
+import threading
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip is always available
+    brotli = None
+
+COMPRESSIBLE_TYPES = ("application/json", "text/event-stream")
+
+_CODING = re.compile(r"\s*([\w*-]+)\s*(?:;\s*q\s*=\s*([0-9.]+))?\s*")
+
+
+def is_enabled():
+    return getattr(settings, "CHAT_RESPONSE_COMPRESSION", True)
+
+
+def min_bytes():
+    return getattr(settings, "CHAT_COMPRESSION_MIN_BYTES", 1024)
+
+
+def available_encodings():
+    """Encodings the server can produce, best first."""
+    return ("br", "gzip") if brotli is not None else ("gzip",)
+
+
+def negotiate(accept_encoding):
+    """The best encoding the client accepts (q > 0), or None for identity."""
+    accepted = {}
+    for part in (accept_encoding or "").split(","):
+        match = _CODING.fullmatch(part)
+        if not match:
+            continue
+        try:
+            accepted[match.group(1).lower()] = float(match.group(2) or 1)
+        except ValueError:
+            continue
+    for encoding in available_encodings():
+        if accepted.get(encoding, accepted.get("*", 0)) > 0:
+            return encoding
+    return None
+
+
+def encode(data, encoding):
+    if encoding == "br":
+        return brotli.compress(data, quality=getattr(settings, "CHAT_BROTLI_QUALITY", 5))
+    return gzip.compress(data, compresslevel=getattr(settings, "CHAT_GZIP_LEVEL", 6), mtime=0)
+
+
+class EncodedBody:
+    """A response body with its compressed forms, each built on first use."""
+
+    def __init__(self, data):
+        self.data = data
+        self._encoded = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.data)
+
+    def encoded(self, encoding):
+        cached = self._encoded.get(encoding)
+        if cached is None:
+            with self._lock:
+                cached = self._encoded.get(encoding)
+                if cached is None:
+                    cached = self._encoded[encoding] = encode(self.data, encoding)
+        return cached
+
+
+def compress_response(view):
+    """
+    Compress complete JSON and event-stream answers for clients that accept
+    it; streaming responses are left alone. Nested use is a no-op, so a view
+    can call another decorated view and compress the final response once.
+    """
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if getattr(request, "compression_negotiated", False):
+            return view(request, *args, **kwargs)
+        request.compression_negotiated = True
+        return compress(request, view(request, *args, **kwargs))
+    return wrapper
+
+
+def compress(request, response):
+    """Compress a complete response in place, if it is worth it and the client accepts it."""
+    if (
+        not is_enabled()
+        or response.streaming
+        or response.has_header("Content-Encoding")
+        or not response.get("Content-Type", "").startswith(COMPRESSIBLE_TYPES)
+    ):
+        return response
+
+    patch_vary_headers(response, ("Accept-Encoding",))
+    if len(response.content) < min_bytes():
+        return response
+    encoding = negotiate(request.META.get("HTTP_ACCEPT_ENCODING"))
+    if encoding is None:
+        return response
+
+    body = getattr(response, "encoded_body", None)
+    response.content = body.encoded(encoding) if body is not None else encode(response.content, encoding)
+    response["Content-Encoding"] = encoding
+    response["Content-Length"] = str(len(response.content))
+    return response
@@ -0,0 +1,160 @@
+"""
+Conversation state for the chat flow.
+
+process_query remembers two things between messages: whether it asked
+for a program name (the pending intent) and the last numbered program
+list. Both used to live in the database-backed Django session, which
+meant a django_session read, and often a write, on nearly every chat
+message, and SQLite serializes those writes.
+
+They now live in a ConversationState kept in the CHAT_STATE_CACHE cache
+(an in-process LRU by default) under a random conversation id carried in
+the CHAT_STATE_COOKIE cookie. Entries expire CHAT_STATE_TTL seconds after
+the last change. The numbered list is stored as the programme snapshot
+version plus one short reference per program (its upstream id, or its
+name when it has none). A numeric follow-up resolves the reference
+against the shared programme snapshot, so a feed refresh between the two
+messages still finds the program as long as it has not been removed.
+"""
+import functools
+import re
+import secrets
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .feeds import programme_snapshot
+
+# Pending intents
+FEE_PROGRAM = "fee_program"
+
+_CONVERSATION_ID = re.compile(r"^[A-Za-z0-9_-]{16,64}$")
+
+
+def state_cache():
+    return caches[getattr(settings, "CHAT_STATE_CACHE", "chat_state")]
+
+
+def cookie_name():
+    return getattr(settings, "CHAT_STATE_COOKIE", "sgou_chat")
+
+
+def state_ttl():
+    return getattr(settings, "CHAT_STATE_TTL", 24 * 60 * 60)
+
+
+class ConversationState:
+    """What the chat flow remembers between the messages of one conversation."""
+
+    FIELDS = ("pending_intent", "last_list", "created_at", "updated_at")
+    __slots__ = FIELDS + ("changed", "touched")
+
+    def __init__(self, pending_intent=None, last_list=None, created_at=None, updated_at=None):
+        now = time.time()
+        self.pending_intent = pending_intent
+        self.last_list = last_list
+        self.created_at = created_at or now
+        self.updated_at = updated_at or now
+        self.changed = False
+        self.touched = set()  # fields passed to update(), changed or not
+
+    def update(self, **fields):
+        for name, value in fields.items():
+            self.touched.add(name)
+            if getattr(self, name) != value:
+                setattr(self, name, value)
+                self.changed = True
+        if self.changed:
+            self.updated_at = time.time()
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.FIELDS}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**{name: data.get(name) for name in cls.FIELDS})
+
+
+def load_state(conversation_id):
+    data = state_cache().get(f"chat:{conversation_id}") if conversation_id else None
+    return ConversationState.from_dict(data) if data else ConversationState()
+
+
+def save_state(conversation_id, state):
+    state_cache().set(f"chat:{conversation_id}", state.to_dict(), state_ttl())
+    state.changed = False
+
+
+def with_conversation_state(view):
+    """
+    Give the view `request.chat_state`, and store it (setting the cookie
+    for new conversations) if the view changed it. Nested use is a no-op,
+    so a view can call another decorated view.
+    """
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if hasattr(request, "chat_state"):
+            return view(request, *args, **kwargs)
+
+        conversation_id = request.COOKIES.get(cookie_name(), "")
+        if not _CONVERSATION_ID.match(conversation_id):
+            conversation_id = None
+        request.chat_state = load_state(conversation_id)
+
+        response = view(request, *args, **kwargs)
+
+        if request.chat_state.changed:
+            if conversation_id is None:
+                conversation_id = secrets.token_urlsafe(16)
+                response.set_cookie(
+                    cookie_name(), conversation_id, max_age=state_ttl(),
+                    httponly=True, samesite="Lax", secure=request.is_secure(),
+                )
+            save_state(conversation_id, request.chat_state)
+        return response
+    return wrapper
+
+
+def program_ref(program):
+    program_id = program.get("id")
+    if program_id not in (None, ""):
+        return str(program_id)
+    return "name:" + program.get("pgm_name", "")
+
+
+class ProgrammeLookup:
+    """Programs by reference, built once per programme snapshot version."""
+
+    def __init__(self, programs):
+        self.by_ref = {}
+        for program in programs:
+            self.by_ref.setdefault(program_ref(program), program)
+
+
+def remember_programs(state, programs):
+    """Store a numbered program list in the conversation."""
+    state.update(last_list={
+        "version": programme_snapshot.version,
+        "refs": [program_ref(program) for program in programs],
+    })
+
+
+def listed_program_count(state):
+    return len((state.last_list or {}).get("refs", []))
+
+
+def recall_program(state, number):
+    """
+    The program listed under `number` (1-based) in the conversation's last
+    list, or None if there is no such entry or the program is no longer offered.
+    """
+    refs = (state.last_list or {}).get("refs", [])
+    index = number - 1
+    if not 0 <= index < len(refs):
+        return None
+    return programme_snapshot.derive(ProgrammeLookup).by_ref.get(refs[index])
+
+
+def forget_programs(state):
+    state.update(last_list=None)
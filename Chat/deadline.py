@@ -0,0 +1,216 @@
+"""
+Per-request time budget for chat messages.
+
+with_deadline() gives each chat request CHAT_REQUEST_BUDGET seconds.
+Every upstream call made while it runs (feed fetches, Groq) gets the
+smaller of its usual timeout and the budget left, less
+CHAT_DEADLINE_RESERVE for building the answer, and is neither made nor
+retried once less than CHAT_UPSTREAM_MIN_BUDGET of that is left: it
+raises DeadlineExceeded, a requests Timeout, so each caller falls back
+as it does on a slow upstream (last-known-good or persisted feed data,
+the completion cache, an apology). A call that times out only because
+the budget shortened its timeout raises DeadlineExceeded too, so one
+request running out of time is not taken for an upstream failure.
+
+Optional stages ask allows() first and are skipped when less than their
+CHAT_OPTIONAL_STAGE_BUDGET entry is left: a cold QnA lookup before the
+rest of the query is answered, and the Groq call.
+
+Each request's outcome is counted in chat_deadline_outcomes_total and
+logged with its trace: "met", "degraded" (a stage was skipped, or an
+upstream call skipped or cut short by the budget) or "exceeded" (the
+answer was ready only after the deadline). Streamed Groq answers are
+sent after the view returns: the Groq call gets the budget left when
+the stream is handed back as its timeout.
+"""
+import contextlib
+import contextvars
+import functools
+import time
+
+import requests
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from . import metrics, tracing
+
+_current = contextvars.ContextVar("chat_deadline", default=None)
+
+DEFAULT_STAGE_BUDGETS = {"qna": 2, "llm": 5}
+
+
+class DeadlineExceeded(requests.exceptions.Timeout):
+    """Too little of the request's time budget was left for an upstream call."""
+
+
+class Deadline:
+    def __init__(self, budget):
+        self.budget = budget
+        self.expires = time.monotonic() + budget
+        self.skipped = []
+
+    def remaining(self):
+        return max(0.0, self.expires - time.monotonic())
+
+    def for_upstream(self):
+        """The budget upstream calls may use: what is left, less the reserve for answering."""
+        return max(0.0, self.remaining() - answer_reserve())
+
+    @property
+    def expired(self):
+        return time.monotonic() >= self.expires
+
+    def skip(self, stage):
+        self.skipped.append(stage)
+        metrics.deadline_skips.inc(stage=stage)
+
+    def outcome(self):
+        if self.expired:
+            return "exceeded"
+        return "degraded" if self.skipped else "met"
+
+
+def request_budget():
+    return getattr(settings, "CHAT_REQUEST_BUDGET", 20)
+
+
+def upstream_min_budget():
+    return getattr(settings, "CHAT_UPSTREAM_MIN_BUDGET", 0.5)
+
+
+def answer_reserve():
+    return getattr(settings, "CHAT_DEADLINE_RESERVE", 0.25)
+
+
+def stage_budget(stage):
+    return {**DEFAULT_STAGE_BUDGETS, **getattr(settings, "CHAT_OPTIONAL_STAGE_BUDGET", {})}.get(stage, 0)
+
+
+def current():
+    """The deadline of the request being handled, or None."""
+    return _current.get()
+
+
+@contextlib.contextmanager
+def running(budget):
+    """Run the enclosed block under a Deadline of `budget` seconds."""
+    deadline = Deadline(budget)
+    token = _current.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current.reset(token)
+
+
+@contextlib.contextmanager
+def detached():
+    """Run the enclosed block outside the current request's deadline."""
+    token = _current.set(None)
+    try:
+        yield
+    finally:
+        _current.reset(token)
+
+
+def cap(seconds):
+    """`seconds`, or the budget left for upstream calls if that is less. None means no limit."""
+    deadline = _current.get()
+    if deadline is None:
+        return seconds
+    remaining = deadline.for_upstream()
+    return remaining if seconds is None else min(seconds, remaining)
+
+
+def upstream_timeout(endpoint, timeout):
+    """
+    The timeout for a call to `endpoint` that normally gets `timeout`
+    seconds. Raises DeadlineExceeded when too little budget is left to
+    make the call.
+    """
+    deadline = _current.get()
+    if deadline is None:
+        return timeout
+    remaining = deadline.for_upstream()
+    if remaining < upstream_min_budget():
+        deadline.skip(f"upstream.{endpoint}")
+        raise DeadlineExceeded(f"{remaining:.2f}s of the request budget left; not calling {endpoint}")
+    return min(timeout, remaining)
+
+
+def allows_retry():
+    """Whether a failed upstream call may be retried in the budget left."""
+    deadline = _current.get()
+    return deadline is None or deadline.for_upstream() >= upstream_min_budget()
+
+
+def timed_out(endpoint, timeout, usual):
+    """
+    Note an upstream call that timed out after `timeout` seconds where it
+    usually gets `usual`. If the budget had cut it short, the request is
+    degraded and the DeadlineExceeded to raise instead is returned, so the
+    timeout is not taken for a slow upstream; otherwise None.
+    """
+    deadline = _current.get()
+    if deadline is None or timeout >= usual:
+        return None
+    deadline.skip(f"upstream.{endpoint}")
+    return DeadlineExceeded(f"{endpoint} did not answer in the {timeout:.2f}s of request budget left")
+
+
+def allows(stage):
+    """Whether enough budget is left for an optional stage. A stage that is not is counted as skipped."""
+    deadline = _current.get()
+    if deadline is None or deadline.remaining() >= stage_budget(stage):
+        return True
+    deadline.skip(stage)
+    return False
+
+
+def _start(request):
+    budget = request_budget()
+    if getattr(request, "deadline", None) is not None or budget is None:
+        return None
+    request.deadline = Deadline(budget)
+    return request.deadline
+
+
+def _finish(deadline):
+    outcome = deadline.outcome()
+    metrics.deadline_outcomes.inc(outcome=outcome)
+    trace = tracing.current()
+    if trace is not None:
+        trace.deadline = outcome
+
+
+def with_deadline(view):
+    """
+    Run the view under the request's time budget and count its outcome.
+    Nested use is a no-op, like trace_request, so the budget starts at the
+    outermost view. Works on async views; the deadline follows the view
+    into sync_to_async threads.
+    """
+    if iscoroutinefunction(view):
+        async def async_wrapper(request, *args, **kwargs):
+            deadline = _start(request)
+            if deadline is None:
+                return await view(request, *args, **kwargs)
+            token = _current.set(deadline)
+            try:
+                return await view(request, *args, **kwargs)
+            finally:
+                _current.reset(token)
+                _finish(deadline)
+        return markcoroutinefunction(functools.wraps(view)(async_wrapper))
+
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        deadline = _start(request)
+        if deadline is None:
+            return view(request, *args, **kwargs)
+        token = _current.set(deadline)
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            _current.reset(token)
+            _finish(deadline)
+    return wrapper
@@ -0,0 +1,523 @@
+import asyncio
+import contextlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+
+import requests
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from dotenv import load_dotenv
+
+from . import metrics, shared_snapshot
+from .deadline import DeadlineExceeded
+from .tracing import mark_stale
+from .upstream import CoalescedWaitTimeout, async_client as async_upstream, client as upstream
+
+load_dotenv()
+
+# Upstream SGOU feeds
+UNIVERSITY_API_URL = os.getenv("UNIVERSITY_API_URL")
+UNIVERSITY_API_KEY = os.getenv("UNIVERSITY_API_KEY")
+CENTERS_API_URL = os.getenv("CENTERS_API_URL")
+LSC_API_URL = os.getenv("LSC_API_URL")
+QNA_API_URL = os.getenv("QNA_API_URL")
+
+logger = logging.getLogger("chatbot")
+
+
+class FeedUnavailable(requests.exceptions.ConnectionError):
+    """A feed whose load failed moments ago; it is not fetched again until its retry interval has passed."""
+
+
+class FeedSnapshot:
+    """
+    Process-wide, TTL-based snapshot of one upstream feed.
+
+    The first call to get() loads the feed synchronously. Once the TTL has
+    elapsed, get() keeps returning the current data and refreshes it on a
+    background thread (stale-while-revalidate). If a refresh fails, the
+    last-known-good data is kept and served until a later refresh succeeds;
+    background refreshes are not retried for CHAT_FEED_RETRY_INTERVAL
+    seconds after a failure, so an outage doesn't cost an upstream call
+    per request. Likewise a feed that never loaded raises FeedUnavailable
+    for that long after a failed load instead of fetching again.
+
+    Loads go through upstream.coalesce(), so threads that need the feed
+    while it is being fetched wait for that fetch (at most
+    CHAT_UPSTREAM_COALESCE_WAIT seconds) instead of starting their own.
+
+    With CHAT_SHARED_SNAPSHOT_DIR set, the data lives in a memory-mapped
+    file shared by every worker process (see Chat.shared_snapshot): get()
+    picks up a version another worker wrote, the TTL counts from when the
+    file was written, and only one worker at a time fetches the feed.
+
+    With CHAT_SNAPSHOT_PERSIST_DIR set, every successful fetch is also
+    saved to <name>.json there. restore() (run at startup by
+    restore_snapshots()) serves that file until the first refresh, so a
+    restarted process answers from warm data, and a first load that fails
+    falls back to it. Data past its TTL that could not be refreshed is
+    reported to the request trace, which marks the response as stale.
+
+    aget() is get() for async views: a cold feed is fetched with
+    `async_loader`, so one request can fetch several feeds at once.
+    """
+
+    def __init__(self, name, loader, ttl_setting, default_ttl, async_loader=None):
+        self.name = name
+        self.loader = loader
+        self.async_loader = async_loader
+        self.ttl_setting = ttl_setting
+        self.default_ttl = default_ttl
+        self._lock = threading.Lock()
+        self._data = None
+        self._fetched_at = 0.0
+        self._version = 0
+        self._refreshing = False
+        self._failed_at = None
+        self._derived = {}
+        self._derive_lock = threading.Lock()
+        self._shared = None
+        self._mapped = None
+        self._unconfirmed = False
+        self._persisted_version = None
+
+    @property
+    def ttl(self):
+        return getattr(settings, self.ttl_setting, self.default_ttl)
+
+    @property
+    def version(self):
+        """Bumped every time a refresh brings in different data."""
+        return self._version
+
+    @property
+    def loaded(self):
+        return self._data is not None
+
+    @property
+    def age(self):
+        """Seconds since the data was last fetched, or None if it never loaded."""
+        return time.monotonic() - self._fetched_at if self.loaded else None
+
+    def is_stale(self):
+        return time.monotonic() - self._fetched_at >= self.ttl
+
+    @property
+    def retry_interval(self):
+        return getattr(settings, "CHAT_FEED_RETRY_INTERVAL", 30)
+
+    def retry_due(self):
+        """False while a refresh that failed less than retry_interval seconds ago holds off the next one."""
+        return self._failed_at is None or time.monotonic() - self._failed_at >= self.retry_interval
+
+    @property
+    def serving_stale(self):
+        """True while the data is past its TTL and no refresh has managed to replace it."""
+        return self._unconfirmed and self.loaded and self.is_stale()
+
+    def get(self):
+        """
+        Return the snapshot data, loading it on first use.
+        Raises whatever the loader raised if no data has ever been loaded.
+        """
+        shared = self._shared_file()
+        if shared is not None:
+            self._adopt(shared.current())
+        data = self._data
+        if data is None:
+            self._check_retry_due()
+            try:
+                return upstream.coalesce(self.name, id(self), self._load)
+            except Exception as e:
+                if not self.restore():
+                    self._load_failed(e)
+                    raise
+                logger.warning("Loading %s feed failed, serving the persisted snapshot: %s", self.name, e)
+                self._load_failed(e)
+                data = self._data
+
+        if self.is_stale():
+            self._refresh_in_background()
+        if self.serving_stale:
+            mark_stale(self.name, self.age)
+        return data
+
+    async def aget(self):
+        """
+        get() without blocking the event loop. A cold feed is fetched with
+        async_loader, shared by the coroutines that need it at the same
+        time; without one (or with a shared snapshot file, which needs its
+        lock) get() runs on a thread. Loaded data is returned as get() does,
+        a due refresh still running on a background thread.
+        """
+        if self._data is not None:
+            return self.get()
+        if self.async_loader is None or self._shared_file() is not None:
+            return await sync_to_async(self.get)()
+        self._check_retry_due()
+        try:
+            return await async_upstream.coalesce(self.name, id(self), self._aload)
+        except Exception as e:
+            if not await asyncio.to_thread(self.restore):
+                self._load_failed(e)
+                raise
+            logger.warning("Loading %s feed failed, serving the persisted snapshot: %s", self.name, e)
+            self._load_failed(e)
+            return self.get()
+
+    def derive(self, builder):
+        """
+        Return builder(data), built once per snapshot version and shared by
+        every caller until the feed changes.
+        """
+        self.get()
+        with self._lock:
+            data, version = self._data, self._version
+        cached = self._derived.get(builder)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        with self._derive_lock:
+            cached = self._derived.get(builder)
+            if cached is None or cached[0] != version:
+                cached = self._derived[builder] = (version, builder(data))
+        return cached[1]
+
+    def refresh(self):
+        """Reload the feed now. On failure the previous data is kept."""
+        try:
+            upstream.coalesce(self.name, id(self), self._load)
+        except Exception as e:
+            logger.warning("Refreshing %s feed failed, serving last-known-good data: %s", self.name, e)
+            metrics.feed_refresh_failures.inc(feed=self.name)
+            self._unconfirmed = self.loaded
+            self._failed_at = time.monotonic()
+            return False
+        return True
+
+    def restore(self):
+        """
+        Serve the snapshot persisted by the last successful fetch, if nothing
+        is loaded yet. Its age counts from when it was saved. Returns whether
+        data was restored.
+        """
+        path = self._persist_path()
+        if path is None or self._data is not None:
+            return False
+        try:
+            with open(path, encoding="utf-8") as f:
+                saved_at = os.fstat(f.fileno()).st_mtime
+                data = json.load(f)
+        except FileNotFoundError:
+            return False
+        except (OSError, ValueError) as e:
+            logger.warning("Ignoring unreadable persisted %s snapshot %s: %s", self.name, path, e)
+            return False
+        with self._lock:
+            if self._data is not None:
+                return False
+            self._version += 1
+            self._data = data
+            self._fetched_at = time.monotonic() - max(0.0, time.time() - saved_at)
+            self._unconfirmed = True
+            self._persisted_version = self._version
+        return True
+
+    def invalidate(self):
+        with self._lock:
+            self._data = None
+            self._fetched_at = 0.0
+            self._mapped = None
+            self._failed_at = None
+
+    def _load(self):
+        shared = self._shared_file()
+        if shared is not None:
+            return self._load_shared(shared)
+        data = self.loader()
+        with self._lock:
+            self._store(data)
+        self._persist(data)
+        return data
+
+    async def _aload(self):
+        data = await self.async_loader()
+        with self._lock:
+            self._store(data)
+        await asyncio.to_thread(self._persist, data)
+        return data
+
+    def _persist_path(self):
+        directory = getattr(settings, "CHAT_SNAPSHOT_PERSIST_DIR", None)
+        return os.path.join(directory, f"{self.name}.json") if directory else None
+
+    def _persist(self, data):
+        """Save freshly fetched `data`; when unchanged, only renew the file's timestamp."""
+        path = self._persist_path()
+        if path is None:
+            return
+        version = self._version
+        try:
+            if version == self._persisted_version and os.path.exists(path):
+                os.utime(path)
+                return
+            directory = os.path.dirname(path)
+            os.makedirs(directory, exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(dir=directory, prefix=f".{self.name}-")
+            try:
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    json.dump(data, f, separators=(",", ":"))
+                os.replace(temp_path, path)
+            except BaseException:
+                with contextlib.suppress(FileNotFoundError):
+                    os.unlink(temp_path)
+                raise
+        except (OSError, TypeError, ValueError) as e:
+            logger.warning("Could not persist the %s snapshot to %s: %s", self.name, path, e)
+            return
+        self._persisted_version = version
+
+    def _shared_file(self):
+        directory = getattr(settings, "CHAT_SHARED_SNAPSHOT_DIR", None)
+        if not directory or not shared_snapshot.is_supported():
+            return None
+        shared = self._shared
+        if shared is None or shared.directory != directory:
+            shared = self._shared = shared_snapshot.SharedFeedFile(directory, self.name)
+        return shared
+
+    def _load_shared(self, shared):
+        seen = self._mapped
+        with shared.locked():
+            mapped = shared.current()
+            if mapped is not None and mapped is not seen and time.time() - mapped.written_at < self.ttl:
+                # Another worker wrote a fresh version while this one waited for the lock
+                self._adopt(mapped)
+                return self._data
+            data = self.loader()
+            try:
+                mapped = shared.publish(data)
+            except TypeError as e:
+                logger.warning("Not sharing the %s feed: %s", self.name, e)
+                with self._lock:
+                    self._store(data)
+                self._persist(data)
+                return data
+        self._adopt(mapped)
+        self._persist(data)
+        return self._data
+
+    def _adopt(self, mapped):
+        """Serve a mapped shared snapshot, unless it is the one already served."""
+        if mapped is None or mapped is self._mapped:
+            return
+        with self._lock:
+            if self._mapped is None or mapped.generation != self._mapped.generation:
+                self._version += 1
+                self._data = mapped.records
+            self._mapped = mapped
+            self._fetched_at = time.monotonic() - max(0.0, time.time() - mapped.written_at)
+            self._unconfirmed = False
+            self._failed_at = None
+
+    def _store(self, data):
+        if data != self._data:
+            self._version += 1
+        self._data = data
+        self._fetched_at = time.monotonic()
+        self._unconfirmed = False
+        self._failed_at = None
+
+    def _check_retry_due(self):
+        if not self.retry_due():
+            raise FeedUnavailable(f"Loading the {self.name} feed failed less than {self.retry_interval}s ago")
+
+    def _load_failed(self, error):
+        metrics.feed_refresh_failures.inc(feed=self.name)
+        # A call skipped, or a wait cut short, for one request's time budget says nothing about the upstream
+        if isinstance(error, CoalescedWaitTimeout) and error.budget_exhausted:
+            return
+        if not isinstance(error, DeadlineExceeded):
+            self._failed_at = time.monotonic()
+
+    def _refresh_in_background(self):
+        with self._lock:
+            if self._refreshing or not self.retry_due():
+                return
+            self._refreshing = True
+
+        def run():
+            try:
+                self.refresh()
+            finally:
+                self._refreshing = False
+
+        threading.Thread(target=run, name=f"{self.name}-feed-refresh", daemon=True).start()
+
+
+def from_configured_source(feed, load_upstream):
+    """
+    Snapshot loader for one feed. CHAT_DATA_SOURCE picks where it reads
+    from: "upstream" (the SGOU API, default) or "database" (the rows
+    mirrored by `manage.py sync_upstream`).
+    """
+    def load():
+        if getattr(settings, "CHAT_DATA_SOURCE", "upstream") == "database":
+            from .sync import load_from_database
+            return load_from_database(feed)
+        return load_upstream()
+    return load
+
+
+def async_from_configured_source(feed, aload_upstream):
+    """from_configured_source() for async_loader: `aload_upstream` is a coroutine function."""
+    async def load():
+        if getattr(settings, "CHAT_DATA_SOURCE", "upstream") == "database":
+            from .sync import load_from_database
+            return await sync_to_async(load_from_database)(feed)
+        return await aload_upstream()
+    return load
+
+
+def upstream_feed(endpoint, request, parse):
+    """
+    Sync and async loaders of one upstream feed: request() gives the URL
+    and headers, parse() turns the decoded JSON into the feed's records.
+    """
+    def load():
+        url, headers = request()
+        response = upstream.get(endpoint, url, headers=headers)
+        response.raise_for_status()
+        return parse(response.json())
+
+    async def aload():
+        url, headers = request()
+        response = await async_upstream.get(endpoint, url, headers=headers)
+        response.raise_for_status()
+        return parse(response.json())
+    return load, aload
+
+
+def programmes_request():
+    headers = {
+        "X-API-KEY": UNIVERSITY_API_KEY,
+        "Accept": "application/json",
+    }
+    return UNIVERSITY_API_URL, headers
+
+
+def parse_programmes(data):
+    return data.get("programme", [])
+
+
+load_programmes, aload_programmes = upstream_feed("programmes", programmes_request, parse_programmes)
+
+programme_snapshot = FeedSnapshot(
+    "programmes", from_configured_source("programmes", load_programmes),
+    ttl_setting="CHAT_PROGRAMME_SNAPSHOT_TTL", default_ttl=300,
+    async_loader=async_from_configured_source("programmes", aload_programmes),
+)
+
+
+def qna_request():
+    return QNA_API_URL, {"X-API-KEY": UNIVERSITY_API_KEY}
+
+
+def parse_qna(data):
+    return data.get("question", [])
+
+
+load_qna, aload_qna = upstream_feed("qna", qna_request, parse_qna)
+
+qna_snapshot = FeedSnapshot(
+    "qna", from_configured_source("qna", load_qna),
+    ttl_setting="CHAT_QNA_SNAPSHOT_TTL", default_ttl=300,
+    async_loader=async_from_configured_source("qna", aload_qna),
+)
+
+
+def centers_request():
+    headers = {
+        "X-API-KEY": UNIVERSITY_API_KEY,
+        "Accept": "application/json",
+    }
+    return CENTERS_API_URL, headers
+
+
+def parse_centers(centers_data):
+    centers_list = []
+    if isinstance(centers_data, dict):
+        # Try different possible keys for centers data
+        centers_list = (
+            centers_data.get("rc", [])
+            or centers_data.get("centers", [])
+            or centers_data.get("data", [])
+        )
+    elif isinstance(centers_data, list):
+        centers_list = centers_data
+
+    # Ensure each item is a dictionary, decoding string-encoded JSON items
+    processed_centers_list = []
+    for item in centers_list:
+        if isinstance(item, str):
+            try:
+                item = json.loads(item)
+            except json.JSONDecodeError:
+                logger.warning("Could not decode center item to JSON: %s", item)
+                continue
+        if isinstance(item, dict):
+            processed_centers_list.append(item)
+        else:
+            logger.warning("Unexpected item type in centers list: %s", type(item))
+    return processed_centers_list
+
+
+load_centers, aload_centers = upstream_feed("centers", centers_request, parse_centers)
+
+centers_snapshot = FeedSnapshot(
+    "centers", from_configured_source("centers", load_centers),
+    ttl_setting="CHAT_CENTERS_SNAPSHOT_TTL", default_ttl=3600,
+    async_loader=async_from_configured_source("centers", aload_centers),
+)
+
+
+def lsc_request():
+    return LSC_API_URL, {"X-API-KEY": UNIVERSITY_API_KEY}
+
+
+def parse_lscs(data):
+    return data.get("lsc", [])
+
+
+load_lscs, aload_lscs = upstream_feed("lsc", lsc_request, parse_lscs)
+
+lsc_snapshot = FeedSnapshot(
+    "lsc", from_configured_source("lsc", load_lscs),
+    ttl_setting="CHAT_LSC_SNAPSHOT_TTL", default_ttl=3600,
+    async_loader=async_from_configured_source("lsc", aload_lscs),
+)
+
+SNAPSHOTS = (programme_snapshot, qna_snapshot, centers_snapshot, lsc_snapshot)
+
+metrics.registry.gauge(
+    "chat_feed_age_seconds", "Seconds since each feed snapshot was last fetched", ("feed",),
+    function=lambda: {(s.name,): s.age for s in SNAPSHOTS if s.loaded},
+)
+metrics.registry.gauge(
+    "chat_feed_stale", "1 while a feed is served past its TTL because refreshing it failed", ("feed",),
+    function=lambda: {(s.name,): int(s.serving_stale) for s in SNAPSHOTS if s.loaded},
+)
+metrics.registry.gauge(
+    "chat_feed_version", "Times each feed snapshot has changed in this process", ("feed",),
+    function=lambda: {(s.name,): s.version for s in SNAPSHOTS},
+)
+
+
+def restore_snapshots():
+    """Serve every feed from its persisted snapshot until the first refresh; run at startup."""
+    restored = [snapshot.name for snapshot in SNAPSHOTS if snapshot.restore()]
+    if restored:
+        logger.info("Restored persisted snapshots: %s", ", ".join(restored))
@@ -0,0 +1,220 @@
+"""
+Pre-rendered listing answers.
+
+The regional center list, the LSC lists and the programme lists depend
+only on the feed data, so they are rendered once per snapshot version
+and kept in memory; answering a listing query is then a dictionary
+lookup. The full lists are kept as complete, encoded response bodies
+(EncodedBody, so their gzip/brotli forms are also built only once).
+
+Each listing exists in two formats. "html" is the {"message": "<html>"}
+answer process_query has always sent. "structured", which clients opt
+into with "format": "structured" in the request, is a typed payload such
+as {"type": "lsc_list", "title": ..., "items": [...]} that chatbot.js
+renders with its own templates, so the markup and inline styles are not
+repeated per item on the wire.
+
+LSC entries name their regional center, so the LSC fragments are
+rebuilt whenever either the LSC or the centers snapshot changes.
+"""
+import json
+import threading
+
+from django.http import HttpResponse
+
+from .centers import center_display_fields, format_center_html, get_lsc_directory, lsc_rc_id
+from .compression import EncodedBody
+from .feeds import centers_snapshot, programme_snapshot
+
+RC_LIST_TITLE = "Here are the Regional Centers:"
+LSC_LIST_TITLE = "Here are our Learning Support Centers:"
+PROGRAM_LIST_TITLE = "Here are the programs offered:"
+PROGRAM_LIST_FOOTER = "If you would like to know about a specific program, type the corresponding number."
+CATEGORY_LIST_FOOTER = "You can reply with a number to know more about a specific program."
+
+
+def response_format(data):
+    """The answer format a parsed process_query request body asks for."""
+    return "structured" if isinstance(data, dict) and data.get("format") == "structured" else "html"
+
+
+def json_body(payload):
+    return EncodedBody(json.dumps(payload).encode())
+
+
+def message_body(html):
+    """The JSON body process_query sends for an HTML answer."""
+    return json_body({"message": html})
+
+
+def fragment_response(body):
+    """A cacheable process_query response with a pre-encoded body."""
+    response = HttpResponse(body.data, content_type="application/json")
+    response.encoded_body = body
+    response.cacheable = True
+    return response
+
+
+def lsc_list_title(regional_center_name):
+    return f"Here are the Learning Support Centers under {regional_center_name.title()} Regional Center:"
+
+
+def lsc_item(lsc, rc_name_mapping):
+    rc_id = lsc_rc_id(lsc)
+    return {
+        "name": lsc.get("lscname", "N/A"),
+        "address": lsc.get("lscaddress", "N/A"),
+        "phone": lsc.get("lscnumber", "N/A"),
+        "coordinator": lsc.get("coordinatorname", "N/A"),
+        "email": lsc.get("coordinatormail", "N/A"),
+        "rc_id": rc_id,
+        "rc_name": rc_name_mapping.get(rc_id, "N/A"),
+    }
+
+
+def lsc_item_html(item):
+    return f'''
+<div class="lsc-item" style="border-radius:8px;">
+<div class="lsc-header" onclick="toggleDropdown(this)" style="cursor:pointer; display:flex; justify-content:space-between; font-weight:bold; color:#0066cc;">
+    <span>{item["name"].replace("'", "&apos;")}</span>
+    <span class="lsc-arrow">&#9660;</span>
+</div>
+<div class="lsc-details" style="display:none; margin-top:8px;">
+    <strong>Address:</strong> {item["address"].replace("'", "&apos;")}<br>
+    <strong>Contact:</strong> {item["phone"]}<br>
+    <strong>Coordinator:</strong> {item["coordinator"].replace("'", "&apos;")}<br>
+    <strong>Email:</strong> <a href="mailto:{item["email"]}" style="color:#0066cc;">{item["email"]}</a><br>
+    <strong>RC ID:</strong> {item["rc_id"]}<br>
+    <strong>RC Name:</strong> {item["rc_name"]}
+</div>
+</div>
+'''
+
+
+def program_list_bodies(title, programs, footer, separator=""):
+    """Both formats of a numbered programme list."""
+    names = [program.get('pgm_name', 'N/A') for program in programs]
+    html = f"{title}{separator}<ol>" + "".join(f"<li>{name}</li>" for name in names) + f"</ol><p>{footer}</p>"
+    return {
+        "html": message_body(html),
+        "structured": json_body({
+            "type": "program_list", "title": title, "items": names, "footer": footer,
+        }),
+    }
+
+
+class RegionalCenterFragments:
+    """The regional center list, rendered once per centers snapshot version."""
+
+    def __init__(self, centers):
+        items = [center_display_fields(center) for center in centers]
+        html = [html for html in map(format_center_html, centers) if html]
+        self.list_bodies = None
+        if html:
+            self.list_bodies = {
+                "html": message_body(f"{RC_LIST_TITLE}\n<ol>" + "".join(f"<li>{h}</li>" for h in html) + "</ol>"),
+                "structured": json_body({"type": "rc_list", "title": RC_LIST_TITLE, "items": [i for i in items if i]}),
+            }
+
+
+class LscFragments:
+    """Every LSC and the LSCs of each regional center, rendered once per LSC and centers version."""
+
+    def __init__(self, lscs, rc_name_mapping):
+        items = [lsc_item(lsc, rc_name_mapping) for lsc in lscs]
+        html = [lsc_item_html(item) for item in items]
+        grouped = {}
+        for item, item_html in zip(items, html):
+            rc_html, rc_items = grouped.setdefault(item["rc_id"], ([], []))
+            rc_html.append(item_html)
+            rc_items.append(item)
+        # rc_id -> (entries as HTML, entries as structured items)
+        self.by_rc_id = {rc_id: ("".join(rc_html), rc_items) for rc_id, (rc_html, rc_items) in grouped.items()}
+        self.all_bodies = None
+        if items:
+            self.all_bodies = {
+                "html": message_body(f"{LSC_LIST_TITLE}<br><br>" + "".join(html)),
+                "structured": json_body({"type": "lsc_list", "title": LSC_LIST_TITLE, "items": items}),
+            }
+
+    def for_regional_center(self, rc_id, title, fmt):
+        """The answer payload listing one regional center's LSCs, or None if it has none."""
+        rc_html, rc_items = self.by_rc_id.get(rc_id, ("", []))
+        if not rc_items:
+            return None
+        if fmt == "structured":
+            return {"type": "lsc_list", "title": title, "items": rc_items}
+        return {"message": f"{title}<br><br>{rc_html}"}
+
+
+def category_positions(programs, category):
+    """Positions of the programmes in a category code such as UG or PG."""
+    names = [p.get('pgm_category', '').strip() for p in programs]
+    code = category.upper()
+    # Exact match, then case-insensitive, then the category code anywhere in the name
+    for matches in (lambda name: name == category, lambda name: name.upper() == code, lambda name: code in name.upper()):
+        positions = [position for position, name in enumerate(names) if matches(name)]
+        if positions:
+            return positions
+    return []
+
+
+class ProgrammeFragments:
+    """The programme list and the per-category lists, rendered once per programme snapshot version."""
+
+    def __init__(self, programs):
+        self.programs = programs
+        self.categories = sorted({p.get('pgm_category', '').strip() for p in programs} - {''})
+        self.list_bodies = program_list_bodies(PROGRAM_LIST_TITLE, programs, PROGRAM_LIST_FOOTER, separator="\n")
+        self._by_category = {}
+        self._lock = threading.Lock()
+        for category in self.categories:
+            self.category(category.upper())
+
+    def _filter(self, category):
+        return [self.programs[position] for position in category_positions(self.programs, category)]
+
+    def category(self, category):
+        """
+        (programs, response bodies by format) for a category code such as
+        UG or PG; the bodies are None when the category has no programmes.
+        """
+        cached = self._by_category.get(category)
+        if cached is None:
+            programs = self._filter(category)
+            bodies = None
+            if programs:
+                bodies = program_list_bodies(f"Programs under {category} category:", programs, CATEGORY_LIST_FOOTER)
+            cached = (programs, bodies)
+            with self._lock:
+                self._by_category.setdefault(category, cached)
+        return cached
+
+
+_lsc_fragments = None
+_lsc_lock = threading.Lock()
+
+
+def get_regional_center_fragments():
+    return centers_snapshot.derive(RegionalCenterFragments)
+
+
+def get_programme_fragments():
+    return programme_snapshot.derive(ProgrammeFragments)
+
+
+def get_lsc_fragments(centers=None):
+    """
+    LSC fragments for the current LSC snapshot; `centers` is the
+    CenterDirectory naming each LSC's regional center, if it loaded.
+    """
+    global _lsc_fragments
+    lscs = get_lsc_directory()
+    cached = _lsc_fragments
+    if cached is None or cached[0] is not lscs or cached[1] is not centers:
+        with _lsc_lock:
+            cached = _lsc_fragments
+            if cached is None or cached[0] is not lscs or cached[1] is not centers:
+                rc_name_mapping = centers.rc_name_mapping if centers else {}
+                cached = _lsc_fragments = (lscs, centers, LscFragments(lscs.lscs, rc_name_mapping))
+    return cached[2]
@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Sum
+from django.utils import timezone
+
+from Chat import completion_cache
+from Chat.models import CachedCompletion
+
+
+class Command(BaseCommand):
+    help = "Inspect or purge the Groq completion cache."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--list", type=int, metavar="N", default=0,
+                            help="Show the N most recently used entries.")
+        parser.add_argument("--purge-expired", action="store_true",
+                            help="Delete expired entries and trim the cache to its size bound.")
+        parser.add_argument("--purge", action="store_true",
+                            help="Delete every cached completion.")
+
+    def handle(self, *args, **options):
+        if options["purge"]:
+            deleted, _ = CachedCompletion.objects.all().delete()
+            self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} cached completions"))
+            return
+        if options["purge_expired"]:
+            deleted = completion_cache.evict()
+            self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} expired or overflowing completions"))
+
+        now = timezone.now()
+        entries = CachedCompletion.objects.all()
+        self.stdout.write(
+            f"{entries.count()} entries ({entries.filter(expires_at__lte=now).count()} expired), "
+            f"{entries.aggregate(total=Sum('hits'))['total'] or 0} hits, "
+            f"limit {completion_cache.max_entries()}, ttl {completion_cache.ttl()}s, "
+            f"near-duplicates {'on' if completion_cache.near_duplicates_enabled() else 'off'}"
+        )
+        for entry in entries.order_by("-last_used_at")[:options["list"]]:
+            state = "expired" if entry.expires_at <= now else f"expires {entry.expires_at:%Y-%m-%d %H:%M}"
+            self.stdout.write(
+                f"  {entry.key[:12]}  {entry.hits:>5} hits  {state}  {entry.normalized_query[:60] or '-'}"
+            )
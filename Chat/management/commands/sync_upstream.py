@@ -0,0 +1,28 @@
+import requests
+from django.core.management.base import BaseCommand, CommandError
+
+from Chat import sync
+
+
+class Command(BaseCommand):
+    help = "Mirror the SGOU programme, regional center, LSC and QnA feeds into the Chat models."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--allow-empty",
+            action="store_true",
+            help="Delete every mirrored row of a feed that comes back empty (skipped by default).",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            data = sync.fetch_upstream()
+        except (requests.exceptions.RequestException, ValueError) as e:
+            raise CommandError(f"Could not fetch the upstream feeds, nothing was changed: {e}")
+
+        run = sync.sync(data, allow_empty=options["allow_empty"])
+        for feed, counts in run.stats.items():
+            self.stdout.write(
+                f"{feed}: {counts['created']} created, {counts['updated']} updated, {counts['deleted']} deleted"
+            )
+        self.stdout.write(self.style.SUCCESS(f"Mirror is at sync version {run.version}"))
@@ -0,0 +1,118 @@
+"""
+Similarity matching for QnA questions and program names.
+
+Two engines sit behind the same functions, selected with the
+CHAT_MATCHING_ENGINE setting:
+
+* "difflib" (default): SequenceMatcher-based scoring, as process_query
+  has always done it.
+* "tfidf": character n-gram TF-IDF cosine similarity (see tfidf.py).
+  Needs numpy and scipy; falls back to difflib when they are missing.
+
+Each engine has its own thresholds, since the scores are on different
+scales. CHAT_MATCHING_THRESHOLDS can override them per engine and kind.
+"""
+import functools
+import logging
+from difflib import SequenceMatcher
+
+from django.conf import settings
+
+from . import metrics, tfidf
+from .feeds import qna_snapshot
+from .qna_index import get_qna_index
+
+logger = logging.getLogger("chatbot")
+
+DEFAULT_THRESHOLDS = {
+    "difflib": {"qna": 0.7, "program": 0.6},
+    "tfidf": {"qna": 0.6, "program": 0.5},
+}
+
+_warned_unavailable = False
+
+
+def engine():
+    global _warned_unavailable
+    name = getattr(settings, "CHAT_MATCHING_ENGINE", "difflib")
+    if name == "tfidf" and not tfidf.is_available():
+        if not _warned_unavailable:
+            logger.warning("CHAT_MATCHING_ENGINE is 'tfidf' but numpy/scipy are not installed; using difflib")
+            _warned_unavailable = True
+        return "difflib"
+    return name
+
+
+def threshold(kind, engine_name=None):
+    engine_name = engine_name or engine()
+    overrides = getattr(settings, "CHAT_MATCHING_THRESHOLDS", {}).get(engine_name, {})
+    return overrides.get(kind, DEFAULT_THRESHOLDS[engine_name][kind])
+
+
+@functools.lru_cache(maxsize=8)
+def _program_matcher(names):
+    return tfidf.TfidfMatcher(names)
+
+
+def _qna_matcher(index):
+    # Built once per QnA index, i.e. once per QnA feed version
+    if getattr(index, "tfidf_matcher", None) is None:
+        index.tfidf_matcher = tfidf.TfidfMatcher([entry.question for entry in index.entries])
+    return index.tfidf_matcher
+
+
+def best_qna_match(query, snapshot=qna_snapshot):
+    """Return (question, answer, similarity) for the best QnA match above the threshold, or None."""
+    index = get_qna_index(snapshot)
+    engine_name = engine()
+    if engine_name == "tfidf":
+        hit = _qna_matcher(index).best(query, threshold("qna", engine_name))
+        match = None
+        if hit is not None:
+            entry = index.entries[hit[0]]
+            match = entry.question, entry.answer, hit[1]
+    else:
+        match = index.best_match(query, threshold("qna", engine_name))
+    metrics.qna_matches.inc(engine=engine_name, result="hit" if match else "miss")
+    return match
+
+
+def best_qna_matches(queries, snapshot=qna_snapshot):
+    """best_qna_match() for many queries; the TF-IDF engine scores them in one matrix product."""
+    index = get_qna_index(snapshot)
+    engine_name = engine()
+    if engine_name != "tfidf":
+        return [index.best_match(query, threshold("qna", engine_name)) for query in queries]
+    results = []
+    for hit in _qna_matcher(index).best_batch(queries, threshold("qna", engine_name)):
+        if hit is None:
+            results.append(None)
+        else:
+            entry = index.entries[hit[0]]
+            results.append((entry.question, entry.answer, hit[1]))
+    return results
+
+
+def rank_programs(query, programs):
+    """Programs whose name matches the query at or above the threshold, best first, as (program, similarity)."""
+    query = query.lower()
+    engine_name = engine()
+    min_similarity = threshold("program", engine_name)
+    if engine_name == "tfidf":
+        matcher = _program_matcher(tuple(program.get('pgm_name', '') for program in programs))
+        return [(programs[position], score) for position, score in matcher.ranked(query, min_similarity)]
+
+    matching_programs = []
+    for program in programs:
+        pgm_name = program.get('pgm_name', '').lower()
+        similarity = SequenceMatcher(None, query, pgm_name).ratio()
+        if similarity >= min_similarity:
+            matching_programs.append((program, similarity))
+    matching_programs.sort(key=lambda x: x[1], reverse=True)
+    return matching_programs
+
+
+def best_program(query, programs):
+    """The first best-matching program at or above the threshold, as (program, similarity), or None."""
+    ranked = rank_programs(query, programs)
+    return ranked[0] if ranked else None
@@ -0,0 +1,239 @@
+"""
+In-process metrics, served at /metrics in the Prometheus text format.
+
+Three metric types, all safe to update from any thread:
+
+  Counter    only goes up (requests, cache lookups, tokens)
+  Gauge      set to a value, or read from a function when scraped
+  Histogram  observations counted into fixed buckets, plus sum and count
+
+Each metric has a fixed set of label names, and every update passes a
+value for each of them. The values live in this process, so with several
+workers every worker is scraped (or aggregated) separately, which is how
+Prometheus client libraries behave too.
+
+The chatbot's own metrics are defined at the bottom of the module and
+registered in `registry`.
+"""
+import bisect
+import math
+import threading
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [*zip(names, values), *extra]
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels):
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"{self.name} takes the labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self):
+        """(suffix, label values, extra labels, value) for every sample."""
+        with self._lock:
+            return [("", key, (), value) for key, value in sorted(self._values.items())]
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for suffix, key, extra, value in self.samples():
+            lines.append(f"{self.name}{suffix}{_format_labels(self.labelnames, key, extra)} {_format_value(value)}")
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        if amount < 0:
+            raise ValueError("Counters can only go up")
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    """
+    A value that goes up and down. With `function`, the gauge is read when
+    scraped instead: function() returns {label values tuple: value}.
+    """
+    kind = "gauge"
+
+    def __init__(self, name, documentation, labelnames=(), function=None):
+        super().__init__(name, documentation, labelnames)
+        self.function = function
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def samples(self):
+        if self.function is None:
+            return super().samples()
+        return [("", tuple(map(str, key)), (), value) for key, value in sorted(self.function().items())]
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # Per-bucket (not cumulative) counts, the +Inf bucket last, then the sum
+                state = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            state[index] += 1
+            state[-1] += value
+
+    def value(self, **labels):
+        """(count, sum) of the observations with these labels."""
+        with self._lock:
+            state = self._values.get(self._key(labels))
+            return (sum(state[:-1]), state[-1]) if state else (0, 0.0)
+
+    def samples(self):
+        with self._lock:
+            states = sorted((key, list(state)) for key, state in self._values.items())
+        samples = []
+        for key, state in states:
+            cumulative = 0
+            for bound, count in zip((*self.buckets, math.inf), state[:-1]):
+                cumulative += count
+                samples.append(("_bucket", key, (("le", _format_value(float(bound))),), cumulative))
+            samples.append(("_sum", key, (), state[-1]))
+            samples.append(("_count", key, (), cumulative))
+        return samples
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"A metric named {metric.name} is already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=(), function=None):
+        return self.register(Gauge(name, documentation, labelnames, function))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def get(self, name):
+        return self._metrics[name]
+
+    def clear(self):
+        """Reset every metric's values; for tests."""
+        for metric in list(self._metrics.values()):
+            metric.clear()
+
+    def render(self):
+        """Every metric in the Prometheus text exposition format (0.0.4)."""
+        return "\n".join(metric.render() for metric in list(self._metrics.values())) + "\n"
+
+
+registry = Registry()
+
+request_duration = registry.histogram(
+    "chat_request_duration_seconds", "process_query latency by the branch that answered", ("branch",))
+requests_total = registry.counter(
+    "chat_requests_total", "process_query responses by branch and HTTP status", ("branch", "status"))
+stage_duration = registry.histogram(
+    "chat_stage_duration_seconds", "Time spent in each stage of a chat request", ("stage",))
+upstream_duration = registry.histogram(
+    "chat_upstream_duration_seconds", "Upstream API latency until the response headers", ("endpoint",))
+upstream_responses = registry.counter(
+    "chat_upstream_responses_total", "Upstream API calls by HTTP status, or 'error' when no response came back",
+    ("endpoint", "status"))
+upstream_coalesced = registry.counter(
+    "chat_upstream_coalesced_total", "Callers that waited for another thread's in-flight fetch instead of fetching",
+    ("endpoint",))
+upstream_coalesce_timeouts = registry.counter(
+    "chat_upstream_coalesce_timeouts_total", "Callers that gave up waiting for an in-flight fetch", ("endpoint",))
+cache_lookups = registry.counter(
+    "chat_cache_lookups_total", "Cache lookups by cache and result (hit or miss)", ("cache", "result"))
+qna_matches = registry.counter(
+    "chat_qna_matches_total", "QnA lookups by whether a question scored above the matching threshold",
+    ("engine", "result"))
+llm_tokens = registry.counter(
+    "chat_llm_tokens_total", "Tokens reported by the LLM API, by kind (prompt or completion)", ("model", "kind"))
+feed_refresh_failures = registry.counter(
+    "chat_feed_refresh_failures_total", "Failed feed refreshes, served from last-known-good data", ("feed",))
+
+deadline_outcomes = registry.counter(
+    "chat_deadline_outcomes_total",
+    "Chat requests by how they did against their time budget: met, degraded (something was skipped) or exceeded",
+    ("outcome",))
+deadline_skips = registry.counter(
+    "chat_deadline_skips_total", "Optional stages and upstream calls skipped, or cut short, for lack of request budget", ("stage",))
+
+
+def record_cache_lookup(cache, hit):
+    cache_lookups.inc(cache=cache, result="hit" if hit else "miss")
+
+
+def record_llm_usage(model, usage):
+    """Count the tokens of an OpenAI-style `usage` object, if the API sent one."""
+    if not isinstance(usage, dict):
+        return
+    for kind in ("prompt", "completion"):
+        tokens = usage.get(f"{kind}_tokens")
+        if isinstance(tokens, int) and tokens > 0:
+            llm_tokens.inc(tokens, model=model, kind=kind)
@@ -0,0 +1,96 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Chat', '0004_alter_programcategory_duration'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UpstreamSync',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.PositiveIntegerField(help_text='Bumped whenever a sync changes the mirrored data')),
+                ('synced_at', models.DateTimeField(auto_now_add=True)),
+                ('stats', models.JSONField(default=dict, help_text='Rows created, updated and deleted per feed')),
+            ],
+            options={
+                'ordering': ['-id'],
+            },
+        ),
+        migrations.AddField(
+            model_name='faq',
+            name='source_data',
+            field=models.JSONField(blank=True, default=dict, editable=False, help_text='Upstream record as last synced'),
+        ),
+        migrations.AddField(
+            model_name='faq',
+            name='source_id',
+            field=models.CharField(blank=True, editable=False, help_text='Upstream id; empty for rows entered by hand', max_length=64, null=True, unique=True),
+        ),
+        migrations.AddField(
+            model_name='faq',
+            name='source_order',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Position in the upstream feed'),
+        ),
+        migrations.AddField(
+            model_name='learningsupportcenter',
+            name='regional_center',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='learning_support_centers', to='Chat.regionalcenter'),
+        ),
+        migrations.AddField(
+            model_name='learningsupportcenter',
+            name='source_data',
+            field=models.JSONField(blank=True, default=dict, editable=False, help_text='Upstream record as last synced'),
+        ),
+        migrations.AddField(
+            model_name='learningsupportcenter',
+            name='source_id',
+            field=models.CharField(blank=True, editable=False, help_text='Upstream id; empty for rows entered by hand', max_length=64, null=True, unique=True),
+        ),
+        migrations.AddField(
+            model_name='learningsupportcenter',
+            name='source_order',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Position in the upstream feed'),
+        ),
+        migrations.AddField(
+            model_name='program',
+            name='source_data',
+            field=models.JSONField(blank=True, default=dict, editable=False, help_text='Upstream record as last synced'),
+        ),
+        migrations.AddField(
+            model_name='program',
+            name='source_id',
+            field=models.CharField(blank=True, editable=False, help_text='Upstream id; empty for rows entered by hand', max_length=64, null=True, unique=True),
+        ),
+        migrations.AddField(
+            model_name='program',
+            name='source_order',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Position in the upstream feed'),
+        ),
+        migrations.AddField(
+            model_name='regionalcenter',
+            name='source_data',
+            field=models.JSONField(blank=True, default=dict, editable=False, help_text='Upstream record as last synced'),
+        ),
+        migrations.AddField(
+            model_name='regionalcenter',
+            name='source_id',
+            field=models.CharField(blank=True, editable=False, help_text='Upstream id; empty for rows entered by hand', max_length=64, null=True, unique=True),
+        ),
+        migrations.AddField(
+            model_name='regionalcenter',
+            name='source_order',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Position in the upstream feed'),
+        ),
+        migrations.AlterField(
+            model_name='faq',
+            name='question',
+            field=models.CharField(max_length=255),
+        ),
+    ]
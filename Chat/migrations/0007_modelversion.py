@@ -0,0 +1,22 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Chat', '0006_cachedcompletion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ModelVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('label', models.CharField(help_text='app_label.model_name', max_length=100, unique=True)),
+                ('version', models.PositiveBigIntegerField(default=0, help_text='Bumped whenever a row is saved or deleted')),
+                ('changed_at', models.DateTimeField()),
+            ],
+        ),
+    ]
@@ -0,0 +1,84 @@
+"""
+A version counter per model, bumped whenever one of its rows is saved or
+deleted, so readers can tell whether a table changed without reading it.
+The api app derives ETag and Last-Modified headers from these.
+
+Saves and deletes through the ORM bump the counter via signals. Bulk
+operations (bulk_create, bulk_update, QuerySet.update) send no signals,
+so code using them calls bump() itself. Inside batched(), every changed
+model is bumped once when the block ends instead of once per row.
+"""
+import threading
+from contextlib import contextmanager
+
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save
+from django.utils import timezone
+
+from .models import (
+    Admission, Exam, Faq, Feedback, LearningSupportCenter, ModelVersion, NewsUpdate, Program, ProgramCategory,
+    RegionalCenter,
+)
+
+TRACKED_MODELS = (
+    ProgramCategory, Program, Admission, Exam, LearningSupportCenter, RegionalCenter, Faq, NewsUpdate, Feedback,
+)
+
+_batch = threading.local()
+
+
+def label(model):
+    return model._meta.label_lower
+
+
+def bump(*models):
+    """Record that the given models' tables changed."""
+    pending = getattr(_batch, "models", None)
+    if pending is not None:
+        pending.update(models)
+        return
+    now = timezone.now()
+    for model in models:
+        if not ModelVersion.objects.filter(label=label(model)).update(version=F("version") + 1, changed_at=now):
+            _, created = ModelVersion.objects.get_or_create(
+                label=label(model), defaults={"version": 1, "changed_at": now},
+            )
+            if not created:
+                ModelVersion.objects.filter(label=label(model)).update(version=F("version") + 1, changed_at=now)
+
+
+@contextmanager
+def batched():
+    """Bump each model changed in the block once, when the block ends."""
+    if getattr(_batch, "models", None) is not None:
+        yield
+        return
+    _batch.models = set()
+    try:
+        yield
+    finally:
+        models, _batch.models = _batch.models, None
+        bump(*models)
+
+
+def versions(*models):
+    """
+    (version, changed_at) per model, in the order given. Models that never
+    changed have version 0 and changed_at None.
+    """
+    rows = dict(
+        (row[0], row[1:]) for row in
+        ModelVersion.objects.filter(label__in=[label(model) for model in models])
+        .values_list("label", "version", "changed_at")
+    )
+    return [rows.get(label(model), (0, None)) for model in models]
+
+
+def _changed(sender, **kwargs):
+    bump(sender)
+
+
+def connect_signals():
+    for model in TRACKED_MODELS:
+        post_save.connect(_changed, sender=model, dispatch_uid=f"model_versions.save.{label(model)}")
+        post_delete.connect(_changed, sender=model, dispatch_uid=f"model_versions.delete.{label(model)}")
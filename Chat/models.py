@@ -3,6 +3,18 @@ import logging
 
 # Create your models here.
 
+# UPSTREAM MIRROR
+class UpstreamRecord(models.Model):
+    """Fields for rows mirrored from the SGOU feeds by `manage.py sync_upstream`."""
+    source_id = models.CharField(max_length=64, unique=True, null=True, blank=True, editable=False,
+                                 help_text='Upstream id; empty for rows entered by hand')
+    source_order = models.PositiveIntegerField(default=0, editable=False, help_text='Position in the upstream feed')
+    source_data = models.JSONField(default=dict, blank=True, editable=False, help_text='Upstream record as last synced')
+
+    class Meta:
+        abstract = True
+
+
 # PROGRAM CATEGORY
 class ProgramCategory(models.Model):
     name = models.CharField(max_length=100)
@@ -17,7 +29,7 @@ class ProgramCategory(models.Model):
         return self.name
 
 # PROGRAM DETAILS
-class Program(models.Model):
+class Program(UpstreamRecord):
     name = models.CharField(max_length=100)
     category = models.ForeignKey(
         ProgramCategory,
@@ -62,16 +74,23 @@ class Exam(models.Model):
         return self.exam_name
     
 # LEARNING SUPPORT CENTERS(lSC's)
-class LearningSupportCenter(models.Model):
+class LearningSupportCenter(UpstreamRecord):
     name = models.CharField(max_length=100)
     address = models.CharField(max_length=200)
     contact_number = models.CharField(max_length=20)
+    regional_center = models.ForeignKey(
+        'RegionalCenter',
+        on_delete=models.SET_NULL,
+        related_name='learning_support_centers',
+        null=True,
+        blank=True
+    )
 
     def __str__(self):
         return self.name
 
 # REGIONAL CENTERS
-class RegionalCenter(models.Model):
+class RegionalCenter(UpstreamRecord):
     name = models.CharField(max_length=100)
     address = models.CharField(max_length=200)
     contact_number = models.CharField(max_length=20)
@@ -80,8 +99,8 @@ class RegionalCenter(models.Model):
         return self.name
     
 # FAQ
-class Faq(models.Model):
-    question = models.CharField(max_length=100)
+class Faq(UpstreamRecord):
+    question = models.CharField(max_length=255)
     answer = models.TextField()
 
     def __str__(self):
@@ -104,3 +123,47 @@ class Feedback(models.Model):
 
     def __str__(self):
         return self.name
+
+# UPSTREAM SYNC RUNS
+class UpstreamSync(models.Model):
+    version = models.PositiveIntegerField(help_text='Bumped whenever a sync changes the mirrored data')
+    synced_at = models.DateTimeField(auto_now_add=True)
+    stats = models.JSONField(default=dict, help_text='Rows created, updated and deleted per feed')
+
+    class Meta:
+        ordering = ['-id']
+
+    def __str__(self):
+        return f"Sync v{self.version} at {self.synced_at:%Y-%m-%d %H:%M}"
+
+    @classmethod
+    def current_version(cls):
+        latest = cls.objects.order_by('-id').values_list('version', flat=True).first()
+        return latest or 0
+
+# GROQ COMPLETION CACHE
+class CachedCompletion(models.Model):
+    key = models.CharField(max_length=64, unique=True, help_text='SHA-256 of the model, messages and parameters')
+    model = models.CharField(max_length=100)
+    normalized_query = models.CharField(max_length=255, blank=True, db_index=True,
+                                        help_text='Normalized user query, for near-duplicate reuse')
+    response = models.TextField()
+    hits = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(db_index=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        ordering = ['-last_used_at']
+
+    def __str__(self):
+        return f"{self.model}: {self.normalized_query or self.key[:12]}"
+
+# DATA VERSION PER MODEL
+class ModelVersion(models.Model):
+    label = models.CharField(max_length=100, unique=True, help_text='app_label.model_name')
+    version = models.PositiveBigIntegerField(default=0, help_text='Bumped whenever a row is saved or deleted')
+    changed_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.label} v{self.version}"
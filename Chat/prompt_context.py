@@ -0,0 +1,214 @@
+"""
+Context retrieval for the Groq prompt.
+
+Instead of pasting the whole programme list into the prompt, build_prompt
+asks build_context() for the few programmes, QnA pairs and regional
+centers most relevant to the query, and only as many as fit in
+CHAT_PROMPT_CONTEXT_TOKENS. Relevance is a lexical IDF-weighted word
+overlap, indexed once per feed snapshot version; token counts come from
+estimate_tokens(), a local approximation of the Llama tokenizer that is
+good enough for budgeting.
+"""
+import math
+import re
+from collections import defaultdict
+
+from django.conf import settings
+
+from .feeds import centers_snapshot, programme_snapshot, qna_snapshot
+from .fragments import category_positions
+from .router import route
+
+DEFAULT_TOP_K = {"qna": 3, "programmes": 8, "centers": 4}
+
+# Longest description / answer / center entry quoted per item, in characters
+ITEM_CHARS = 200
+
+_WORDS = re.compile(r"[a-z0-9]+")
+_TOKEN_PIECES = re.compile(r"[A-Za-z]+|\d{1,3}|[^\sA-Za-z\d]")
+
+STOPWORDS = frozenset(
+    "a an and are about all any at be can do does for from give how i in is it me my of on or "
+    "please show tell the there this to what when where which who will with you your".split()
+)
+
+
+def estimate_tokens(text):
+    """
+    Approximate BPE token count: one per word, one more for every six
+    letters past the first six, one per 1-3 digit run and one per symbol.
+    """
+    count = 0
+    for piece in _TOKEN_PIECES.findall(text):
+        count += 1 + (len(piece) - 1) // 6 if piece.isalpha() else 1
+    return count
+
+
+def terms(text):
+    return [word for word in _WORDS.findall(text.lower()) if word not in STOPWORDS]
+
+
+class LexicalIndex:
+    """IDF-weighted word overlap over a fixed list of documents; the heading text counts twice."""
+
+    def __init__(self, documents):
+        self.size = len(documents)
+        self.postings = defaultdict(dict)
+        for position, (heading, body) in enumerate(documents):
+            for word in terms(body):
+                self.postings[word][position] = 1
+            for word in terms(heading):
+                self.postings[word][position] = 2
+        self.idf = {
+            word: math.log(1 + self.size / len(positions)) for word, positions in self.postings.items()
+        }
+
+    def scores(self, query):
+        scores = defaultdict(float)
+        for word in set(terms(query)):
+            for position, weight in self.postings.get(word, {}).items():
+                scores[position] += weight * self.idf[word]
+        return scores
+
+    def top(self, query, k, among=None):
+        """Positions of the k best-scoring documents, best first; ties keep document order."""
+        scores = self.scores(query)
+        if among is not None:
+            scores = {position: scores.get(position, 0.0) for position in among}
+        ranked = sorted((position for position, score in scores.items() if score > 0 or among is not None),
+                        key=lambda position: (-scores[position], position))
+        return ranked[:k]
+
+
+def _clip(text, limit=ITEM_CHARS):
+    text = " ".join(str(text).split())
+    return text if len(text) <= limit else text[:limit].rsplit(" ", 1)[0] + "..."
+
+
+def programme_line(program):
+    years = program.get("pgm_year")
+    details = ", ".join(filter(None, [program.get("pgm_category"), f"{years} years" if years else None]))
+    line = f"- {program.get('pgm_name', 'Unknown')}"
+    if details:
+        line += f" ({details})"
+    if program.get("pgm_desc"):
+        line += f": {_clip(program['pgm_desc'])}"
+    return line
+
+
+def center_line(center):
+    fields = [
+        center.get("rcname") or center.get("name") or center.get("center_name"),
+        center.get("rcaddress") or center.get("address"),
+        center.get("headname") and f"Director {center['headname']}",
+        center.get("headnumber") or center.get("phone"),
+        center.get("headmail") or center.get("email"),
+    ]
+    return "- " + _clip("; ".join(str(field) for field in fields if field))
+
+
+class ProgrammeRetriever:
+    def __init__(self, programs):
+        self.programs = programs
+        self.index = LexicalIndex([
+            (program.get("pgm_name", ""), f"{program.get('pgm_category', '')} {program.get('pgm_desc', '')}")
+            for program in programs
+        ])
+        self._by_category = {}
+
+    def in_category(self, category):
+        """Positions of the programmes in a category code, as the category listing answer picks them."""
+        positions = self._by_category.get(category)
+        if positions is None:
+            positions = self._by_category.setdefault(category, category_positions(self.programs, category))
+        return positions
+
+    def top(self, query, k, category=None):
+        """Best programmes for the query; with a category code (UG, PG, ...) only programmes in it."""
+        among = self.in_category(category) if category else None
+        return [self.programs[position] for position in self.index.top(query, k, among)]
+
+
+class QnARetriever:
+    def __init__(self, items):
+        self.pairs = [(item["question"], item["answer"]) for item in items if "question" in item and "answer" in item]
+        self.index = LexicalIndex(self.pairs)
+
+    def top(self, query, k):
+        return [self.pairs[position] for position in self.index.top(query, k)]
+
+
+class CenterRetriever:
+    def __init__(self, centers):
+        self.centers = centers
+        self.index = LexicalIndex([
+            (center.get("rcname") or center.get("name") or "", center.get("rcaddress") or center.get("address") or "")
+            for center in centers
+        ])
+
+    def top(self, query, k):
+        positions = self.index.top(query, k) or range(min(k, len(self.centers)))
+        return [self.centers[position] for position in positions]
+
+
+def top_k(kind):
+    return {**DEFAULT_TOP_K, **getattr(settings, "CHAT_PROMPT_TOP_K", {})}[kind]
+
+
+def token_budget():
+    return getattr(settings, "CHAT_PROMPT_CONTEXT_TOKENS", 1200)
+
+
+def build_context(user_query, programs=None, centers=None):
+    """
+    The prompt context for a query: relevant QnA pairs, then programmes,
+    then (for center questions) regional centers, cut off at the token
+    budget. Returns the context text and its estimated token count.
+    """
+    intent = route(user_query.lower())
+    budget = token_budget()
+    sections = []
+    used = 0
+
+    def add_section(title, lines):
+        nonlocal used
+        kept = []
+        cost = estimate_tokens(title) + 1
+        for line in lines:
+            line_tokens = estimate_tokens(line) + 1
+            if used + cost + line_tokens > budget:
+                break
+            kept.append(line)
+            cost += line_tokens
+        if kept:
+            sections.append("\n".join([title, *kept]))
+            used += cost
+
+    try:
+        qna = qna_snapshot.derive(QnARetriever).top(user_query, top_k("qna"))
+    except Exception:
+        qna = []
+    add_section("Relevant questions and answers:", [f"Q: {question}\nA: {_clip(answer)}" for question, answer in qna])
+
+    if programs is None or programs is programme_snapshot.get():
+        retriever = programme_snapshot.derive(ProgrammeRetriever)
+    else:
+        retriever = ProgrammeRetriever(programs)
+    matched = retriever.top(user_query, top_k("programmes"), intent.category)
+    if not matched and not intent.category and intent.is_program_query:
+        matched = retriever.programs[:top_k("programmes")]
+    if matched:
+        title = f"Relevant programmes ({len(retriever.programs)} offered in total):"
+        if intent.category:
+            title = f"{intent.category} programmes ({len(retriever.in_category(intent.category))} in total):"
+        add_section(title, [programme_line(program) for program in matched])
+
+    if centers or intent.is_center_query or intent.is_lsc_query:
+        try:
+            center_retriever = CenterRetriever(centers) if centers else centers_snapshot.derive(CenterRetriever)
+        except Exception:
+            center_retriever = None
+        if center_retriever is not None:
+            add_section("Regional centers:", [center_line(center) for center in center_retriever.top(user_query, top_k("centers"))])
+
+    return "\n\n".join(sections), used
@@ -0,0 +1,156 @@
+from collections import Counter, defaultdict
+from difflib import SequenceMatcher
+
+# Common question patterns that boost the keyword score when both sides contain them
+QUESTION_PATTERNS = (
+    "what is", "what are", "how to", "when is", "when are", "where is", "where are",
+    "full form", "meaning of", "definition of", "eligibility", "admission", "fee",
+    "duration", "course", "program", "certificate", "degree", "how long"
+)
+
+SEQUENCE_WEIGHT = 0.4
+KEYWORD_WEIGHT = 0.6
+
+# A question sharing no token and no pattern with the query has a keyword
+# score of 0, so its combined score can never exceed the sequence weight.
+NO_OVERLAP_CEILING = SEQUENCE_WEIGHT
+
+
+def enhanced_keyword_matching(user_query, api_question):
+    """
+    Enhanced keyword matching that checks for common words and phrases
+    """
+    user_words = set(user_query.lower().split())
+    api_words = set(api_question.lower().split())
+
+    # Calculate word overlap
+    common_words = user_words.intersection(api_words)
+    word_overlap_ratio = len(common_words) / max(len(user_words), len(api_words))
+
+    # Check for key phrases
+    user_lower = user_query.lower()
+    api_lower = api_question.lower()
+
+    pattern_matches = 0
+    for pattern in QUESTION_PATTERNS:
+        if pattern in user_lower and pattern in api_lower:
+            pattern_matches += 1
+
+    # Boost score if patterns match
+    if pattern_matches > 0:
+        word_overlap_ratio += 0.2 * pattern_matches
+
+    return word_overlap_ratio
+
+
+def combined_similarity(user_query, api_question):
+    """The QnA score: 0.4 x sequence similarity + 0.6 x keyword similarity."""
+    sequence_similarity = SequenceMatcher(None, user_query.lower(), api_question.lower()).ratio()
+    return sequence_similarity * SEQUENCE_WEIGHT + enhanced_keyword_matching(user_query, api_question) * KEYWORD_WEIGHT
+
+
+class _Entry:
+    __slots__ = ("question", "answer", "lower", "tokens", "patterns", "char_counts")
+
+    def __init__(self, question, answer):
+        self.question = question
+        self.answer = answer
+        self.lower = question.lower()
+        self.tokens = frozenset(self.lower.split())
+        self.patterns = frozenset(p for p in QUESTION_PATTERNS if p in self.lower)
+        self.char_counts = Counter(self.lower)
+
+
+class QnAIndex:
+    """
+    Prebuilt index over the QnA feed.
+
+    Holds the lower-cased questions, their token sets, a token -> question
+    inverted index and a pattern -> question index. A query is only scored
+    against questions sharing a token or pattern with it, in feed order,
+    and the expensive SequenceMatcher.ratio() only runs when the cheap
+    upper bounds say the question could still beat the best score so far.
+    The best match is the same one the linear scan would pick.
+    """
+
+    def __init__(self, items):
+        self.entries = []
+        self.exact = {}
+        self.by_token = defaultdict(list)
+        self.by_pattern = defaultdict(list)
+        for item in items:
+            if "question" not in item or "answer" not in item:
+                continue
+            position = len(self.entries)
+            entry = _Entry(item["question"], item["answer"])
+            self.entries.append(entry)
+            self.exact.setdefault(entry.lower.strip(), entry)
+            for token in entry.tokens:
+                self.by_token[token].append(position)
+            for pattern in entry.patterns:
+                self.by_pattern[pattern].append(position)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def exact_match(self, user_query):
+        """Return the first question equal to the query ignoring case, as (question, answer)."""
+        entry = self.exact.get(user_query.lower().strip())
+        return (entry.question, entry.answer) if entry else None
+
+    def candidates(self, tokens, patterns):
+        positions = set()
+        for token in tokens:
+            positions.update(self.by_token.get(token, ()))
+        for pattern in patterns:
+            positions.update(self.by_pattern.get(pattern, ()))
+        return sorted(positions)
+
+    def best_match(self, user_query, threshold):
+        """
+        Return (question, answer, similarity) for the best-scoring question
+        whose similarity is above `threshold`, or None.
+        """
+        query_lower = user_query.lower()
+        query_tokens = frozenset(query_lower.split())
+        query_patterns = frozenset(p for p in QUESTION_PATTERNS if p in query_lower)
+        query_counts = Counter(query_lower)
+        query_len = len(query_lower)
+
+        if threshold >= NO_OVERLAP_CEILING:
+            positions = self.candidates(query_tokens, query_patterns)
+        else:
+            positions = range(len(self.entries))
+
+        best = None
+        best_similarity = threshold
+        for position in positions:
+            entry = self.entries[position]
+            keyword_similarity = len(query_tokens & entry.tokens) / max(len(query_tokens), len(entry.tokens))
+            keyword_similarity += 0.2 * len(query_patterns & entry.patterns)
+            keyword_part = keyword_similarity * KEYWORD_WEIGHT
+
+            total_len = query_len + len(entry.lower)
+            if not total_len:
+                continue
+            # real_quick_ratio, then quick_ratio, are upper bounds on ratio()
+            real_quick = 2.0 * min(query_len, len(entry.lower)) / total_len
+            if real_quick * SEQUENCE_WEIGHT + keyword_part <= best_similarity:
+                continue
+            quick = 2.0 * sum((query_counts & entry.char_counts).values()) / total_len
+            if quick * SEQUENCE_WEIGHT + keyword_part <= best_similarity:
+                continue
+
+            similarity = SequenceMatcher(None, query_lower, entry.lower).ratio() * SEQUENCE_WEIGHT + keyword_part
+            if similarity > best_similarity:
+                best = entry
+                best_similarity = similarity
+
+        if best is None:
+            return None
+        return best.question, best.answer, best_similarity
+
+
+def get_qna_index(snapshot):
+    """Return the index for the snapshot's current data, rebuilding it only when the feed changed."""
+    return snapshot.derive(QnAIndex)
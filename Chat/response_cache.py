@@ -0,0 +1,189 @@
+"""
+Response cache in front of process_query.
+
+Most chat traffic repeats the same questions ("list all programs",
+"regional centers", "pg programs"), and every deterministic answer
+depends only on the query text and the upstream feed data. Responses
+are cached under the canonical query and answer format plus the version
+of every feed snapshot and the matching engine, so a feed change simply
+stops old entries from being found. Entries are also dropped after a TTL and in
+LRU order once the cache is full.
+
+Only responses a branch marked with cacheable() are stored. The Groq
+fallback, numeric follow-ups and the fee-name prompt reply depend on
+more than the query and are never cached. Cached answers that changed
+the conversation state (a program list for numeric follow-ups, the fee
+prompt intent) replay those changes on a hit.
+"""
+import functools
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.http import HttpResponse
+
+from . import matching, metrics
+from .feeds import SNAPSHOTS
+from .fragments import response_format
+from .tracing import current, set_branch, span
+
+# Conversation state fields a cached branch may change, replayed on a hit
+STATE_FIELDS = ("pending_intent", "last_list")
+
+# Misspellings the router already accepts, rewritten to the word users meant
+TYPOS = {
+    "progams": "programs",
+    "cneters": "centers",
+    "cenrets": "centers",
+}
+_TYPO_PATTERN = re.compile(r"\b(" + "|".join(TYPOS) + r")\b", re.IGNORECASE)
+
+
+def normalize_query(text):
+    """Collapse whitespace and fix known keyword typos. process_query answers this form of the query."""
+    text = " ".join(text.split())
+    return _TYPO_PATTERN.sub(lambda m: TYPOS[m.group(1).lower()], text)
+
+
+def cacheable(response):
+    """Mark a process_query response as a pure function of the query and the feed data."""
+    response.cacheable = True
+    return response
+
+
+class ResponseCache:
+    """Thread-safe LRU cache with a per-entry TTL and hit/miss counters."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @property
+    def max_size(self):
+        return getattr(settings, "CHAT_RESPONSE_CACHE_SIZE", 512)
+
+    @property
+    def ttl(self):
+        return getattr(settings, "CHAT_RESPONSE_CACHE_TTL", 60)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, value = entry
+            if time.monotonic() >= expires_at:
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        max_size = self.max_size
+        if max_size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = self.evictions = self.expirations = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+            }
+
+
+response_cache = ResponseCache()
+
+metrics.registry.gauge(
+    "chat_response_cache_entries", "Answers held in the process_query response cache",
+    function=lambda: {(): len(response_cache._entries)},
+)
+
+
+def snapshot_versions():
+    """Version of every feed snapshot, 0 for feeds not loaded yet."""
+    return tuple(snapshot.version if snapshot.loaded else 0 for snapshot in SNAPSHOTS)
+
+
+def cache_key(request):
+    """Cache key for a process_query request, or None if it must not be served from the cache."""
+    try:
+        data = json.loads(request.body)
+        query = normalize_query(data.get("query", ""))
+    except (ValueError, AttributeError):
+        return None
+    if not query or query.isdigit() or request.chat_state.pending_intent:
+        return None
+    # Keyed on the exact query process_query answers, casing included, so an answer
+    # built from one asker's text is never replayed for another's
+    return (query, response_format(data), matching.engine(), snapshot_versions())
+
+
+def _consistent(before, after):
+    # A feed may be loaded for the first time while answering (version 0 -> n),
+    # but one that was refreshed mid-request may have been read at either version
+    return all(old == new or old == 0 for old, new in zip(before, after))
+
+
+def cache_response(view):
+    """Serve repeated deterministic process_query answers from response_cache."""
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        key = cache_key(request)
+        if key is None:
+            return view(request, *args, **kwargs)
+
+        with span("response_cache"):
+            cached = response_cache.get(key)
+        metrics.record_cache_lookup("response", cached is not None)
+        if cached is not None:
+            set_branch("cached")
+            content, status, state_changes, encoded_body = cached
+            request.chat_state.update(**state_changes)
+            response = HttpResponse(content, status=status, content_type="application/json")
+            if encoded_body is not None:
+                response.encoded_body = encoded_body
+            return response
+
+        state = request.chat_state
+        state.touched.clear()
+        response = view(request, *args, **kwargs)
+        versions = snapshot_versions()
+        trace = current()
+        stale = trace is not None and trace.stale  # answers from outage data are not kept past the outage
+        if getattr(response, "cacheable", False) and not stale and _consistent(key[-1], versions):
+            # Replay every field the branch set, even to the value this conversation already had
+            state_changes = {name: getattr(state, name) for name in STATE_FIELDS if name in state.touched}
+            response_cache.set(key[:-1] + (versions,), (
+                response.content, response.status_code, state_changes, getattr(response, "encoded_body", None),
+            ))
+        return response
+    return wrapper
@@ -0,0 +1,192 @@
+"""
+Intent routing for process_query.
+
+All the keyword lists process_query checks are compiled once, at import,
+into a single Aho-Corasick automaton. route() scans the lower-cased query
+once and derives every intent flag, the category alias and the name spans
+from the matches. Matching keeps the old substring semantics: a keyword
+counts wherever it occurs, including inside longer words and overlapping
+other keywords.
+"""
+import re
+from collections import deque
+
+CENTER_KEYWORDS = (
+    "center", "centre", "regional center", "study center",
+    "cneters", "centres", "cenrets",
+)
+PROGRAM_KEYWORDS = (
+    "program", "course", "study", "list programs", "show programs",
+    "progams", "courses", "program name",
+)
+LSC_KEYWORDS = (
+    "lsc", "learning support center", "study center",
+    "lscs", "learning support centers",
+)
+CATEGORY_KEYWORDS = (
+    "category", "field", "discipline", "stream", "branch", "type", "area",
+    "ug", "pg", "stp", "four year", "short term", "post graduate",
+    "under graduate", "degree",
+)
+FEE_KEYWORDS = ("fee structure", "fees", "admission fee", "tuition fee", "cost of program")
+FIELD_KEYWORDS = ('category', 'year', 'years', 'duration', 'description', 'desc', 'details', 'long')
+FIELD_CONNECTORS = ('of', 'for')
+LIST_WORDS = ("list", "show", "all")
+PROGRAM_COUNT_PHRASES = ("how many programs", "number of programs", "total programs", "programs count")
+
+CATEGORY_ALIASES = {
+    "fyug": "FYUG",
+    "fyugp": "FYUG",
+    "four year": "FYUG",
+    "honour": "FYUG",
+    "honours": "FYUG",
+    "short term": "STP",
+    "shortterm": "STP",
+    "short term program": "STP",
+    "short term programs": "STP",
+    "short term programmes": "STP",
+    "stp": "STP",
+    "ugp": "UG",
+    "ug": "UG",
+    "pg": "PG",
+    "post graduate": "PG",
+    "postgrad": "PG",
+    "postgraduates": "PG",
+    "under graduates": "UG"
+}
+
+# Where a fee question names its program: "fees for <program>"
+FEE_ANCHORS = ("fee structure", "fees", "cost")
+FEE_PROGRAM_TAIL = re.compile(r"\s+(?:for|of)\s+([\w\s]+)")
+# Where an LSC question names its regional center: "lsc under <rc>"
+RC_ANCHORS = ("lsc under ", "lsc's under ")
+
+KEYWORD_GROUPS = {
+    "center": CENTER_KEYWORDS,
+    "program": PROGRAM_KEYWORDS,
+    "lsc": LSC_KEYWORDS,
+    "category": CATEGORY_KEYWORDS,
+    "fee": FEE_KEYWORDS,
+    "field": FIELD_KEYWORDS,
+    "connector": FIELD_CONNECTORS,
+    "list": LIST_WORDS,
+    "program_count": PROGRAM_COUNT_PHRASES,
+    "category_alias": tuple(CATEGORY_ALIASES),
+    "fee_anchor": FEE_ANCHORS,
+    "rc_anchor": RC_ANCHORS,
+}
+
+# Longest alias wins; equal lengths keep the map order
+_ALIAS_RANK = {alias: rank for rank, alias in enumerate(sorted(CATEGORY_ALIASES, key=len, reverse=True))}
+
+
+class KeywordAutomaton:
+    """
+    Aho-Corasick automaton reporting every (start, keyword) occurrence, overlaps included.
+
+    Failure links are folded into the transition tables when it is built, so
+    scanning costs one dict lookup per character.
+    """
+
+    def __init__(self, keywords):
+        transitions = [{}]
+        outputs = [()]
+        for keyword in keywords:
+            state = 0
+            for char in keyword:
+                next_state = transitions[state].get(char)
+                if next_state is None:
+                    next_state = len(transitions)
+                    transitions[state][char] = next_state
+                    transitions.append({})
+                    outputs.append(())
+                state = next_state
+            if keyword not in outputs[state]:
+                outputs[state] += (keyword,)
+
+        alphabet = {char for keyword in keywords for char in keyword}
+        fail = [0] * len(transitions)
+        delta = [dict(transitions[0])] + [None] * (len(transitions) - 1)
+        queue = deque(transitions[0].values())
+        while queue:
+            state = queue.popleft()
+            outputs[state] += outputs[fail[state]]
+            row = {}
+            for char in alphabet:
+                next_state = transitions[state].get(char)
+                if next_state is None:
+                    target = delta[fail[state]].get(char, 0)
+                else:
+                    fail[next_state] = delta[fail[state]].get(char, 0)
+                    queue.append(next_state)
+                    target = next_state
+                if target:
+                    row[char] = target
+            delta[state] = row
+        self.delta = delta
+        self.outputs = [tuple((len(keyword), keyword) for keyword in out) for out in outputs]
+
+    def find_all(self, text):
+        delta = self.delta
+        outputs = self.outputs
+        state = 0
+        matches = []
+        for end, char in enumerate(text, 1):
+            state = delta[state].get(char, 0)
+            if outputs[state]:
+                matches.extend((end - length, keyword) for length, keyword in outputs[state])
+        return matches
+
+
+_GROUPS_BY_KEYWORD = {}
+for _group, _keywords in KEYWORD_GROUPS.items():
+    for _keyword in _keywords:
+        _GROUPS_BY_KEYWORD.setdefault(_keyword, set()).add(_group)
+
+AUTOMATON = KeywordAutomaton(_GROUPS_BY_KEYWORD)
+
+
+class Route:
+    """Everything process_query needs to know about a query's intent."""
+
+    def __init__(self, normalized_query, matches):
+        self.normalized_query = normalized_query
+        self.keywords = {keyword for _, keyword in matches}
+        groups = set()
+        for keyword in self.keywords:
+            groups |= _GROUPS_BY_KEYWORD[keyword]
+        self.groups = groups
+
+        self.is_program_query = "program" in groups
+        self.is_category_query = "category" in groups
+        self.is_center_query = "center" in groups
+        self.is_lsc_query = "lsc" in groups
+        self.is_fee_query = "fee" in groups
+        self.is_field_query = "field" in groups and "connector" in groups
+        self.is_list_request = "list" in groups
+        self.is_program_count_query = "program_count" in groups
+
+        aliases = [keyword for keyword in self.keywords if keyword in CATEGORY_ALIASES]
+        self.category_alias = min(aliases, key=_ALIAS_RANK.__getitem__) if aliases else None
+        self.category = CATEGORY_ALIASES[self.category_alias] if self.category_alias else None
+
+        self.fee_program = None
+        for start, keyword in sorted(m for m in matches if m[1] in FEE_ANCHORS):
+            tail = FEE_PROGRAM_TAIL.match(normalized_query, start + len(keyword))
+            if tail:
+                self.fee_program = tail.group(1).strip()
+                break
+
+        self.rc_name = None
+        rc_anchors = sorted(m for m in matches if m[1] in RC_ANCHORS)
+        if rc_anchors:
+            start, keyword = rc_anchors[0]
+            self.rc_name = normalized_query[start + len(keyword):].split("\n", 1)[0].strip()
+
+    def __repr__(self):
+        return f"<Route {sorted(self.groups)} category={self.category!r} fee_program={self.fee_program!r} rc_name={self.rc_name!r}>"
+
+
+def route(normalized_query):
+    """Scan a lower-cased query once and return its Route."""
+    return Route(normalized_query, AUTOMATON.find_all(normalized_query))
@@ -0,0 +1,267 @@
+"""
+Feed snapshots shared by every worker process through memory-mapped files.
+
+With CHAT_SHARED_SNAPSHOT_DIR set, each feed is kept in one file in that
+directory, written by whichever worker refreshes the feed and read by all
+of them through mmap. The records are stored column by column in a
+compact binary layout, so a worker reads a field straight from the shared
+pages when it is accessed instead of parsing JSON into its own heap: the
+feed data is in memory once per machine, not once per worker.
+
+File layout (little-endian):
+
+    header (64 bytes)   magic, format, generation, written_at (unix time),
+                        record count, column count, payload size and CRC32
+    column directory    per column: name length (u16), name, block offset (u64)
+    column blocks       per column: one type tag per record (u8), padded to
+                        4 bytes, record count + 1 heap offsets (u32), heap
+
+Strings are stored as UTF-8, integers as i64, floats as f64 and anything
+else (lists, nested objects) as JSON. A missing key has its own tag, so
+records keep exactly the keys they had.
+
+A new version is written to a temporary file in the same directory and
+renamed over the old one, so readers only ever see complete files. A
+reader stats the path on every access and maps the file again when it was
+replaced; the generation in the header tells it whether the data changed
+or only its freshness did. Workers mapping an older file keep a valid
+view of it until they let go of it. Writers take an exclusive flock on a
+lock file next to the snapshot, so one worker refreshes at a time.
+
+Renaming over a file another process has mapped needs POSIX semantics
+(and flock), so the shared snapshot is not available on Windows.
+"""
+import collections.abc
+import contextlib
+import json
+import logging
+import mmap
+import os
+import struct
+import tempfile
+import time
+import zlib
+
+try:
+    import fcntl
+except ImportError:  # Windows: no flock, and mapped files cannot be replaced
+    fcntl = None
+
+logger = logging.getLogger("chatbot")
+
+MAGIC = b"SGOUSNAP"
+FORMAT = 1
+HEADER = struct.Struct("<8sIIQdIIQI")
+HEADER_SIZE = 64
+
+MISSING, NULL, STR, INT, FLOAT, TRUE, FALSE, JSON = range(8)
+
+_U16 = struct.Struct("<H")
+_U64 = struct.Struct("<Q")
+_OFFSETS = struct.Struct("<II")
+_I64 = struct.Struct("<q")
+_F64 = struct.Struct("<d")
+
+
+def is_supported():
+    return fcntl is not None
+
+
+def _encode_value(value):
+    if value is None:
+        return NULL, b""
+    if value is True:
+        return TRUE, b""
+    if value is False:
+        return FALSE, b""
+    if isinstance(value, str):
+        return STR, value.encode("utf-8")
+    if isinstance(value, int) and -2 ** 63 <= value < 2 ** 63:
+        return INT, _I64.pack(value)
+    if isinstance(value, float):
+        return FLOAT, _F64.pack(value)
+    return JSON, json.dumps(value).encode("utf-8")
+
+
+def encode_payload(records):
+    """The column directory and blocks for a list of dicts; raises TypeError for anything else."""
+    names = {}
+    for record in records:
+        if not isinstance(record, collections.abc.Mapping):
+            raise TypeError(f"Only lists of objects can be shared, got a {type(record).__name__}")
+        for name in record:
+            names.setdefault(str(name), None)
+
+    count = len(records)
+    blocks = []
+    for name in names:
+        tags = bytearray(count)
+        offsets = [0]
+        heap = bytearray()
+        for i, record in enumerate(records):
+            if name in record:
+                tags[i], data = _encode_value(record[name])
+                heap += data
+            offsets.append(len(heap))
+        padding = b"\0" * (-count % 4)
+        blocks.append(bytes(tags) + padding + struct.pack(f"<{count + 1}I", *offsets) + heap)
+
+    directory_size = sum(_U16.size + len(name.encode("utf-8")) + _U64.size for name in names)
+    position = HEADER_SIZE + directory_size
+    directory = bytearray()
+    for name, block in zip(names, blocks):
+        encoded_name = name.encode("utf-8")
+        directory += _U16.pack(len(encoded_name)) + encoded_name + _U64.pack(position)
+        position += len(block)
+    return len(names), bytes(directory) + b"".join(blocks)
+
+
+class MappedRecord(collections.abc.Mapping):
+    """One record of a MappedSnapshot, read from the mapping field by field."""
+    __slots__ = ("_snapshot", "_index")
+
+    def __init__(self, snapshot, index):
+        self._snapshot = snapshot
+        self._index = index
+
+    def __getitem__(self, key):
+        return self._snapshot.value(self._index, key)
+
+    def __iter__(self):
+        return self._snapshot.keys(self._index)
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return repr(dict(self))
+
+
+class MappedSnapshot:
+    """A snapshot file mapped read-only into memory."""
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            stat = os.fstat(f.fileno())
+            if stat.st_size < HEADER_SIZE:
+                raise ValueError(f"{path} is too short to be a snapshot")
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.identity = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        (magic, file_format, _flags, self.generation, self.written_at,
+         self.count, column_count, self.payload_size, self.crc) = HEADER.unpack_from(self._map)
+        if magic != MAGIC or file_format != FORMAT:
+            raise ValueError(f"{path} is not a version {FORMAT} snapshot")
+        if HEADER_SIZE + self.payload_size != stat.st_size:
+            raise ValueError(f"{path} is truncated")
+
+        # name -> (tags offset, heap offsets offset, heap offset)
+        self._columns = {}
+        position = HEADER_SIZE
+        for _ in range(column_count):
+            (length,) = _U16.unpack_from(self._map, position)
+            name = self._map[position + 2:position + 2 + length].decode("utf-8")
+            (block,) = _U64.unpack_from(self._map, position + 2 + length)
+            position += 2 + length + _U64.size
+            offsets = block + self.count + (-self.count % 4)
+            self._columns[name] = (block, offsets, offsets + 4 * (self.count + 1))
+        self.records = [MappedRecord(self, i) for i in range(self.count)]
+
+    def value(self, index, name):
+        column = self._columns.get(name)
+        if column is None:
+            raise KeyError(name)
+        tags, offsets, heap = column
+        tag = self._map[tags + index]
+        if tag == MISSING:
+            raise KeyError(name)
+        if tag == NULL:
+            return None
+        if tag == TRUE:
+            return True
+        if tag == FALSE:
+            return False
+        start, end = _OFFSETS.unpack_from(self._map, offsets + 4 * index)
+        if tag == STR:
+            return self._map[heap + start:heap + end].decode("utf-8")
+        if tag == INT:
+            return _I64.unpack_from(self._map, heap + start)[0]
+        if tag == FLOAT:
+            return _F64.unpack_from(self._map, heap + start)[0]
+        return json.loads(self._map[heap + start:heap + end])
+
+    def keys(self, index):
+        for name, (tags, _, _) in self._columns.items():
+            if self._map[tags + index] != MISSING:
+                yield name
+
+
+class SharedFeedFile:
+    """The shared snapshot file of one feed, as seen by this process."""
+
+    def __init__(self, directory, name):
+        self.directory = directory
+        self.path = os.path.join(directory, f"{name}.snapshot")
+        self.lock_path = self.path + ".lock"
+        self._mapped = None
+
+    def current(self):
+        """The latest snapshot on disk, mapped, or None if there is none yet."""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        mapped = self._mapped
+        if mapped is not None and mapped.identity == (stat.st_ino, stat.st_mtime_ns, stat.st_size):
+            return mapped
+        try:
+            mapped = self._mapped = MappedSnapshot(self.path)
+        except (OSError, ValueError) as e:
+            logger.warning("Ignoring unreadable shared snapshot %s: %s", self.path, e)
+            return None
+        return mapped
+
+    @contextlib.contextmanager
+    def locked(self, blocking=True):
+        """Hold the writer lock; yields False without waiting if `blocking` is off and it is taken."""
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.lock_path, "a") as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+            except BlockingIOError:
+                yield False
+                return
+            try:
+                yield True
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def publish(self, records):
+        """
+        Write `records` as the new snapshot, atomically, and map it. The
+        generation only goes up when the records differ from the current
+        file's; otherwise just the written_at time moves. Call with the
+        writer lock held.
+        """
+        column_count, payload = encode_payload(records)
+        crc = zlib.crc32(payload)
+        current = self.current()
+        generation = 1
+        if current is not None:
+            same = current.crc == crc and current.payload_size == len(payload) \
+                and current._map[HEADER_SIZE:] == payload
+            generation = current.generation if same else current.generation + 1
+        header = HEADER.pack(MAGIC, FORMAT, 0, generation, time.time(), len(records), column_count, len(payload), crc)
+
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(self.path), prefix=".snapshot-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(header.ljust(HEADER_SIZE, b"\0"))
+                f.write(payload)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, self.path)
+        except BaseException:
+            with contextlib.suppress(FileNotFoundError):
+                os.unlink(temp_path)
+            raise
+        return self.current()
@@ -0,0 +1,204 @@
+"""
+Mirror the SGOU feeds into the Chat models.
+
+`manage.py sync_upstream` fetches programmes, regional centers, LSCs and
+QnA, then upserts them in one transaction: new rows are bulk-created,
+changed rows bulk-updated and rows that vanished from a feed deleted.
+Only mirrored rows (those with a source_id) are touched; anything entered
+through the admin stays as it is.
+
+Each mirrored row keeps the upstream record in source_data, so with
+CHAT_DATA_SOURCE = "database" the feed snapshots read exactly what the
+API would have returned, and process_query runs without sgou.ac.in.
+"""
+import hashlib
+import logging
+
+from django.db import transaction
+
+from . import feeds, model_versions
+from .centers import clean_rc_name, lsc_rc_id
+from .models import Faq, LearningSupportCenter, Program, ProgramCategory, RegionalCenter, UpstreamSync
+
+logger = logging.getLogger("chatbot")
+
+BATCH_SIZE = 500
+
+# Feed name -> mirrored model, in the order they are synced (LSCs point at RCs)
+FEED_MODELS = {
+    "centers": RegionalCenter,
+    "lsc": LearningSupportCenter,
+    "programmes": Program,
+    "qna": Faq,
+}
+
+
+def fetch_upstream():
+    """Download every feed from the SGOU API. Raises if any of them fails."""
+    return {
+        "centers": feeds.load_centers(),
+        "lsc": feeds.load_lscs(),
+        "programmes": feeds.load_programmes(),
+        "qna": feeds.load_qna(),
+    }
+
+
+def load_from_database(feed):
+    """The mirrored records of one feed, in upstream order."""
+    model = FEED_MODELS[feed]
+    records = list(
+        model.objects.filter(source_id__isnull=False)
+        .order_by('source_order', 'id')
+        .values_list('source_data', flat=True)
+    )
+    if not records and not UpstreamSync.objects.exists():
+        logger.warning("CHAT_DATA_SOURCE is 'database' but sync_upstream has never run")
+    return records
+
+
+def source_key(item, *fallback_fields):
+    """Natural key of an upstream record: its id, else a hash of its identifying fields."""
+    item_id = item.get("id")
+    if item_id not in (None, ""):
+        return str(item_id)
+    text = "\x1f".join(str(item.get(field, "")) for field in fallback_fields)
+    return "h:" + hashlib.sha1(text.encode("utf-8")).hexdigest()[:24]
+
+
+def _clip(model, field, value):
+    value = "" if value is None else str(value)
+    return value[:model._meta.get_field(field).max_length]
+
+
+def _months(years):
+    try:
+        return max(int(float(years) * 12), 0)
+    except (TypeError, ValueError):
+        return 0
+
+
+def center_fields(item, context):
+    name = item.get("rcname") or item.get("name") or item.get("center_name") or ""
+    return {
+        "name": _clip(RegionalCenter, "name", clean_rc_name(name)),
+        "address": _clip(RegionalCenter, "address", item.get("rcaddress") or item.get("address")),
+        "contact_number": _clip(RegionalCenter, "contact_number", item.get("headnumber") or item.get("phone")),
+    }
+
+
+def lsc_fields(item, context):
+    rc_id = lsc_rc_id(item)
+    return {
+        "name": _clip(LearningSupportCenter, "name", item.get("lscname")),
+        "address": _clip(LearningSupportCenter, "address", item.get("lscaddress")),
+        "contact_number": _clip(LearningSupportCenter, "contact_number", item.get("lscnumber")),
+        "regional_center_id": context["centers"].get(str(rc_id)) if rc_id is not None else None,
+    }
+
+
+def program_fields(item, context):
+    return {
+        "name": _clip(Program, "name", item.get("pgm_name")),
+        "category_id": context["categories"][item.get("pgm_category") or "Uncategorized"],
+        "duration": _months(item.get("pgm_year")),
+        "mode": _clip(Program, "mode", item.get("pgm_mode")),
+        "description": item.get("pgm_desc") or "",
+        "fee_structure": str(item.get("pgm_fee") or ""),
+        "eligibility": item.get("pgm_eligibility") or "",
+    }
+
+
+def faq_fields(item, context):
+    return {
+        "question": _clip(Faq, "question", item.get("question")),
+        "answer": item.get("answer") or "",
+    }
+
+
+FEED_FIELDS = {
+    "centers": (center_fields, ("rcname", "name")),
+    "lsc": (lsc_fields, ("lscname", "lscaddress")),
+    "programmes": (program_fields, ("pgm_name", "pgm_category")),
+    "qna": (faq_fields, ("question",)),
+}
+
+
+def _program_categories(programmes):
+    """ProgramCategory id per upstream category name, creating the missing ones."""
+    durations = {}
+    for item in programmes:
+        durations.setdefault(item.get("pgm_category") or "Uncategorized", _months(item.get("pgm_year")))
+    categories = dict(ProgramCategory.objects.filter(name__in=durations).values_list("name", "id"))
+    missing = [ProgramCategory(name=name, duration=duration) for name, duration in durations.items() if name not in categories]
+    if missing:
+        ProgramCategory.objects.bulk_create(missing, batch_size=BATCH_SIZE)
+        model_versions.bump(ProgramCategory)
+        categories.update(ProgramCategory.objects.filter(name__in=durations).values_list("name", "id"))
+    return categories
+
+
+def _mirror(model, items, to_fields, key_fields, context, allow_delete):
+    existing = {obj.source_id: obj for obj in model.objects.filter(source_id__isnull=False)}
+    seen = set()
+    to_create, to_update = [], []
+    update_fields = set()
+    for order, item in enumerate(items):
+        key = source_key(item, *key_fields)
+        if key in seen:
+            continue
+        seen.add(key)
+        values = to_fields(item, context)
+        values.update(source_order=order, source_data=item)
+        obj = existing.get(key)
+        if obj is None:
+            to_create.append(model(source_id=key, **values))
+            continue
+        changed = [field for field, value in values.items() if getattr(obj, field) != value]
+        if changed:
+            for field in changed:
+                setattr(obj, field, values[field])
+            update_fields.update(changed)
+            to_update.append(obj)
+
+    model.objects.bulk_create(to_create, batch_size=BATCH_SIZE)
+    if to_update:
+        model.objects.bulk_update(to_update, sorted(update_fields), batch_size=BATCH_SIZE)
+
+    stale = [obj.pk for key, obj in existing.items() if key not in seen]
+    if stale and not allow_delete:
+        logger.warning("%s feed is empty; keeping %d mirrored rows", model.__name__, len(stale))
+        stale = []
+    for start in range(0, len(stale), BATCH_SIZE):
+        model.objects.filter(pk__in=stale[start:start + BATCH_SIZE]).delete()
+
+    return {"created": len(to_create), "updated": len(to_update), "deleted": len(stale)}
+
+
+def sync(data, allow_empty=False):
+    """
+    Mirror already-fetched feed data into the database in one transaction.
+    Returns the UpstreamSync row recording the run.
+
+    A feed that comes back empty deletes nothing unless allow_empty is set,
+    so an upstream hiccup can't wipe the mirror.
+    """
+    with transaction.atomic(), model_versions.batched():
+        stats = {}
+        context = {}
+        for feed, model in FEED_MODELS.items():
+            items = data.get(feed, [])
+            to_fields, key_fields = FEED_FIELDS[feed]
+            if feed == "lsc":
+                context["centers"] = dict(
+                    RegionalCenter.objects.filter(source_id__isnull=False).values_list("source_id", "id")
+                )
+            elif feed == "programmes":
+                context["categories"] = _program_categories(items)
+            stats[feed] = _mirror(model, items, to_fields, key_fields, context, allow_delete=bool(items) or allow_empty)
+            if any(stats[feed].values()):
+                model_versions.bump(model)
+
+        version = UpstreamSync.current_version()
+        if any(any(counts.values()) for counts in stats.values()):
+            version += 1
+        return UpstreamSync.objects.create(version=version, stats=stats)
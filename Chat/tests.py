@@ -1,3 +1,1402 @@
-from django.test import TestCase
+import asyncio
+import gzip
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock, skipUnless
 
-# Create your tests here.
+import requests
+from django.conf import settings
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from urllib3.exceptions import MaxRetryError
+
+from . import completion_cache, compression, deadline, matching, metrics, shared_snapshot, tfidf, tracing, upstream, views
+from .centers import CenterDirectory
+from .conversation import FEE_PROGRAM, cookie_name, load_state
+from .fragments import get_programme_fragments
+from . import feeds
+from .feeds import FeedSnapshot, centers_snapshot, lsc_snapshot, programme_snapshot, qna_snapshot
+from .models import CachedCompletion, Faq, LearningSupportCenter, Program, UpstreamSync
+from .response_cache import normalize_query, response_cache
+from .prompt_context import build_context, estimate_tokens
+from .qna_index import QnAIndex, combined_similarity, get_qna_index
+from .router import route
+from .upstream import AsyncUpstreamClient, CoalescedWaitTimeout, SingleFlight, UpstreamClient
+
+with open(os.path.join(os.path.dirname(__file__), "faq_data.json"), encoding="utf-8") as faq_file:
+    SAMPLE_QNA = json.load(faq_file)
+
+SAMPLE_PROGRAMMES = [
+    {"id": 1, "pgm_name": "BA English", "pgm_desc": "English language and literature", "pgm_category": "UG", "pgm_year": "3"},
+    {"id": 2, "pgm_name": "MA History", "pgm_desc": "History of Kerala and India", "pgm_category": "PG", "pgm_year": "2"},
+    {"id": 3, "pgm_name": "B.Com Finance", "pgm_desc": "Commerce with finance", "pgm_category": "FYUG", "pgm_year": "4"},
+]
+
+SAMPLE_CENTERS = [
+    {"id": 1, "rcname": "REGIONAL CENTRE \u2013 ERNAKULAM", "rcaddress": "Kalamassery", "headname": "Dr. A"},
+    {"id": 2, "rcname": "REGIONAL CENTRE -\xa0KOZHIKODE", "rcaddress": "Kozhikode", "headname": "Dr. B"},
+]
+
+SAMPLE_LSCS = [
+    {"lscname": "Maharajas College", "lscrc": "1", "coordinatorname": "C1"},
+    {"lscname": "St. Teresas College", "lscrc": 1, "coordinatorname": "C2"},
+    {"lscname": "Farook College", "lscrc": "2", "coordinatorname": "C3"},
+]
+
+
+class FeedSnapshotTests(TestCase):
+    def test_first_get_loads_synchronously(self):
+        loader = mock.Mock(return_value=["a"])
+        snapshot = FeedSnapshot("test", loader, "TEST_TTL", 60)
+        self.assertEqual(snapshot.get(), ["a"])
+        self.assertEqual(snapshot.get(), ["a"])
+        loader.assert_called_once()
+        self.assertEqual(snapshot.version, 1)
+
+    def test_cold_load_failure_propagates(self):
+        loader = mock.Mock(side_effect=requests.exceptions.Timeout("slow"))
+        snapshot = FeedSnapshot("test", loader, "TEST_TTL", 60)
+        with self.assertRaises(requests.exceptions.Timeout):
+            snapshot.get()
+
+    def test_failed_refresh_keeps_last_known_good(self):
+        loader = mock.Mock(side_effect=[["a"], requests.exceptions.ConnectionError("down")])
+        snapshot = FeedSnapshot("test", loader, "TEST_TTL", 60)
+        snapshot.get()
+        self.assertFalse(snapshot.refresh())
+        self.assertEqual(snapshot.get(), ["a"])
+        self.assertEqual(snapshot.version, 1)
+
+    @override_settings(TEST_TTL=0)
+    def test_stale_snapshot_is_served_while_revalidating(self):
+        loader = mock.Mock(side_effect=[["a"], ["b"]])
+        snapshot = FeedSnapshot("test", loader, "TEST_TTL", 60)
+        snapshot.get()
+        with mock.patch.object(snapshot, "_refresh_in_background") as refresh:
+            self.assertEqual(snapshot.get(), ["a"])
+            refresh.assert_called_once()
+        snapshot.refresh()
+        self.assertEqual(snapshot.get(), ["b"])
+        self.assertEqual(snapshot.version, 2)
+
+    @override_settings(TEST_TTL=0, CHAT_FEED_RETRY_INTERVAL=60)
+    def test_failed_refresh_holds_off_background_refreshes(self):
+        loader = mock.Mock(side_effect=[["a"], requests.exceptions.ConnectionError("down"), ["b"]])
+        snapshot = FeedSnapshot("test", loader, "TEST_TTL", 60)
+        snapshot.get()
+        self.assertFalse(snapshot.refresh())
+        with mock.patch("threading.Thread") as thread:
+            for _ in range(3):
+                self.assertEqual(snapshot.get(), ["a"])
+            thread.assert_not_called()
+
+            with override_settings(CHAT_FEED_RETRY_INTERVAL=0):
+                snapshot.get()
+            thread.assert_called_once()
+        self.assertTrue(snapshot.refresh())
+        self.assertTrue(snapshot.retry_due())
+
+
+def run_concurrently(fn, count):
+    """Call fn() from `count` threads at once; returns the results or exceptions, in thread order."""
+    results = [None] * count
+    barrier = threading.Barrier(count)
+
+    def run(i):
+        barrier.wait()
+        try:
+            results[i] = fn()
+        except Exception as e:
+            results[i] = e
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+class SingleFlightTests(TestCase):
+    def slow(self, result, delay=0.1):
+        def fetch():
+            time.sleep(delay)
+            if isinstance(result, Exception):
+                raise result
+            return result
+        return mock.Mock(side_effect=fetch)
+
+    def test_concurrent_callers_share_one_call(self):
+        flights = SingleFlight()
+        fetch = self.slow(["a"])
+        self.assertEqual(run_concurrently(lambda: flights.do("k", fetch), 8), [["a"]] * 8)
+        fetch.assert_called_once()
+        self.assertFalse(flights.in_flight("k"))
+        # Once the call finished, the next caller makes a new one
+        flights.do("k", fetch)
+        self.assertEqual(fetch.call_count, 2)
+
+    def test_errors_are_shared(self):
+        flights = SingleFlight()
+        fetch = self.slow(requests.exceptions.ConnectionError("down"))
+        results = run_concurrently(lambda: flights.do("k", fetch), 4)
+        self.assertTrue(all(isinstance(r, requests.exceptions.ConnectionError) for r in results))
+        fetch.assert_called_once()
+
+    def test_waiting_is_bounded(self):
+        flights = SingleFlight()
+        fetch = self.slow(["a"], delay=0.3)
+        results = run_concurrently(lambda: flights.do("k", fetch, timeout=0.05), 3)
+        self.assertEqual(results.count(["a"]), 1)
+        self.assertEqual(sum(isinstance(r, CoalescedWaitTimeout) for r in results), 2)
+        self.assertTrue(issubclass(CoalescedWaitTimeout, requests.exceptions.Timeout))
+
+    def test_cold_snapshot_is_fetched_once(self):
+        loader = self.slow(["a"])
+        snapshot = FeedSnapshot("test", loader, "TEST_TTL", 60)
+        self.assertEqual(run_concurrently(snapshot.get, 8), [["a"]] * 8)
+        loader.assert_called_once()
+        self.assertEqual(snapshot.version, 1)
+
+    def test_program_model_shares_downloads_and_falls_back(self):
+        from program_model import ProgramModel
+
+        model = ProgramModel()
+        response = mock.Mock(status_code=200)
+        response.json.return_value = {"programme": [{"name": "BA English"}]}
+
+        def slow_get(*args, **kwargs):
+            time.sleep(0.1)
+            return response
+
+        with mock.patch("program_model.upstream.get", side_effect=slow_get) as get:
+            self.assertEqual(run_concurrently(model.fetch_programs, 6), [[{"name": "BA English"}]] * 6)
+        get.assert_called_once()
+
+        model.last_fetch -= model.cache_duration
+        with mock.patch("program_model.upstream.get", side_effect=requests.exceptions.ConnectionError("down")):
+            self.assertEqual(model.fetch_programs(), [{"name": "BA English"}])
+
+
+class UpstreamClientTests(TestCase):
+    @override_settings(CHAT_UPSTREAM_TIMEOUTS={"qna": 3})
+    def test_per_endpoint_timeouts(self):
+        client = UpstreamClient()
+        self.assertEqual(client.timeout_for("qna"), 3)
+        self.assertEqual(client.timeout_for("groq"), 30)
+
+    @override_settings(CHAT_UPSTREAM_RETRIES=4, CHAT_UPSTREAM_POOL_SIZE=7)
+    def test_session_is_shared_and_pooled(self):
+        client = UpstreamClient()
+        self.assertIs(client.session, client.session)
+        adapter = client.session.get_adapter("https://sgou.ac.in/api/programmes")
+        self.assertEqual(adapter.max_retries.total, 4)
+        self.assertEqual(adapter._pool_maxsize, 7)
+
+
+class QnAIndexTests(TestCase):
+    def linear_best_match(self, query, threshold):
+        best, best_similarity = None, 0
+        for item in SAMPLE_QNA:
+            similarity = combined_similarity(query, item["question"])
+            if similarity > best_similarity:
+                best, best_similarity = item, similarity
+        if best and best_similarity > threshold:
+            return best["question"], best["answer"], best_similarity
+        return None
+
+    def test_matches_linear_scan(self):
+        index = QnAIndex(SAMPLE_QNA)
+        queries = [item["question"].lower() for item in SAMPLE_QNA] + [
+            "what is the admission process", "how can i get study material", "fees", "exam dates?",
+        ]
+        for threshold in (0.7, 0.3):
+            for query in queries:
+                self.assertEqual(index.best_match(query, threshold), self.linear_best_match(query, threshold), query)
+
+    def test_exact_match_ignores_case(self):
+        index = QnAIndex(SAMPLE_QNA)
+        question, answer = index.exact_match(SAMPLE_QNA[0]["question"].upper())
+        self.assertEqual(answer, SAMPLE_QNA[0]["answer"])
+
+    def test_index_rebuilt_only_when_feed_changes(self):
+        snapshot = FeedSnapshot("test-qna", mock.Mock(side_effect=[SAMPLE_QNA, SAMPLE_QNA, SAMPLE_QNA[:1]]), "TEST_TTL", 60)
+        snapshot.get()
+        first = get_qna_index(snapshot)
+        snapshot.refresh()
+        self.assertIs(get_qna_index(snapshot), first)
+        snapshot.refresh()
+        self.assertEqual(len(get_qna_index(snapshot)), 1)
+
+
+@skipUnless(tfidf.is_available(), "numpy and scipy are required for the TF-IDF engine")
+class TfidfMatchingTests(TestCase):
+    def test_batch_scores_match_single_queries(self):
+        matcher = tfidf.TfidfMatcher([p["pgm_name"] for p in SAMPLE_PROGRAMMES])
+        queries = ["ma histroy", "ba english", "bcom finance"]
+        batch = matcher.batch_scores(queries)
+        for row, query in enumerate(queries):
+            self.assertEqual(list(batch[row]), list(matcher.scores(query)))
+        self.assertEqual([hit[0] for hit in matcher.best_batch(queries, 0.3)], [1, 0, 2])
+
+    @override_settings(CHAT_MATCHING_ENGINE="tfidf")
+    def test_engine_is_selectable_by_setting(self):
+        program, similarity = matching.best_program("ma histroy", SAMPLE_PROGRAMMES)
+        self.assertEqual(program["pgm_name"], "MA History")
+        self.assertLessEqual(similarity, 1.0)
+        snapshot = FeedSnapshot("test-qna", lambda: SAMPLE_QNA, "TEST_TTL", 60)
+        question, answer, similarity = matching.best_qna_match("how can i get the study materials", snapshot)
+        self.assertEqual(question, "How can I get study materials?")
+
+
+# Routing decisions process_query made before the compiled router, pinned:
+# (query, intent flags, category, fee program span, regional center span)
+ROUTING_CORPUS = [
+    ('list all programs', {'list', 'program'}, None, None, None),
+    ('List all programs', {'list', 'program'}, None, None, None),
+    ('Our Regional Centers', {'center'}, None, None, None),
+    ('How long is the BA program?', {'program'}, None, None, None),
+    ('What are the admission requirements?', set(), None, None, None),
+    ('list all study centers', {'center', 'list', 'lsc', 'program'}, None, None, None),
+    ('center contact information', {'center'}, None, None, None),
+    ('lsc', {'lsc'}, None, None, None),
+    ('show all lscs', {'list', 'lsc'}, None, None, None),
+    ('lsc under regional center kozhikode', {'center', 'lsc'}, None, None, 'regional center kozhikode'),
+    ("lsc's under regional centre – ernakulam", {'center', 'lsc'}, None, None, 'regional centre – ernakulam'),
+    ('learning support centers', {'center', 'lsc'}, None, None, None),
+    ('fees', {'fee'}, None, None, None),
+    ('fee structure for ba english', {'fee'}, None, 'ba english', None),
+    ('what is the cost of mba', set(), None, 'mba', None),
+    ('fees of b.com finance', {'fee'}, None, 'b', None),
+    ('tuition fee', {'fee'}, None, None, None),
+    ('how many programs', {'count', 'program'}, None, None, None),
+    ('number of programs do you have', {'count', 'program'}, None, None, None),
+    ('list pg programs', {'category', 'list', 'program'}, 'PG', None, None),
+    ('ug programs', {'category', 'program'}, 'UG', None, None),
+    ('short term programs', {'category', 'program'}, 'STP', None, None),
+    ('show me four year honours courses', {'category', 'list', 'program'}, 'FYUG', None, None),
+    ('postgraduates courses', {'program'}, 'PG', None, None),
+    ('programs under stp category', {'category', 'program'}, 'STP', None, None),
+    ('category of ma history', {'category', 'field'}, None, None, None),
+    ('duration of ba english', {'field'}, None, None, None),
+    ('description for b.com finance', {'field'}, None, None, None),
+    ('details of mba', {'field'}, None, None, None),
+    ('how long for bcom', {'field'}, None, None, None),
+    ('ma history', set(), None, None, None),
+    ('ba english', set(), None, None, None),
+    ('hello', set(), None, None, None),
+    ('hi', set(), None, None, None),
+    ('3', set(), None, None, None),
+    ('what is the full form of sgou', set(), None, None, None),
+    ('tell me about small call centres', {'center', 'list'}, None, None, None),
+    ('which stream is degree under', {'category'}, None, None, None),
+    ('cneters', {'center'}, None, None, None),
+    ('program name list', {'list', 'program'}, None, None, None),
+]
+
+ROUTE_FLAGS = {
+    "program": "is_program_query",
+    "category": "is_category_query",
+    "center": "is_center_query",
+    "lsc": "is_lsc_query",
+    "fee": "is_fee_query",
+    "field": "is_field_query",
+    "list": "is_list_request",
+    "count": "is_program_count_query",
+}
+
+
+class RouterTests(TestCase):
+    def test_routing_corpus(self):
+        for query, flags, category, fee_program, rc_name in ROUTING_CORPUS:
+            with self.subTest(query=query):
+                intent = route(query.lower())
+                self.assertEqual({flag for flag, attr in ROUTE_FLAGS.items() if getattr(intent, attr)}, flags)
+                self.assertEqual(intent.category, category)
+                self.assertEqual(intent.fee_program, fee_program)
+                self.assertEqual(intent.rc_name, rc_name)
+
+
+class ProcessQueryTestCase(TestCase):
+    """Runs process_query against canned upstream data instead of sgou.ac.in."""
+
+    def setUp(self):
+        feeds = (
+            (programme_snapshot, SAMPLE_PROGRAMMES),
+            (qna_snapshot, SAMPLE_QNA),
+            (centers_snapshot, SAMPLE_CENTERS),
+            (lsc_snapshot, SAMPLE_LSCS),
+        )
+        for snapshot, data in feeds:
+            snapshot.invalidate()
+            for patcher in (
+                mock.patch.object(snapshot, "loader", return_value=data),
+                mock.patch.object(snapshot, "async_loader", mock.AsyncMock(return_value=data)),
+            ):
+                patcher.start()
+                self.addCleanup(patcher.stop)
+            self.addCleanup(snapshot.invalidate)
+        response_cache.clear()
+        self.addCleanup(response_cache.clear)
+        self.programme_loader = programme_snapshot.loader
+        self.centers_loader = centers_snapshot.loader
+        self.lsc_loader = lsc_snapshot.loader
+
+    def ask(self, query):
+        response = self.client.post("/process_query", json.dumps({"query": query}), content_type="application/json")
+        return response.json()
+
+
+class ProgrammeSnapshotViewTests(ProcessQueryTestCase):
+    def test_program_branches_share_one_download(self):
+        self.assertEqual(self.ask("how many programs")["message"], "We have 3 programs available.")
+        self.assertIn("MA History", self.ask("list pg programs")["message"])
+        self.assertIn("is: <strong>PG</strong>", self.ask("category of ma history")["message"])
+        self.programme_loader.assert_called_once()
+
+
+class QnAViewTests(ProcessQueryTestCase):
+    def test_exact_and_fuzzy_answers(self):
+        self.assertEqual(self.ask(SAMPLE_QNA[0]["question"])["answer"], SAMPLE_QNA[0]["answer"])
+        self.assertEqual(self.ask("what is the admission process for sgou")["answer"], SAMPLE_QNA[0]["answer"])
+
+
+class CenterViewTests(ProcessQueryTestCase):
+    def test_directory_normalizes_names_once(self):
+        directory = CenterDirectory(SAMPLE_CENTERS)
+        self.assertEqual(directory.rc_name_mapping, {1: "REGIONAL CENTRE - ERNAKULAM", 2: "REGIONAL CENTRE - KOZHIKODE"})
+        self.assertEqual(directory.find_rc_id(" Kozhikode "), 2)
+        self.assertIsNone(directory.find_rc_id("thrissur"))
+
+    def test_program_and_qna_queries_do_not_load_centers(self):
+        self.ask("how many programs")
+        self.ask(SAMPLE_QNA[0]["question"])
+        self.centers_loader.assert_not_called()
+        self.lsc_loader.assert_not_called()
+
+    def test_lscs_are_filtered_by_regional_center(self):
+        message = self.ask("lsc under ernakulam")["message"]
+        self.assertIn("Maharajas College", message)
+        self.assertIn("St. Teresas College", message)
+        self.assertNotIn("Farook College", message)
+        self.assertIn("REGIONAL CENTRE - ERNAKULAM", message)
+
+        self.assertIn("Farook College", self.ask("list all lsc")["message"])
+        self.assertIn("KOZHIKODE", self.ask("show regional centers")["message"])
+        self.centers_loader.assert_called_once()
+        self.lsc_loader.assert_called_once()
+
+
+class FragmentTests(ProcessQueryTestCase):
+    def test_listings_are_rendered_once_per_version(self):
+        self.ask("list all lsc")
+        with mock.patch("Chat.fragments.lsc_item_html") as render:
+            response_cache.clear()
+            self.assertIn("Farook College", self.ask("list all lsc")["message"])
+            self.assertIn("Farook College", self.ask("lsc under kozhikode")["message"])
+        render.assert_not_called()
+        self.assertIs(get_programme_fragments(), get_programme_fragments())
+
+    def test_lsc_fragments_follow_both_feeds(self):
+        self.ask("list all lsc")
+        self.centers_loader.return_value = [dict(SAMPLE_CENTERS[0], rcname="REGIONAL CENTRE - KOCHI"), SAMPLE_CENTERS[1]]
+        centers_snapshot.refresh()
+        self.assertIn("REGIONAL CENTRE - KOCHI", self.ask("list all lsc")["message"])
+
+        self.lsc_loader.return_value = SAMPLE_LSCS + [{"lscname": "Govt College Kottayam", "lscrc": "1"}]
+        lsc_snapshot.refresh()
+        self.assertIn("Govt College Kottayam", self.ask("lsc under kochi")["message"])
+
+    def test_category_lists(self):
+        fragments = get_programme_fragments()
+        self.assertEqual(fragments.categories, ["FYUG", "PG", "UG"])
+        programs, bodies = fragments.category("UG")
+        self.assertEqual([p["pgm_name"] for p in programs], ["BA English"])
+        self.assertEqual(self.ask("ug programs")["message"], json.loads(bodies["html"].data)["message"])
+        self.assertEqual(fragments.category("STP"), ([], None))
+        self.assertIn("Available categories are: FYUG, PG, UG", self.ask("stp programs")["message"])
+
+
+class StructuredResponseTests(ProcessQueryTestCase):
+    def ask(self, query, **extra):
+        response = self.client.post("/process_query", json.dumps({"query": query, "format": "structured"}),
+                                    content_type="application/json", **extra)
+        return response
+
+    def test_listings_are_typed_payloads(self):
+        lscs = self.ask("list all lsc").json()
+        self.assertEqual(lscs["type"], "lsc_list")
+        self.assertEqual([item["name"] for item in lscs["items"]], ["Maharajas College", "St. Teresas College", "Farook College"])
+        self.assertEqual(lscs["items"][2]["rc_name"], "REGIONAL CENTRE - KOZHIKODE")
+
+        under = self.ask("lsc under ernakulam").json()
+        self.assertEqual(under["title"], "Here are the Learning Support Centers under Ernakulam Regional Center:")
+        self.assertEqual(len(under["items"]), 2)
+
+        self.assertEqual(self.ask("show regional centers").json()["items"][0]["director"], "Dr. A")
+        programs = self.ask("list all programs").json()
+        self.assertEqual(programs["type"], "program_list")
+        self.assertEqual(programs["items"], ["BA English", "MA History", "B.Com Finance"])
+
+    def test_formats_are_cached_separately(self):
+        self.ask("list all lsc")
+        self.assertIn("message", super().ask("list all lsc"))
+        self.assertEqual(self.ask("list all lsc").json()["type"], "lsc_list")
+        self.assertEqual(response_cache.stats()["hits"], 1)
+
+    def test_other_answers_keep_the_message_format(self):
+        self.assertEqual(self.ask("how many programs").json(), {"message": "We have 3 programs available."})
+
+
+@override_settings(CHAT_COMPRESSION_MIN_BYTES=200)
+class CompressionTests(ProcessQueryTestCase):
+    def post(self, query, accept_encoding=None, path="/process_query"):
+        extra = {"HTTP_ACCEPT_ENCODING": accept_encoding} if accept_encoding else {}
+        return self.client.post(path, json.dumps({"query": query}), content_type="application/json", **extra)
+
+    def test_negotiation(self):
+        self.assertEqual(compression.negotiate("gzip, deflate"), "gzip")
+        self.assertIsNone(compression.negotiate("gzip;q=0, deflate"))
+        self.assertIsNone(compression.negotiate(""))
+        with mock.patch.object(compression, "brotli", object()):
+            self.assertEqual(compression.negotiate("gzip, br"), "br")
+            self.assertEqual(compression.negotiate("*"), "br")
+        with mock.patch.object(compression, "brotli", None):
+            self.assertEqual(compression.negotiate("br, gzip;q=0.5"), "gzip")
+
+    def test_large_answers_are_compressed_once(self):
+        plain = self.post("list all lsc")
+        self.assertNotIn("Content-Encoding", plain)
+        self.assertIn("Accept-Encoding", plain["Vary"])
+        with mock.patch.object(compression, "encode", wraps=compression.encode) as encode:
+            first = self.post("list all lsc", "gzip")
+            response_cache.clear()
+            second = self.post("list all lsc", "gzip")
+        self.assertEqual(first["Content-Encoding"], "gzip")
+        self.assertEqual(gzip.decompress(first.content), plain.content)
+        self.assertEqual(second.content, first.content)
+        encode.assert_called_once()
+
+    def test_small_answers_and_streams_are_sent_as_is(self):
+        self.assertNotIn("Content-Encoding", self.post("how many programs", "gzip"))
+        response = self.post("list all lsc", "gzip", path="/process_query_stream")
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        events = parse_sse(gzip.decompress(response.content))
+        self.assertEqual([event for event, _ in events], ["message", "done"])
+        self.assertIn("Farook College", events[0][1]["message"])
+
+    @skipUnless(compression.brotli is not None, "brotli is not installed")
+    def test_brotli(self):
+        response = self.post("list all lsc", "gzip, br")
+        self.assertEqual(response["Content-Encoding"], "br")
+        self.assertEqual(compression.brotli.decompress(response.content), self.post("list all lsc").content)
+
+
+class SyncUpstreamTests(TestCase):
+    def sync(self, programmes=SAMPLE_PROGRAMMES, qna=SAMPLE_QNA, centers=SAMPLE_CENTERS, lscs=SAMPLE_LSCS):
+        with mock.patch.object(feeds, "load_programmes", return_value=programmes), \
+                mock.patch.object(feeds, "load_qna", return_value=qna), \
+                mock.patch.object(feeds, "load_centers", return_value=centers), \
+                mock.patch.object(feeds, "load_lscs", return_value=lscs):
+            call_command("sync_upstream", stdout=io.StringIO())
+        return UpstreamSync.objects.first()
+
+    def test_mirrors_feeds_and_bumps_version_only_on_change(self):
+        run = self.sync()
+        self.assertEqual(run.version, 1)
+        self.assertEqual(run.stats["programmes"], {"created": 3, "updated": 0, "deleted": 0})
+        self.assertEqual(Program.objects.get(source_id="2").category.name, "PG")
+        self.assertEqual(LearningSupportCenter.objects.filter(regional_center__source_id="1").count(), 2)
+        self.assertEqual(Faq.objects.count(), len(SAMPLE_QNA))
+
+        self.assertEqual(self.sync().version, 1)
+
+        renamed = [dict(SAMPLE_PROGRAMMES[0], pgm_name="BA English Literature"), SAMPLE_PROGRAMMES[2]]
+        run = self.sync(programmes=renamed)
+        self.assertEqual(run.version, 2)
+        self.assertEqual(run.stats["programmes"], {"created": 0, "updated": 2, "deleted": 1})
+        self.assertEqual(list(Program.objects.order_by("source_order").values_list("name", flat=True)),
+                         ["BA English Literature", "B.Com Finance"])
+
+    def test_empty_feed_keeps_the_mirror(self):
+        self.sync()
+        self.sync(qna=[])
+        self.assertEqual(Faq.objects.count(), len(SAMPLE_QNA))
+
+    @override_settings(CHAT_DATA_SOURCE="database")
+    def test_process_query_runs_from_the_database(self):
+        self.sync()
+        response_cache.clear()
+        for snapshot in (programme_snapshot, qna_snapshot, centers_snapshot, lsc_snapshot):
+            snapshot.invalidate()
+            self.addCleanup(snapshot.invalidate)
+        with mock.patch.object(feeds.upstream, "request", side_effect=requests.exceptions.ConnectionError("offline")):
+            self.assertEqual(programme_snapshot.get(), SAMPLE_PROGRAMMES)
+            response = self.client.post("/process_query", json.dumps({"query": "lsc under ernakulam"}),
+                                        content_type="application/json")
+        self.assertIn("Maharajas College", response.json()["message"])
+
+
+class ResponseCacheTests(ProcessQueryTestCase):
+    def test_normalize_query(self):
+        self.assertEqual(normalize_query("  list   all\tProgams "), "list all programs")
+        self.assertEqual(normalize_query("show cneters"), "show centers")
+
+    def test_repeated_queries_are_served_from_cache(self):
+        first = self.ask("List all programs")
+        with mock.patch.object(matching, "rank_programs") as rank_programs:
+            self.assertEqual(self.ask("List  all progams"), first)
+        rank_programs.assert_not_called()
+        stats = self.client.get("/cache_stats").json()
+        self.assertEqual((stats["hits"], stats["misses"]), (1, 1))
+
+    def test_differently_cased_queries_are_cached_apart(self):
+        self.ask("fee structure for Quantum Basket Weaving")
+        self.ask("fee structure for quantum basket weaving")
+        self.assertEqual((response_cache.hits, response_cache.misses), (0, 2))
+        self.ask("fee  structure for Quantum Basket Weaving")
+        self.assertEqual(response_cache.hits, 1)
+
+    def test_hit_replays_program_list_for_numeric_follow_up(self):
+        self.ask("list pg programs")
+        self.client.cookies.clear()
+        self.ask("list pg programs")
+        self.assertEqual(response_cache.hits, 1)
+        self.assertIn("MA History", self.ask("1")["message"])
+
+    def test_hit_replays_a_list_the_caching_conversation_already_had(self):
+        with override_settings(CHAT_RESPONSE_CACHE_TTL=0):
+            self.ask("list pg programs")
+        self.ask("list pg programs")
+        self.client.cookies.clear()
+        self.ask("list pg programs")
+        self.assertEqual(response_cache.hits, 1)
+        self.assertIn("MA History", self.ask("1")["message"])
+
+    def test_feed_change_invalidates(self):
+        self.assertEqual(self.ask("how many programs")["message"], "We have 3 programs available.")
+        self.programme_loader.return_value = SAMPLE_PROGRAMMES[:2]
+        programme_snapshot.refresh()
+        self.assertEqual(self.ask("how many programs")["message"], "We have 2 programs available.")
+
+    def test_groq_fallback_is_not_cached(self):
+        with mock.patch("Chat.views.call_groq_api", return_value="from groq") as call_groq_api:
+            self.ask("hi")
+            self.ask("hi")
+        self.assertEqual(call_groq_api.call_count, 2)
+
+    @override_settings(CHAT_RESPONSE_CACHE_SIZE=2)
+    def test_lru_eviction(self):
+        for query in ("how many programs", "list all programs", "list pg programs"):
+            self.ask(query)
+        self.assertEqual(response_cache.stats()["size"], 2)
+        self.assertEqual(response_cache.evictions, 1)
+
+
+def groq_reply(content):
+    response = mock.Mock(status_code=200)
+    response.json.return_value = {"choices": [{"message": {"content": content}}]}
+    return response
+
+
+class CompletionCacheTests(TestCase):
+    def ask_groq(self, query):
+        from .views import call_groq_api
+        return call_groq_api(f"User question: {query}", SAMPLE_PROGRAMMES, user_query=query)
+
+    def test_identical_prompts_reuse_the_completion(self):
+        with mock.patch("Chat.views.upstream.post", return_value=groq_reply("SGOU is an open university.")) as post:
+            self.assertEqual(self.ask_groq("What is SGOU?"), "SGOU is an open university.")
+            self.assertEqual(self.ask_groq("What is SGOU?"), "SGOU is an open university.")
+            self.ask_groq("what is sgou")
+        self.assertEqual(post.call_count, 2)
+        self.assertEqual(CachedCompletion.objects.get(normalized_query="what is sgou", hits=1).response,
+                         "SGOU is an open university.")
+
+    @override_settings(CHAT_COMPLETION_CACHE_NEAR_DUPLICATES=True)
+    def test_near_duplicates_share_an_answer(self):
+        with mock.patch("Chat.views.upstream.post", return_value=groq_reply("Open university.")) as post:
+            self.ask_groq("What is SGOU?")
+            self.assertEqual(self.ask_groq("  what is   sgou "), "Open university.")
+        post.assert_called_once()
+
+    def test_errors_are_not_cached(self):
+        with mock.patch("Chat.views.upstream.post", return_value=mock.Mock(status_code=503, text="busy")):
+            self.ask_groq("What is SGOU?")
+        self.assertFalse(CachedCompletion.objects.exists())
+
+    @override_settings(CHAT_COMPLETION_CACHE_MAX_ENTRIES=2, CHAT_COMPLETION_CACHE_TTL=60)
+    def test_expiry_and_lru_eviction(self):
+        for n in range(3):
+            completion_cache.store({"model": "m", "messages": [n]}, f"answer {n}", f"query {n}")
+        self.assertEqual(sorted(CachedCompletion.objects.values_list("response", flat=True)), ["answer 1", "answer 2"])
+
+        CachedCompletion.objects.filter(response="answer 1").update(expires_at=timezone.now())
+        self.assertIsNone(completion_cache.lookup({"model": "m", "messages": [1]}))
+        out = io.StringIO()
+        call_command("completion_cache", "--purge-expired", "--list", "5", stdout=out)
+        self.assertIn("1 entries (0 expired)", out.getvalue())
+        call_command("completion_cache", "--purge", stdout=out)
+        self.assertFalse(CachedCompletion.objects.exists())
+
+
+class FakeGroqStream:
+    """Local HTTP server answering every POST with an OpenAI-style SSE completion stream."""
+
+    def __init__(self, pieces, interval=0.0):
+        self.pieces = pieces
+        self.interval = interval
+        self.requests = []
+
+    def __enter__(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                fake.requests.append(json.loads(self.rfile.read(int(self.headers["Content-Length"]))))
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.end_headers()
+                for piece in fake.pieces:
+                    chunk = {"choices": [{"delta": {"content": piece}}]}
+                    self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+                    self.wfile.flush()
+                    time.sleep(fake.interval)
+                self.wfile.write(b"data: [DONE]\n\n")
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        host, port = self.server.server_address
+        self.url = f"http://{host}:{port}/openai/v1/chat/completions"
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def response_body(response):
+    return b"".join(response.streaming_content) if response.streaming else response.content
+
+
+def parse_sse(body):
+    events = []
+    for block in body.decode().strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.split("\n"))
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+class StreamingViewTests(ProcessQueryTestCase):
+    def stream(self, query):
+        response = self.client.post("/process_query_stream", json.dumps({"query": query}), content_type="application/json")
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        return parse_sse(response_body(response))
+
+    def test_groq_tokens_are_relayed_as_they_arrive(self):
+        with FakeGroqStream(["Hello", " from", " SGOU"]) as groq, mock.patch("Chat.views.GROQ_API_URL", groq.url):
+            events = self.stream("hi")
+            self.assertEqual(events, [
+                ("token", {"content": "Hello"}), ("token", {"content": " from"}),
+                ("token", {"content": " SGOU"}), ("done", {}),
+            ])
+            self.assertTrue(groq.requests[0]["stream"])
+            # The assembled answer is cached for both endpoints
+            self.assertEqual(self.stream("hi"), [("token", {"content": "Hello from SGOU"}), ("done", {})])
+            self.assertEqual(len(groq.requests), 1)
+
+    def test_deterministic_answers_arrive_as_one_message(self):
+        self.assertEqual(self.stream("how many programs"), [
+            ("message", {"message": "We have 3 programs available."}), ("done", {}),
+        ])
+
+    def test_upstream_failure_becomes_an_error_event(self):
+        with mock.patch("Chat.views.upstream.post", side_effect=requests.exceptions.ConnectionError("down")):
+            events = self.stream("hi")
+        self.assertEqual(events[-1][0], "error")
+
+
+class PromptContextTests(ProcessQueryTestCase):
+    def test_estimate_tokens(self):
+        self.assertEqual(estimate_tokens(""), 0)
+        self.assertEqual(estimate_tokens("BA English, 3 years"), 6)
+        self.assertEqual(estimate_tokens("internationalization"), 4)
+
+    def test_category_codes_filter_programmes(self):
+        context, _ = build_context("tell me about ug programs")
+        self.assertIn("UG programmes (1 in total)", context)
+        self.assertIn("BA English", context)
+        self.assertNotIn("MA History", context)
+
+    def test_categories_match_as_the_listing_answer_does(self):
+        programs = [
+            dict(SAMPLE_PROGRAMMES[0]),
+            dict(SAMPLE_PROGRAMMES[1], pgm_category="PG Regular"),
+            dict(SAMPLE_PROGRAMMES[2], pgm_name="PG Diploma in Yoga", pgm_category="PG Diploma"),
+        ]
+        context, _ = build_context("list pg programs", programs=programs)
+        self.assertIn("PG programmes (2 in total)", context)
+        self.assertIn("MA History", context)
+        self.assertIn("PG Diploma in Yoga", context)
+        self.assertNotIn("BA English", context)
+
+    def test_only_relevant_items_are_included(self):
+        context, _ = build_context("history of kerala")
+        self.assertIn("MA History", context)
+        self.assertNotIn("B.Com Finance", context)
+        self.assertNotIn("Regional centers", context)
+        self.centers_loader.assert_not_called()
+        self.assertIn("Regional centers", build_context("where are the regional centres")[0])
+
+    @override_settings(CHAT_PROMPT_CONTEXT_TOKENS=40)
+    def test_context_fits_the_budget(self):
+        context, tokens = build_context("what is the admission process and fee for ba english and ma history programs")
+        self.assertLessEqual(tokens, 40)
+        self.assertLessEqual(estimate_tokens(context), 40)
+
+
+class ConversationStateTests(ProcessQueryTestCase):
+    def state(self):
+        return load_state(self.client.cookies[cookie_name()].value)
+
+    def test_state_holds_program_references(self):
+        self.ask("list pg programs")
+        self.assertEqual(self.state().last_list, {"version": programme_snapshot.version, "refs": ["2"]})
+        self.assertIn("MA History", self.ask("1")["message"])
+
+    def test_follow_up_survives_a_feed_refresh(self):
+        self.ask("list all programs")
+        self.programme_loader.return_value = [dict(SAMPLE_PROGRAMMES[2], pgm_desc="Updated")] + SAMPLE_PROGRAMMES[:2]
+        programme_snapshot.refresh()
+        message = self.ask("3")["message"]
+        self.assertIn("B.Com Finance", message)
+        self.assertIn("Updated", message)
+
+    def test_removed_program_is_not_found(self):
+        self.ask("list all programs")
+        self.programme_loader.return_value = SAMPLE_PROGRAMMES[:1]
+        programme_snapshot.refresh()
+        self.assertIn("does not correspond", self.ask("2")["message"])
+
+    def test_conversation_does_not_touch_the_session_table(self):
+        with self.assertNumQueries(0):
+            self.ask("list all programs")
+            self.ask("2")
+        self.assertNotIn(settings.SESSION_COOKIE_NAME, self.client.cookies)
+
+    def test_cookie_is_only_set_when_there_is_state(self):
+        self.ask("regional centers")
+        self.assertNotIn(cookie_name(), self.client.cookies)
+        self.ask("fees")
+        self.assertEqual(self.state().pending_intent, FEE_PROGRAM)
+        self.assertTrue(self.client.cookies[cookie_name()]["httponly"])
+
+    def test_unknown_or_malformed_ids_start_a_new_conversation(self):
+        self.client.cookies[cookie_name()] = "../not an id"
+        self.assertIn("list programs first", self.ask("1")["message"])
+        self.ask("list all programs")
+        self.assertNotEqual(self.client.cookies[cookie_name()].value, "../not an id")
+        self.assertIn("B.Com Finance", self.ask("3")["message"])
+
+    def test_streaming_endpoint_shares_the_conversation(self):
+        self.ask("list all programs")
+        response = self.client.post("/process_query_stream", json.dumps({"query": "1"}), content_type="application/json")
+        self.assertIn("BA English", response_body(response).decode())
+
+
+class TracingTests(ProcessQueryTestCase):
+    def traced(self, path, query, **headers):
+        with self.assertLogs("chatbot", "INFO") as logs:
+            response = self.client.post(path, json.dumps({"query": query}), content_type="application/json", **headers)
+            body = response_body(response)
+        records = [json.loads(line.split(":", 2)[2]) for line in logs.output if '"event": "request"' in line]
+        self.assertEqual(len(records), 1)
+        return response, body, records[0]
+
+    def test_one_log_line_per_request(self):
+        response, _, record = self.traced("/process_query", "list all programs", HTTP_X_REQUEST_ID="req-42")
+        self.assertEqual(response["X-Request-ID"], "req-42")
+        self.assertEqual(record["request_id"], "req-42")
+        self.assertEqual(record["branch"], "program_list")
+        self.assertEqual(record["status"], 200)
+        self.assertLessEqual(set(record["stages"]), {"response_cache", "route", "render"})
+        self.assertIn("route", record["stages"])
+
+        _, _, cached = self.traced("/process_query", "list all programs", HTTP_X_REQUEST_ID="bad id!")
+        self.assertEqual(cached["branch"], "cached")
+        self.assertNotEqual(cached["request_id"], "bad id!")
+
+    def test_streamed_answers_are_logged_when_the_stream_ends(self):
+        with FakeGroqStream(["Hello"]) as groq, mock.patch("Chat.views.GROQ_API_URL", groq.url):
+            _, body, record = self.traced("/process_query_stream", "hi")
+        self.assertIn(b"event: done", body)
+        self.assertEqual(record["branch"], "llm")
+        self.assertIn("llm", record["stages"])
+        self.assertIn("upstream.groq", record["stages"])
+
+    def test_spans_outside_a_request_do_nothing(self):
+        self.assertIsNone(tracing.current())
+        with tracing.span("route"):
+            tracing.set_branch("llm")
+
+    @override_settings(CHAT_REQUEST_LOG=False)
+    def test_log_line_can_be_turned_off(self):
+        with self.assertNoLogs("chatbot", "INFO"):
+            self.ask("how many programs")
+
+
+class MetricsTests(ProcessQueryTestCase):
+    def setUp(self):
+        super().setUp()
+        metrics.registry.clear()
+
+    def test_histogram_buckets_are_cumulative(self):
+        histogram = metrics.Histogram("test_seconds", "Test", ("kind",), buckets=(0.1, 1))
+        for value in (0.05, 0.1, 0.5, 3):
+            histogram.observe(value, kind="a")
+        self.assertEqual(histogram.render().splitlines()[2:], [
+            'test_seconds_bucket{kind="a",le="0.1"} 2',
+            'test_seconds_bucket{kind="a",le="1"} 3',
+            'test_seconds_bucket{kind="a",le="+Inf"} 4',
+            'test_seconds_sum{kind="a"} 3.65',
+            'test_seconds_count{kind="a"} 4',
+        ])
+        with self.assertRaises(ValueError):
+            histogram.observe(1)
+
+    def test_counters_are_thread_safe(self):
+        counter = metrics.Counter("test_total", "Test")
+        threads = [threading.Thread(target=lambda: [counter.inc() for _ in range(1000)]) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(counter.value(), 8000)
+
+    def test_requests_and_caches_are_measured(self):
+        self.ask("list all programs")
+        self.ask("list all programs")
+        self.assertEqual(metrics.request_duration.value(branch="program_list")[0], 1)
+        self.assertEqual(metrics.requests_total.value(branch="cached", status=200), 1)
+        self.assertEqual(metrics.cache_lookups.value(cache="response", result="hit"), 1)
+        self.assertEqual(metrics.cache_lookups.value(cache="response", result="miss"), 1)
+
+        self.ask("What is the fee structure for BA English?")
+        self.assertEqual(sum(metrics.qna_matches.value(engine=matching.engine(), result=r) for r in ("hit", "miss")), 1)
+
+    def test_upstream_calls_and_llm_tokens(self):
+        reply = groq_reply("SGOU is an open university.")
+        reply.json.return_value["usage"] = {"prompt_tokens": 120, "completion_tokens": 8, "total_tokens": 128}
+        with mock.patch.object(UpstreamClient, "session") as session:
+            session.request.return_value = reply
+            self.ask("hi")
+            session.request.side_effect = requests.exceptions.ConnectionError("down")
+            self.ask("hey")
+        self.assertEqual(metrics.upstream_responses.value(endpoint="groq", status=200), 1)
+        self.assertEqual(metrics.upstream_responses.value(endpoint="groq", status="error"), 1)
+        self.assertEqual(metrics.upstream_duration.value(endpoint="groq")[0], 2)
+        self.assertEqual(metrics.llm_tokens.value(model="llama3-70b-8192", kind="prompt"), 120)
+        self.assertEqual(metrics.llm_tokens.value(model="llama3-70b-8192", kind="completion"), 8)
+
+    def test_metrics_endpoint(self):
+        self.ask("how many programs")
+        response = self.client.get("/metrics")
+        self.assertTrue(response["Content-Type"].startswith("text/plain; version=0.0.4"))
+        text = response.content.decode()
+        self.assertIn("# TYPE chat_request_duration_seconds histogram", text)
+        self.assertIn('chat_requests_total{branch="program_count",status="200"} 1', text)
+        self.assertIn('chat_feed_version{feed="programmes"}', text)
+        with override_settings(CHAT_METRICS_ENABLED=False):
+            self.assertEqual(self.client.get("/metrics").status_code, 404)
+
+
+@skipUnless(shared_snapshot.is_supported(), "shared snapshots need flock")
+class SharedSnapshotTests(ProcessQueryTestCase):
+    def setUp(self):
+        super().setUp()
+        self.directory = tempfile.mkdtemp()
+        overrides = override_settings(CHAT_SHARED_SNAPSHOT_DIR=self.directory)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+    def test_records_round_trip(self):
+        records = [
+            {"id": 1, "pgm_name": "BA English \u2013 Literature", "fee": 1500.5, "active": True, "tags": ["a", 1]},
+            {"id": 2, "pgm_name": "", "note": None, "active": False},
+            {},
+        ]
+        shared = shared_snapshot.SharedFeedFile(self.directory, "test")
+        with shared.locked():
+            mapped = shared.publish(records)
+        self.assertEqual([dict(record) for record in mapped.records], records)
+        self.assertEqual(mapped.records[1].get("fee", "N/A"), "N/A")
+        self.assertEqual(list(mapped.records[1]), ["id", "pgm_name", "active", "note"])
+        self.assertFalse([name for name in os.listdir(self.directory) if name.startswith(".snapshot-")])
+
+    def test_workers_share_one_file(self):
+        first_loader = mock.Mock(return_value=[{"pgm_name": "BA English"}])
+        second_loader = mock.Mock(return_value=[{"pgm_name": "never fetched"}])
+        first = FeedSnapshot("test", first_loader, "TEST_TTL", 60)
+        second = FeedSnapshot("test", second_loader, "TEST_TTL", 60)
+
+        self.assertEqual(first.get(), [{"pgm_name": "BA English"}])
+        self.assertEqual(second.get(), [{"pgm_name": "BA English"}])
+        second_loader.assert_not_called()
+
+        # A refresh in one worker is seen by the other on its next get()
+        first_loader.return_value = [{"pgm_name": "MA History"}]
+        first.refresh()
+        self.assertEqual(second.get()[0]["pgm_name"], "MA History")
+        self.assertEqual(second.version, 2)
+
+        # Unchanged data only renews the file's freshness
+        first.refresh()
+        self.assertEqual(second.get()[0]["pgm_name"], "MA History")
+        self.assertEqual(second.version, 2)
+
+    def test_damaged_file_is_ignored(self):
+        with open(os.path.join(self.directory, "test.snapshot"), "wb") as f:
+            f.write(b"not a snapshot" * 10)
+        snapshot = FeedSnapshot("test", mock.Mock(return_value=[{"a": 1}]), "TEST_TTL", 60)
+        self.assertEqual(snapshot.get(), [{"a": 1}])
+
+    def test_chat_answers_from_shared_data(self):
+        self.assertIn("MA History", self.ask("list pg programs")["message"])
+        self.assertIn("is: <strong>PG</strong>", self.ask("category of ma history")["message"])
+        self.assertIn("Maharajas College", self.ask("lsc under ernakulam")["message"])
+        self.assertIn("programmes.snapshot", os.listdir(self.directory))
+        self.assertIsInstance(programme_snapshot.get()[0], shared_snapshot.MappedRecord)
+
+
+class PersistedSnapshotTests(ProcessQueryTestCase):
+    def setUp(self):
+        super().setUp()
+        self.directory = tempfile.mkdtemp()
+        overrides = override_settings(CHAT_SNAPSHOT_PERSIST_DIR=self.directory)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+    def persist(self, name, data, age=0):
+        path = os.path.join(self.directory, f"{name}.json")
+        with open(path, "w") as f:
+            json.dump(data, f)
+        os.utime(path, (time.time() - age, time.time() - age))
+        return path
+
+    def test_fetches_are_persisted_and_restored(self):
+        FeedSnapshot("test", lambda: [{"pgm_name": "BA English"}], "TEST_TTL", 60).get()
+        with open(os.path.join(self.directory, "test.json")) as f:
+            self.assertEqual(json.load(f), [{"pgm_name": "BA English"}])
+
+        loader = mock.Mock(side_effect=requests.ConnectionError("down"))
+        restarted = FeedSnapshot("test", loader, "TEST_TTL", 60)
+        self.assertTrue(restarted.restore())
+        self.assertEqual(restarted.get(), [{"pgm_name": "BA English"}])
+        self.assertFalse(restarted.serving_stale)
+        loader.assert_not_called()
+
+    def test_first_load_failure_falls_back_to_persisted_snapshot(self):
+        self.persist("test", [{"a": 1}])
+        snapshot = FeedSnapshot("test", mock.Mock(side_effect=requests.ConnectionError("down")), "TEST_TTL", 60)
+        self.assertEqual(snapshot.get(), [{"a": 1}])
+        self.assertFalse(FeedSnapshot("other", lambda: [], "TEST_TTL", 60).restore())
+
+    def test_unchanged_fetch_only_renews_the_file(self):
+        path = self.persist("test", [{"a": 1}], age=3600)
+        snapshot = FeedSnapshot("test", lambda: [{"a": 1}], "TEST_TTL", 60)
+        snapshot.restore()
+        with mock.patch.object(feeds.json, "dump") as dump:
+            snapshot.refresh()
+        dump.assert_not_called()
+        self.assertLess(time.time() - os.path.getmtime(path), 60)
+
+    def test_outage_answers_are_marked_stale(self):
+        self.persist("programmes", SAMPLE_PROGRAMMES, age=7200)
+        self.programme_loader.side_effect = requests.ConnectionError("sgou.ac.in is down")
+        feeds.restore_snapshots()
+
+        for _ in range(2):
+            response = self.client.post(
+                "/process_query", json.dumps({"query": "list pg programs"}), content_type="application/json")
+            self.assertIn("MA History", response.json()["message"])
+            self.assertRegex(response[tracing.STALE_HEADER], r"^programmes;age=7\d\d\d$")
+        self.assertTrue(programme_snapshot.serving_stale)
+        self.assertIn('chat_feed_stale{feed="programmes"} 1', metrics.registry.render())
+
+        self.programme_loader.side_effect = None
+        programme_snapshot.refresh()
+        self.assertFalse(programme_snapshot.serving_stale)
+        self.assertNotIn(tracing.STALE_HEADER, self.client.post(
+            "/process_query", json.dumps({"query": "list pg programs"}), content_type="application/json"))
+
+
+@skipUnless(upstream.async_available(), "httpx is required for the async upstream client")
+class AsyncUpstreamClientTests(TestCase):
+    def test_coalesced_fetches_are_shared_and_cancelled_with_their_callers(self):
+        async def run():
+            client = AsyncUpstreamClient()
+            calls = []
+
+            async def fetch():
+                calls.append(1)
+                await asyncio.sleep(0.05)
+                return "a"
+
+            results = await asyncio.gather(*(client.coalesce("qna", "k", fetch) for _ in range(5)))
+            self.assertEqual(results, ["a"] * 5)
+            self.assertEqual(len(calls), 1)
+
+            started, cancelled = asyncio.Event(), []
+
+            async def slow():
+                started.set()
+                try:
+                    await asyncio.sleep(10)
+                except asyncio.CancelledError:
+                    cancelled.append(1)
+                    raise
+
+            waiter = asyncio.ensure_future(client.coalesce("qna", "k", slow))
+            await started.wait()
+            waiter.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await waiter
+            await asyncio.sleep(0)
+            self.assertEqual(cancelled, [1])
+
+        asyncio.run(run())
+
+    def test_requests_are_timed_and_counted(self):
+        metrics.registry.clear()
+        with FakeGroqStream(["Hi"]) as groq:
+            async def run():
+                # An unset API key is left out, as requests does
+                return await AsyncUpstreamClient().post(
+                    "groq", groq.url, headers={"Authorization": None}, json={"stream": True})
+            response = asyncio.run(run())
+        self.assertIn(b"[DONE]", response.content)
+        self.assertEqual(metrics.upstream_responses.value(endpoint="groq", status=200), 1)
+        self.assertEqual(metrics.upstream_duration.value(endpoint="groq")[0], 1)
+
+    @override_settings(CHAT_FEED_RETRY_INTERVAL=60)
+    def test_failed_cold_load_is_not_refetched_by_the_sync_path(self):
+        hits = []
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                hits.append(self.path)
+                self.send_response(503)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        host, port = server.server_address
+        load, aload = feeds.upstream_feed("qna", lambda: (f"http://{host}:{port}/api/qna", {}), feeds.parse_qna)
+        snapshot = FeedSnapshot("test", load, "TEST_TTL", 60, async_loader=aload)
+        metrics.registry.clear()
+
+        with self.assertRaises(upstream.httpx.HTTPStatusError):
+            asyncio.run(snapshot.aget())
+        self.assertEqual(len(hits), 1)
+        self.assertEqual(metrics.feed_refresh_failures.value(feed="test"), 1)
+        with self.assertRaises(feeds.FeedUnavailable):
+            snapshot.get()
+        self.assertEqual(len(hits), 1)
+
+        with override_settings(CHAT_FEED_RETRY_INTERVAL=0), self.assertRaises(requests.exceptions.HTTPError):
+            snapshot.get()
+        self.assertGreater(len(hits), 1)
+
+
+@skipUnless(upstream.async_available(), "httpx is required for the async endpoint")
+class AsyncViewTests(ProcessQueryTestCase):
+    def ask_async(self, query):
+        return self.client.post("/process_query_async", json.dumps({"query": query}), content_type="application/json")
+
+    def slow_loader(self, snapshot, data, delay):
+        async def load():
+            await asyncio.sleep(delay)
+            return data
+        patcher = mock.patch.object(snapshot, "async_loader", load)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_answers_match_process_query(self):
+        queries = ("how many programs", "list pg programs", "category of ma history",
+                   "lsc under ernakulam", SAMPLE_QNA[0]["question"])
+        expected = [self.ask(query) for query in queries]
+        response_cache.clear()
+        for snapshot in feeds.SNAPSHOTS:
+            snapshot.invalidate()
+        self.programme_loader.reset_mock()
+        self.assertEqual([self.ask_async(query).json() for query in queries], expected)
+        self.programme_loader.assert_not_called()
+        programme_snapshot.async_loader.assert_awaited_once()
+
+    def test_cold_feeds_are_fetched_concurrently(self):
+        self.slow_loader(qna_snapshot, SAMPLE_QNA, 0.2)
+        self.slow_loader(centers_snapshot, SAMPLE_CENTERS, 0.2)
+        self.slow_loader(lsc_snapshot, SAMPLE_LSCS, 0.2)
+        start = time.perf_counter()
+        self.assertIn("Maharajas College", self.ask_async("lsc under ernakulam").json()["message"])
+        self.assertLess(time.perf_counter() - start, 0.5)
+        self.centers_loader.assert_not_called()
+        self.lsc_loader.assert_not_called()
+
+    def test_qna_answer_cancels_the_other_fetches(self):
+        cancelled = []
+
+        async def never():
+            try:
+                await asyncio.sleep(30)
+            except asyncio.CancelledError:
+                cancelled.append(True)
+                raise
+
+        with mock.patch.object(programme_snapshot, "async_loader", never):
+            start = time.perf_counter()
+            response = self.ask_async(SAMPLE_QNA[0]["question"])
+        self.assertEqual(response.json()["answer"], SAMPLE_QNA[0]["answer"])
+        self.assertLess(time.perf_counter() - start, 5)
+        self.assertEqual(cancelled, [True])
+        self.assertFalse(programme_snapshot.loaded)
+
+    def test_llm_answer_is_awaited(self):
+        groq = mock.Mock(status_code=200)
+        groq.json.return_value = {"choices": [{"message": {"content": "Hello from SGOU " * 100}}]}
+        with mock.patch.object(views.async_upstream, "post", mock.AsyncMock(return_value=groq)) as post, \
+                mock.patch.object(views.upstream, "post") as sync_post, \
+                self.assertLogs("chatbot", "INFO") as logs:
+            response = self.client.post("/process_query_async", json.dumps({"query": "hey"}),
+                                        content_type="application/json", HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(json.loads(gzip.decompress(response.content)), {"message": "Hello from SGOU " * 100})
+        post.assert_awaited_once()
+        sync_post.assert_not_called()
+        record = json.loads(next(line.split(":", 2)[2] for line in logs.output if '"event": "request"' in line))
+        self.assertEqual(record["branch"], "llm")
+        self.assertEqual(record["path"], "/process_query_async")
+        self.assertIn("llm", record["stages"])
+        self.assertEqual(response[tracing.REQUEST_ID_HEADER], record["request_id"])
+
+    def test_invalid_body(self):
+        response = self.client.post("/process_query_async", "not json", content_type="application/json")
+        self.assertEqual(response.json(), {"message": "Invalid request format."})
+
+
+class DeadlineTests(ProcessQueryTestCase):
+    def setUp(self):
+        super().setUp()
+        metrics.registry.clear()
+
+    def test_upstream_calls_get_the_remaining_budget(self):
+        client = UpstreamClient()
+        with mock.patch.object(UpstreamClient, "session") as session:
+            with deadline.running(3):
+                client.get("programmes", "https://sgou.ac.in/api/programmes")
+                self.assertLessEqual(session.request.call_args.kwargs["timeout"], 3)
+            client.get("programmes", "https://sgou.ac.in/api/programmes")
+            self.assertEqual(session.request.call_args.kwargs["timeout"], 15)
+
+            with deadline.running(0.1), self.assertRaises(requests.exceptions.Timeout):
+                client.get("programmes", "https://sgou.ac.in/api/programmes")
+        self.assertEqual(session.request.call_count, 2)
+        self.assertEqual(metrics.deadline_skips.value(stage="upstream.programmes"), 1)
+
+        retry = upstream.BudgetedRetry(total=2)
+        self.assertEqual(retry.increment("GET", "/api/programmes", error=ConnectionError()).total, 1)
+        with deadline.running(0.1), self.assertRaises(MaxRetryError):
+            retry.increment("GET", "/api/programmes", error=ConnectionError())
+
+    def test_timeouts_cut_short_by_the_budget_are_not_upstream_failures(self):
+        self.programme_loader.side_effect = lambda: upstream.client.get("programmes", "https://sgou.ac.in/api/programmes")
+        with mock.patch.object(UpstreamClient, "session") as session:
+            session.request.side_effect = requests.exceptions.ReadTimeout("stalled")
+            with deadline.running(1), self.assertRaises(deadline.DeadlineExceeded):
+                programme_snapshot.get()
+            self.assertTrue(programme_snapshot.retry_due())
+            self.assertEqual(metrics.deadline_skips.value(stage="upstream.programmes"), 1)
+
+            with self.assertRaises(requests.exceptions.ReadTimeout) as cm:
+                programme_snapshot.get()
+            self.assertNotIsInstance(cm.exception, deadline.DeadlineExceeded)
+            self.assertFalse(programme_snapshot.retry_due())
+
+    @skipUnless(upstream.async_available(), "httpx is required for the async upstream client")
+    def test_async_timeouts_cut_short_by_the_budget_raise_deadline_exceeded(self):
+        import httpx
+
+        async def fetch():
+            with deadline.running(1):
+                return await AsyncUpstreamClient().get("programmes", "https://sgou.ac.in/api/programmes")
+
+        with mock.patch.object(AsyncUpstreamClient, "client") as async_client:
+            async_client.request = mock.AsyncMock(side_effect=httpx.ReadTimeout("stalled"))
+            with self.assertRaises(deadline.DeadlineExceeded):
+                asyncio.run(fetch())
+
+    def test_coalesced_waits_end_with_the_budget(self):
+        client = UpstreamClient()
+        release = threading.Event()
+        leader = threading.Thread(target=client.coalesce, args=("qna", "k", release.wait))
+        leader.start()
+        while not client.flights.in_flight(("qna", "k")):
+            time.sleep(0.001)
+        try:
+            with deadline.running(0.1), self.assertRaises(CoalescedWaitTimeout) as cm:
+                client.coalesce("qna", "k", lambda: None)
+            self.assertTrue(cm.exception.budget_exhausted)
+            with override_settings(CHAT_UPSTREAM_COALESCE_WAIT=0.05), self.assertRaises(CoalescedWaitTimeout) as cm:
+                client.coalesce("qna", "k", lambda: None)
+            self.assertFalse(cm.exception.budget_exhausted)
+        finally:
+            release.set()
+            leader.join()
+
+    def test_a_wait_cut_short_by_the_budget_is_not_an_upstream_failure(self):
+        release = threading.Event()
+        self.programme_loader.side_effect = lambda: release.wait() and SAMPLE_PROGRAMMES
+        leader = threading.Thread(target=programme_snapshot.get)
+        leader.start()
+        while not upstream.client.flights.in_flight(("programmes", id(programme_snapshot))):
+            time.sleep(0.001)
+        try:
+            with deadline.running(0.1), self.assertRaises(CoalescedWaitTimeout):
+                programme_snapshot.get()
+            self.assertTrue(programme_snapshot.retry_due())
+        finally:
+            release.set()
+            leader.join()
+        self.assertEqual(programme_snapshot.get(), SAMPLE_PROGRAMMES)
+
+    def test_waiters_fetch_again_when_the_leader_ran_out_of_budget(self):
+        client = UpstreamClient()
+        budgets, results = [], []
+
+        def fetch():
+            budgets.append(deadline.current().budget)
+            if len(budgets) == 1:
+                while not metrics.upstream_coalesced.value(endpoint="qna"):
+                    time.sleep(0.001)
+            deadline.upstream_timeout("qna", 10)
+            return "data"
+
+        def call(budget):
+            with deadline.running(budget):
+                try:
+                    results.append(client.coalesce("qna", "k", fetch))
+                except deadline.DeadlineExceeded as e:
+                    results.append(e)
+
+        leader = threading.Thread(target=call, args=(0.1,))
+        leader.start()
+        while not client.flights.in_flight(("qna", "k")):
+            time.sleep(0.001)
+        call(20)
+        leader.join()
+        self.assertEqual(budgets, [0.1, 20])
+        self.assertIsInstance(results[0], deadline.DeadlineExceeded)
+        self.assertEqual(results[1], "data")
+
+    @skipUnless(upstream.async_available(), "httpx is required for the async upstream client")
+    def test_async_coalesced_fetches_run_outside_the_leaders_budget(self):
+        async def fetch():
+            await asyncio.sleep(0.2)
+            self.assertIsNone(deadline.current())
+            return "data"
+
+        async def call(client, budget):
+            with deadline.running(budget):
+                return await client.coalesce("qna", "k", fetch)
+
+        async def run():
+            client = AsyncUpstreamClient()
+            return await asyncio.gather(call(client, 0.3), call(client, 20), return_exceptions=True)
+
+        leader, waiter = asyncio.run(run())
+        self.assertIsInstance(leader, CoalescedWaitTimeout)
+        self.assertTrue(leader.budget_exhausted)
+        self.assertEqual(waiter, "data")
+
+    @override_settings(CHAT_REQUEST_BUDGET=0.3)
+    def test_cold_feeds_are_skipped_when_the_budget_is_short(self):
+        qna_loader = qna_snapshot.loader
+        self.programme_loader.side_effect = lambda: upstream.client.get("programmes", "https://sgou.ac.in/api/programmes")
+        self.assertEqual(self.ask("hey")["message"], "Sorry, unable to fetch university data now.")
+        qna_loader.assert_not_called()
+        self.assertEqual(metrics.deadline_skips.value(stage="qna"), 1)
+        self.assertEqual(metrics.deadline_skips.value(stage="upstream.programmes"), 1)
+        self.assertEqual(metrics.deadline_outcomes.value(outcome="degraded"), 1)
+
+    def test_lsc_queries_are_answered_in_their_branch_when_a_fetch_is_cut_short(self):
+        for loader in (self.centers_loader, self.lsc_loader):
+            for snapshot in feeds.SNAPSHOTS:
+                snapshot.invalidate()
+            response_cache.clear()
+            loader.side_effect = deadline.DeadlineExceeded("out of time")
+            with self.assertLogs("chatbot", "INFO") as logs:
+                self.assertEqual(self.ask("lsc under ernakulam")["message"], "Sorry, I couldn't fetch LSC data at the moment.")
+            loader.side_effect = None
+            record = json.loads(next(line.split(":", 2)[2] for line in logs.output if '"event": "request"' in line))
+            self.assertEqual(record["branch"], "rc_lsc_list")
+        self.programme_loader.assert_not_called()
+
+    @override_settings(CHAT_OPTIONAL_STAGE_BUDGET={"llm": 60})
+    def test_llm_is_skipped_but_cached_completions_are_served(self):
+        with mock.patch("Chat.views.upstream.post") as post:
+            self.assertEqual(self.ask("hey")["message"], views.OUT_OF_TIME_ANSWER)
+            with mock.patch.object(completion_cache, "lookup", return_value="SGOU is an open university."):
+                self.assertEqual(self.ask("hi")["message"], "SGOU is an open university.")
+        post.assert_not_called()
+        self.assertEqual(metrics.deadline_skips.value(stage="llm"), 1)
+        self.assertEqual(metrics.deadline_outcomes.value(outcome="degraded"), 1)
+        self.assertEqual(metrics.deadline_outcomes.value(outcome="met"), 1)
+
+    @override_settings(CHAT_REQUEST_BUDGET=1)
+    def test_streamed_answers_are_skipped_when_the_budget_is_spent(self):
+        with mock.patch("Chat.views.upstream.post") as post:
+            response = self.client.post("/process_query_stream", json.dumps({"query": "hey"}),
+                                        content_type="application/json")
+        self.assertEqual(parse_sse(response_body(response)), [
+            ("message", {"message": views.OUT_OF_TIME_ANSWER}), ("done", {}),
+        ])
+        post.assert_not_called()
+        self.assertEqual(metrics.deadline_skips.value(stage="llm"), 1)
+
+    @override_settings(CHAT_REQUEST_BUDGET=10)
+    def test_streamed_answers_get_the_budget_left_as_their_timeout(self):
+        with mock.patch("Chat.views.upstream.post") as post:
+            response = self.client.post("/process_query_stream", json.dumps({"query": "hey"}),
+                                        content_type="application/json")
+            response_body(response)
+        self.assertLessEqual(post.call_args.kwargs["timeout"], 10)
+
+    def test_outcome_is_logged_and_counted_once_per_request(self):
+        with self.assertLogs("chatbot", "INFO") as logs:
+            self.ask("list all programs")
+            self.client.post("/process_query_async", json.dumps({"query": "how many programs"}),
+                             content_type="application/json")
+        records = [json.loads(line.split(":", 2)[2]) for line in logs.output if '"event": "request"' in line]
+        self.assertEqual([record["deadline"] for record in records], ["met", "met"])
+        self.assertEqual(metrics.deadline_outcomes.value(outcome="met"), 2)
+
+        with override_settings(CHAT_REQUEST_BUDGET=0.05):
+            programme_snapshot.invalidate()
+            self.programme_loader.side_effect = lambda: time.sleep(0.1) or SAMPLE_PROGRAMMES
+            self.assertEqual(self.ask("how many programs")["message"], "We have 3 programs available.")
+        self.assertEqual(metrics.deadline_outcomes.value(outcome="exceeded"), 1)
@@ -0,0 +1,107 @@
+import math
+from collections import Counter
+
+try:
+    import numpy as np
+    from scipy import sparse
+except ImportError:  # numpy/scipy are optional; the difflib engine is used without them
+    np = None
+    sparse = None
+
+
+def is_available():
+    return np is not None and sparse is not None
+
+
+def char_ngrams(text, low=2, high=4):
+    """Count the character n-grams of a lower-cased, whitespace-collapsed, space-padded text."""
+    text = f" {' '.join(text.lower().split())} "
+    counts = Counter()
+    for n in range(low, high + 1):
+        for i in range(len(text) - n + 1):
+            counts[text[i:i + n]] += 1
+    return counts
+
+
+class TfidfMatcher:
+    """
+    Character n-gram TF-IDF model over a fixed list of candidate texts.
+
+    Candidates are stored as an L2-normalized sparse matrix, so scoring a
+    query against all of them is one sparse matrix-vector product, and
+    scoring a batch of queries is one matrix-matrix product. Scores are
+    cosine similarities in [0, 1].
+    """
+
+    def __init__(self, texts, ngram_range=(2, 4)):
+        if not is_available():
+            raise RuntimeError("The TF-IDF matcher needs numpy and scipy installed.")
+        self.texts = list(texts)
+        self.ngram_range = ngram_range
+        doc_counts = [char_ngrams(text, *ngram_range) for text in self.texts]
+
+        document_frequency = Counter()
+        for counts in doc_counts:
+            document_frequency.update(counts.keys())
+        self.vocabulary = {gram: column for column, gram in enumerate(document_frequency)}
+
+        # Smoothed idf, as if one extra document contained every n-gram
+        n_docs = len(self.texts)
+        self.idf = np.array(
+            [math.log((1 + n_docs) / (1 + document_frequency[gram])) + 1 for gram in self.vocabulary],
+            dtype=np.float64,
+        )
+        self.matrix = self._vectorize(doc_counts)
+
+    def _vectorize(self, all_counts):
+        rows, columns, values = [], [], []
+        for row, counts in enumerate(all_counts):
+            for gram, count in counts.items():
+                column = self.vocabulary.get(gram)
+                if column is not None:
+                    rows.append(row)
+                    columns.append(column)
+                    # Sublinear term frequency
+                    values.append((1 + math.log(count)) * self.idf[column])
+        matrix = sparse.csr_matrix(
+            (values, (rows, columns)), shape=(len(all_counts), len(self.vocabulary)), dtype=np.float64
+        )
+        norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+        norms[norms == 0] = 1.0
+        return sparse.diags(1.0 / norms) @ matrix
+
+    def transform(self, queries):
+        return self._vectorize([char_ngrams(query, *self.ngram_range) for query in queries])
+
+    def scores(self, query):
+        """Cosine similarity of one query against every candidate, as a 1-D array."""
+        return self.batch_scores([query])[0]
+
+    def batch_scores(self, queries):
+        """Similarity matrix of shape (len(queries), len(candidates))."""
+        if not self.texts:
+            return np.zeros((len(queries), 0))
+        return (self.transform(queries) @ self.matrix.T).toarray()
+
+    def best(self, query, threshold):
+        """Return (position, score) of the best candidate scoring above threshold, or None."""
+        return self.best_batch([query], threshold)[0]
+
+    def best_batch(self, queries, threshold):
+        """best() for many queries with a single matrix product."""
+        results = []
+        if not self.texts:
+            return [None] * len(queries)
+        scores = self.batch_scores(queries)
+        positions = scores.argmax(axis=1)
+        for row, position in enumerate(positions):
+            score = float(scores[row, position])
+            results.append((int(position), score) if score > threshold else None)
+        return results
+
+    def ranked(self, query, threshold):
+        """All (position, score) pairs scoring at least threshold, best first."""
+        scores = self.scores(query)
+        positions = np.flatnonzero(scores >= threshold)
+        order = positions[np.argsort(-scores[positions], kind="stable")]
+        return [(int(position), float(scores[position])) for position in order]
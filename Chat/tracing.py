@@ -0,0 +1,202 @@
+"""
+Per-request stage timings for process_query.
+
+trace_request() starts a RequestTrace for each request; code anywhere
+below it wraps a stage in `with span("name"):` and marks the branch that
+answered with set_branch(). When the response is complete, one JSON line
+is logged through the "chatbot" logger:
+
+    {"event": "request", "request_id": "...", "path": "/process_query/",
+     "branch": "program_list", "status": 200, "duration_ms": 3.1,
+     "stages": {"route": 0.02, "upstream.programmes": 2.4, "render": 0.3}}
+
+A stage entered more than once adds up. Outside a trace span() and
+set_branch() do nothing, so library code can use them unconditionally.
+For streamed answers the line is logged when the stream ends, so the
+LLM stage is included.
+
+When an answer was built from feed data that could not be refreshed
+(upstream is down, or the data was restored from disk and not yet
+confirmed), the feeds are listed with the age of their data in an
+X-Data-Stale response header, e.g. "programmes;age=5400", and under
+"stale" in the log line. Requests run under a time budget
+(Chat.deadline) log how they did against it under "deadline". Clients
+may send an X-Request-ID to correlate their logs; otherwise one is
+generated. It is echoed in the response.
+
+The same timings feed the request and stage histograms in Chat.metrics.
+CHAT_REQUEST_LOG = False turns the log line off; timing still happens.
+"""
+import contextlib
+import contextvars
+import functools
+import json
+import logging
+import re
+import time
+import uuid
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from . import metrics
+
+logger = logging.getLogger("chatbot")
+
+REQUEST_ID_HEADER = "X-Request-ID"
+STALE_HEADER = "X-Data-Stale"
+
+_REQUEST_ID = re.compile(r"[\w.:-]{1,64}")
+_current = contextvars.ContextVar("chat_request_trace", default=None)
+
+
+class RequestTrace:
+    def __init__(self, request_id, path):
+        self.request_id = request_id
+        self.path = path
+        self.branch = None
+        self.stages = {}
+        self.stale = {}
+        self.deadline = None
+        self.started = time.perf_counter()
+
+    def add(self, stage, seconds):
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def record(self, status, duration):
+        record = {
+            "event": "request",
+            "request_id": self.request_id,
+            "path": self.path,
+            "branch": self.branch,
+            "status": status,
+            "duration_ms": round(duration * 1000, 2),
+            "stages": {stage: round(seconds * 1000, 2) for stage, seconds in self.stages.items()},
+        }
+        if self.stale:
+            record["stale"] = {feed: round(age) for feed, age in self.stale.items()}
+        if self.deadline is not None:
+            record["deadline"] = self.deadline
+        return record
+
+    def stale_header(self):
+        return ", ".join(f"{feed};age={round(age)}" for feed, age in sorted(self.stale.items()))
+
+
+def current():
+    """The trace of the request being handled, or None."""
+    return _current.get()
+
+
+@contextlib.contextmanager
+def span(stage):
+    """Time the enclosed block as `stage` of the current request."""
+    trace = _current.get()
+    if trace is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace.add(stage, time.perf_counter() - start)
+
+
+def set_branch(branch):
+    trace = _current.get()
+    if trace is not None:
+        trace.branch = branch
+
+
+def mark_stale(feed, age):
+    """Note that the current request is answered from `feed` data `age` seconds old that could not be refreshed."""
+    trace = _current.get()
+    if trace is not None:
+        trace.stale[feed] = age
+
+
+def request_id_for(request):
+    supplied = request.headers.get(REQUEST_ID_HEADER, "")
+    return supplied if _REQUEST_ID.fullmatch(supplied) else uuid.uuid4().hex
+
+
+def finish_trace(trace, status):
+    """Record a finished request in the metrics and the request log."""
+    duration = time.perf_counter() - trace.started
+    branch = trace.branch or "none"
+    metrics.request_duration.observe(duration, branch=branch)
+    metrics.requests_total.inc(branch=branch, status=status)
+    for stage, seconds in trace.stages.items():
+        metrics.stage_duration.observe(seconds, stage=stage)
+    if getattr(settings, "CHAT_REQUEST_LOG", True):
+        logger.info(json.dumps(trace.record(status, duration)))
+
+
+def _traced_stream(trace, chunks, status):
+    """Iterate a streaming body inside `trace`, logging it when the stream ends."""
+    chunks = iter(chunks)
+    try:
+        while True:
+            token = _current.set(trace)
+            try:
+                chunk = next(chunks)
+            except StopIteration:
+                return
+            finally:
+                _current.reset(token)
+            yield chunk
+    finally:
+        finish_trace(trace, status)
+
+
+def _finish_response(trace, response):
+    response[REQUEST_ID_HEADER] = trace.request_id
+    if trace.stale:
+        response[STALE_HEADER] = trace.stale_header()
+    if response.streaming:
+        response.streaming_content = _traced_stream(trace, response.streaming_content, response.status_code)
+    else:
+        finish_trace(trace, response.status_code)
+    return response
+
+
+def trace_request(view):
+    """
+    Trace the view: one RequestTrace per request, logged as a JSON line when
+    the response is complete. Nested use is a no-op, like compress_response.
+    Works on async views too; the trace follows the view into the threads
+    it runs sync code on through sync_to_async.
+    """
+    if iscoroutinefunction(view):
+        async def async_wrapper(request, *args, **kwargs):
+            if getattr(request, "trace", None) is not None:
+                return await view(request, *args, **kwargs)
+            trace = request.trace = RequestTrace(request_id_for(request), request.path)
+            token = _current.set(trace)
+            try:
+                response = await view(request, *args, **kwargs)
+            except Exception:
+                trace.branch = trace.branch or "error"
+                finish_trace(trace, 500)
+                raise
+            finally:
+                _current.reset(token)
+            return _finish_response(trace, response)
+        return markcoroutinefunction(functools.wraps(view)(async_wrapper))
+
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if getattr(request, "trace", None) is not None:
+            return view(request, *args, **kwargs)
+        trace = request.trace = RequestTrace(request_id_for(request), request.path)
+        token = _current.set(trace)
+        try:
+            response = view(request, *args, **kwargs)
+        except Exception:
+            trace.branch = trace.branch or "error"
+            finish_trace(trace, 500)
+            raise
+        finally:
+            _current.reset(token)
+        return _finish_response(trace, response)
+    return wrapper
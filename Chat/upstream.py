@@ -0,0 +1,336 @@
+import asyncio
+import threading
+import time
+import weakref
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from . import deadline, metrics
+from .tracing import span
+
+try:
+    import httpx
+except ImportError:  # httpx is optional; only the async chat endpoint needs it
+    httpx = None
+
+# Per-endpoint timeouts (seconds), matching what each call site used before
+DEFAULT_TIMEOUTS = {
+    "programmes": 15,
+    "centers": 10,
+    "lsc": 10,
+    "qna": 10,
+    "groq": 30,
+    "sgou_programs": 10,
+}
+
+
+def _setting(name, default):
+    if not settings.configured:
+        return default
+    return getattr(settings, name, default)
+
+
+class CoalescedWaitTimeout(requests.exceptions.Timeout):
+    """A caller gave up waiting for a fetch another thread was making."""
+
+    # True when the wait was cut short by the caller's request budget, not the upstream
+    budget_exhausted = False
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls for the same key: the first caller runs the
+    function, callers arriving while it runs wait for it and share its
+    result (or its exception) instead of making the same call again.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights = {}
+
+    def in_flight(self, key):
+        with self._lock:
+            return key in self._flights
+
+    def do(self, key, fn, timeout=None):
+        """
+        fn() once for every concurrent caller with this key. A waiting caller
+        raises CoalescedWaitTimeout after `timeout` seconds; the call itself
+        carries on for the others.
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+
+        if leader:
+            try:
+                flight.result = fn()
+            except BaseException as e:
+                flight.error = e
+            finally:
+                with self._lock:
+                    del self._flights[key]
+                flight.done.set()
+        else:
+            metrics.upstream_coalesced.inc(endpoint=_endpoint(key))
+            if not flight.done.wait(timeout):
+                metrics.upstream_coalesce_timeouts.inc(endpoint=_endpoint(key))
+                raise CoalescedWaitTimeout(f"Gave up after {timeout}s waiting for the in-flight fetch of {key}")
+
+        if flight.error is not None:
+            raise flight.error
+        return flight.result
+
+
+class BudgetedRetry(Retry):
+    """Retry that stops retrying once the request's time budget is too short for another attempt."""
+
+    def increment(self, *args, **kwargs):
+        if not deadline.allows_retry():
+            return Retry.increment(self.new(total=0), *args, **kwargs)
+        return super().increment(*args, **kwargs)
+
+
+def _endpoint(key):
+    # Keys are (endpoint, ...) tuples, as UpstreamClient.coalesce() builds them
+    return key[0] if isinstance(key, tuple) else str(key)
+
+
+class UpstreamClient:
+    """
+    Shared HTTP client for the SGOU and Groq APIs.
+
+    All calls go through one requests.Session whose adapter keeps a pool of
+    keep-alive connections per host, so repeated calls skip the TCP and TLS
+    handshake. Idempotent requests are retried with exponential backoff on
+    connection errors and 429/502/503/504 responses, unless the chat
+    request they are made for is nearly out of time. coalesce() lets
+    concurrent callers share one fetch of the same resource.
+    """
+
+    def __init__(self):
+        self._session = None
+        self._lock = threading.Lock()
+        self.flights = SingleFlight()
+
+    @property
+    def session(self):
+        if self._session is None:
+            with self._lock:
+                if self._session is None:
+                    self._session = self._build_session()
+        return self._session
+
+    def _build_session(self):
+        retry = BudgetedRetry(
+            total=_setting("CHAT_UPSTREAM_RETRIES", 2),
+            backoff_factor=_setting("CHAT_UPSTREAM_BACKOFF", 0.3),
+            status_forcelist=(429, 502, 503, 504),
+            allowed_methods=frozenset({"GET", "HEAD"}),
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(
+            pool_connections=_setting("CHAT_UPSTREAM_POOL_HOSTS", 10),
+            pool_maxsize=_setting("CHAT_UPSTREAM_POOL_SIZE", 20),
+            max_retries=retry,
+        )
+        session = requests.Session()
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+
+    def timeout_for(self, endpoint):
+        timeouts = {**DEFAULT_TIMEOUTS, **_setting("CHAT_UPSTREAM_TIMEOUTS", {})}
+        return timeouts.get(endpoint, 10)
+
+    def wait_for(self, endpoint):
+        """How long a caller waits on another thread's in-flight fetch from `endpoint`."""
+        wait = _setting("CHAT_UPSTREAM_COALESCE_WAIT", None)
+        return wait if wait is not None else self.timeout_for(endpoint)
+
+    def coalesce(self, endpoint, key, fetch):
+        """
+        Run fetch() once for all threads asking for `key` at the same time.
+        Waiters give up after wait_for(endpoint) seconds, or when their
+        request's budget runs out, with CoalescedWaitTimeout, a requests
+        Timeout, so callers that fall back to stale data on upstream errors
+        do so here too. fetch() runs under the budget of the thread that
+        makes it; a waiter with budget of its own left fetches again when
+        that budget, not the upstream, stopped the shared fetch.
+        """
+        wait = self.wait_for(endpoint)
+        while True:
+            led = []
+
+            def lead():
+                led.append(True)
+                return fetch()
+
+            timeout = deadline.cap(wait)
+            try:
+                return self.flights.do((endpoint, key), lead, timeout=timeout)
+            except CoalescedWaitTimeout as e:
+                e.budget_exhausted = timeout != wait
+                raise
+            except deadline.DeadlineExceeded:
+                if led or not deadline.allows_retry():
+                    raise
+
+    def request(self, method, endpoint, url, **kwargs):
+        usual = kwargs.get("timeout", self.timeout_for(endpoint))
+        kwargs["timeout"] = deadline.upstream_timeout(endpoint, usual)
+        status = "error"
+        start = time.perf_counter()
+        try:
+            with span(f"upstream.{endpoint}"):
+                response = self.session.request(method, url, **kwargs)
+            status = response.status_code
+            return response
+        except requests.exceptions.Timeout as e:
+            exceeded = deadline.timed_out(endpoint, kwargs["timeout"], usual)
+            if exceeded is not None:
+                raise exceeded from e
+            raise
+        finally:
+            metrics.upstream_duration.observe(time.perf_counter() - start, endpoint=endpoint)
+            metrics.upstream_responses.inc(endpoint=endpoint, status=status)
+
+    def get(self, endpoint, url, **kwargs):
+        return self.request("GET", endpoint, url, **kwargs)
+
+    def post(self, endpoint, url, **kwargs):
+        return self.request("POST", endpoint, url, **kwargs)
+
+    def close(self):
+        with self._lock:
+            if self._session is not None:
+                self._session.close()
+                self._session = None
+
+
+client = UpstreamClient()
+
+
+def async_available():
+    return httpx is not None
+
+
+class _AsyncFlight:
+    def __init__(self, task):
+        self.task = task
+        self.waiters = 0
+
+
+async def _detached(fetch):
+    # The task has its own copy of the caller's context, so this leaves the caller's deadline alone
+    with deadline.detached():
+        return await fetch()
+
+
+class AsyncUpstreamClient:
+    """
+    UpstreamClient for async views, on httpx.AsyncClient: the same
+    per-endpoint timeouts, spans and metrics, and a keep-alive pool per
+    event loop. Connection errors are retried; HTTP statuses are not.
+
+    coalesce() shares one fetch between the coroutines of an event loop
+    that ask for the same key. A fetch nobody waits for any more, because
+    every caller was cancelled, is cancelled too.
+    """
+
+    def __init__(self):
+        self._clients = weakref.WeakKeyDictionary()
+        self._flights = weakref.WeakKeyDictionary()
+
+    @property
+    def client(self):
+        """The httpx.AsyncClient of the running event loop."""
+        if httpx is None:
+            raise RuntimeError("The async upstream client needs httpx installed.")
+        loop = asyncio.get_running_loop()
+        async_client = self._clients.get(loop)
+        if async_client is None:
+            transport = httpx.AsyncHTTPTransport(
+                retries=_setting("CHAT_UPSTREAM_RETRIES", 2),
+                limits=httpx.Limits(max_keepalive_connections=_setting("CHAT_UPSTREAM_POOL_SIZE", 20)),
+            )
+            async_client = self._clients[loop] = httpx.AsyncClient(transport=transport)
+        return async_client
+
+    def timeout_for(self, endpoint):
+        return client.timeout_for(endpoint)
+
+    async def coalesce(self, endpoint, key, fetch):
+        """
+        await fetch() once for all coroutines of this event loop asking for
+        `key` at the same time. The fetch runs outside any request's budget,
+        with only the endpoint's own timeouts; waiters give up after
+        wait_for(endpoint) seconds, or when their request budget runs out,
+        with CoalescedWaitTimeout, as UpstreamClient.coalesce's do.
+        """
+        flights = self._flights.setdefault(asyncio.get_running_loop(), {})
+        key = (endpoint, key)
+        flight = flights.get(key)
+        if flight is None:
+            flight = flights[key] = _AsyncFlight(asyncio.ensure_future(_detached(fetch)))
+            flight.task.add_done_callback(lambda task: flights.pop(key, None))
+        else:
+            metrics.upstream_coalesced.inc(endpoint=endpoint)
+        wait = client.wait_for(endpoint)
+        timeout = deadline.cap(wait)
+        flight.waiters += 1
+        try:
+            return await asyncio.wait_for(asyncio.shield(flight.task), timeout)
+        except asyncio.TimeoutError:
+            metrics.upstream_coalesce_timeouts.inc(endpoint=endpoint)
+            error = CoalescedWaitTimeout(f"Gave up after {timeout:.2f}s waiting for the in-flight fetch of {key}")
+            error.budget_exhausted = timeout != wait
+            raise error from None
+        finally:
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.task.done():
+                flight.task.cancel()
+
+    async def request(self, method, endpoint, url, **kwargs):
+        usual = kwargs.get("timeout", self.timeout_for(endpoint))
+        kwargs["timeout"] = deadline.upstream_timeout(endpoint, usual)
+        if kwargs.get("headers"):
+            # requests leaves out headers set to None (an unset API key); httpx rejects them
+            kwargs["headers"] = {name: value for name, value in kwargs["headers"].items() if value is not None}
+        async_client = self.client
+        status = "error"
+        start = time.perf_counter()
+        try:
+            with span(f"upstream.{endpoint}"):
+                response = await async_client.request(method, url, **kwargs)
+            status = response.status_code
+            return response
+        except httpx.TimeoutException as e:
+            exceeded = deadline.timed_out(endpoint, kwargs["timeout"], usual)
+            if exceeded is not None:
+                raise exceeded from e
+            raise
+        finally:
+            metrics.upstream_duration.observe(time.perf_counter() - start, endpoint=endpoint)
+            metrics.upstream_responses.inc(endpoint=endpoint, status=status)
+
+    async def get(self, endpoint, url, **kwargs):
+        return await self.request("GET", endpoint, url, **kwargs)
+
+    async def post(self, endpoint, url, **kwargs):
+        return await self.request("POST", endpoint, url, **kwargs)
+
+
+async_client = AsyncUpstreamClient()
@@ -4,4 +4,8 @@ from . import views
 urlpatterns = [
     path('', views.index, name='index'),
     path('process_query', views.process_query, name='process_query'),
+    path('process_query_stream', views.process_query_stream, name='process_query_stream'),
+    path('process_query_async', views.process_query_async, name='process_query_async'),
+    path('cache_stats', views.cache_stats, name='cache_stats'),
+    path('metrics', views.metrics_view, name='metrics'),
 ]
\ No newline at end of file
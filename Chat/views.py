@@ -1,358 +1,225 @@
+from asgiref.sync import sync_to_async
 from django.shortcuts import render
-from django.http import JsonResponse
+from django.conf import settings
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
+import asyncio
 import json
 import requests
 import os
 import logging
 from django.views.decorators.http import require_POST
 from dotenv import load_dotenv
-import re
-from difflib import SequenceMatcher
+from .feeds import centers_snapshot, lsc_snapshot, programme_snapshot, qna_snapshot
+from .compression import compress, compress_response
+from .fragments import (
+    fragment_response,
+    get_lsc_fragments,
+    get_programme_fragments,
+    get_regional_center_fragments,
+    lsc_list_title,
+    response_format,
+)
+from . import completion_cache, deadline, matching, metrics
+from .centers import get_center_directory
+from .prompt_context import build_context
+from .qna_index import get_qna_index
+from .response_cache import cache_response, cacheable, normalize_query, response_cache
+from .router import route
+from .tracing import set_branch, span, trace_request
+from .deadline import with_deadline
+from .conversation import (
+    FEE_PROGRAM,
+    forget_programs,
+    listed_program_count,
+    recall_program,
+    remember_programs,
+    with_conversation_state,
+)
+from .upstream import async_client as async_upstream, client as upstream
 
 load_dotenv()
 
 # Load environment variables
-UNIVERSITY_API_URL = os.getenv("UNIVERSITY_API_URL")
-UNIVERSITY_API_KEY = os.getenv("UNIVERSITY_API_KEY")
-CENTERS_API_URL = os.getenv("CENTERS_API_URL")
-LSC_API_URL = os.getenv("LSC_API_URL")
-QNA_API_URL = os.getenv("QNA_API_URL")
 GROQ_API_URL = os.getenv("GROQ_API_URL")
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
 SGOU_OFFICIAL_WEBSITE = "https://sgou.ac.in"
 
+# Given instead of a Groq answer when the request's time budget is nearly spent
+OUT_OF_TIME_ANSWER = f"Sorry, I couldn't answer that in time. Please try again, or see {SGOU_OFFICIAL_WEBSITE}."
+
+logger = logging.getLogger("chatbot")
+
 
 def index(request):
     return render(request, "index.html")
 
 
-def enhanced_keyword_matching(user_query, api_question):
-    """
-    Enhanced keyword matching that checks for common words and phrases
-    """
-    user_words = set(user_query.lower().split())
-    api_words = set(api_question.lower().split())
-    
-    # Calculate word overlap
-    common_words = user_words.intersection(api_words)
-    word_overlap_ratio = len(common_words) / max(len(user_words), len(api_words))
-    
-    # Check for key phrases
-    user_lower = user_query.lower()
-    api_lower = api_question.lower()
-    
-    # Common question patterns
-    question_patterns = [
-        "what is", "what are", "how to", "when is", "when are", "where is", "where are",
-        "full form", "meaning of", "definition of", "eligibility", "admission", "fee",
-        "duration", "course", "program", "certificate", "degree", "how long"
-    ]
-    
-    pattern_matches = 0
-    for pattern in question_patterns:
-        if pattern in user_lower and pattern in api_lower:
-            pattern_matches += 1
-    
-    # Boost score if patterns match
-    if pattern_matches > 0:
-        word_overlap_ratio += 0.2 * pattern_matches
-    
-    return word_overlap_ratio
+def cache_stats(request):
+    return JsonResponse(response_cache.stats())
+
+
+def metrics_view(request):
+    """Process metrics in the Prometheus text format, unless CHAT_METRICS_ENABLED is off."""
+    if not getattr(settings, "CHAT_METRICS_ENABLED", True):
+        raise Http404
+    return HttpResponse(metrics.registry.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
 
 
 @csrf_exempt
 @require_POST
+@trace_request
+@with_deadline
+@compress_response
+@with_conversation_state
+@cache_response
 def process_query(request):
     try:
-        print(">>> Received a request")
         data = json.loads(request.body)
-        user_query = data.get("query", "").strip()
-        print(f">>> User query: {user_query}")
+        user_query = normalize_query(data.get("query", ""))
+        answer_format = response_format(data)
+        logger.debug("User query: %s", user_query)
         
         if not user_query:
+            set_branch("empty")
             return JsonResponse({"message": "Please enter a query."})
         
-        # Define headers for API calls early
-        university_headers = {
-            "X-API-KEY": UNIVERSITY_API_KEY,
-            "Accept": "application/json",
-        }
-        
         # Normalize user query for keyword detection to handle typos
         normalized_query = user_query.lower()
         
-        # Define keywords for different query types
-        center_keywords = [
-            "center", "centre", "regional center", "study center", 
-            "cneters", "centres", "cenrets",
-        ]
-        program_keywords = [
-            "program", "course", "study", "list programs", "show programs", 
-            "progams", "courses", "program name",
-        ]
-        lsc_keywords = [
-            "lsc", "learning support center", "study center", 
-            "lscs", "learning support centers",
-        ]
-        category_keywords = [
-            "category", "field", "discipline", "stream", "branch", "type", "area", 
-            "ug", "pg", "stp", "four year", "short term", "post graduate", 
-            "under graduate", "degree"
-        ]
-        
-        # Check if this is a program or category related query first
-        is_program_query = any(keyword in normalized_query for keyword in program_keywords)
-        is_category_query = any(keyword in normalized_query for keyword in category_keywords)
-        is_center_query = any(keyword in normalized_query for keyword in center_keywords)
-        is_lsc_query = any(keyword in normalized_query for keyword in lsc_keywords) or re.search(r"lsc(?:'s)? under regional center ([\w\s]+)", normalized_query)
-
-        fee_keywords = ["fee structure", "fees", "admission fee", "tuition fee", "cost of program"]
-        is_fee_query = any(keyword in normalized_query for keyword in fee_keywords)
-        
-        # Check field queries
-        field_keywords = ['category', 'year', 'years', 'duration', 'description', 'desc', 'details','long']
-        is_field_query = any(keyword in normalized_query for keyword in field_keywords) and ('of' in normalized_query or 'for' in normalized_query)
+        # Work out every intent flag in one scan of the query
+        with span("route"):
+            intent = route(normalized_query)
+        is_program_query = intent.is_program_query
+        is_category_query = intent.is_category_query
+        is_center_query = intent.is_center_query
+        is_lsc_query = intent.is_lsc_query
+        is_fee_query = intent.is_fee_query
+        is_field_query = intent.is_field_query
 
         # If this is a field query for a program, handle it first
         if is_field_query:
-            print(f">>> Field query detected: {normalized_query}")
+            set_branch("field")
+            logger.debug("Field query detected: %s", normalized_query)
             try:
-                print(f">>> Attempting to connect to University API: {UNIVERSITY_API_URL}")
-                university_response = requests.get(UNIVERSITY_API_URL, headers=university_headers, timeout=15)
-                print(f">>> University API status: {university_response.status_code}")
-                
-                if university_response.status_code == 200:
-                    uni_data = university_response.json()
-                    all_programs = uni_data.get("programme", [])
-                    print(f">>> Retrieved {len(all_programs)} programs from API")
-                    
-                    if not all_programs:
-                        print(">>> Warning: No programs returned from API")
-                        return JsonResponse({"message": "Sorry, no program data is currently available. Please try again later."})
-                    
+                all_programs = programme_snapshot.get()
+                logger.debug("Retrieved %d programs from snapshot", len(all_programs))
+
+                if not all_programs:
+                    logger.warning("No programs in the programme snapshot")
+                    return JsonResponse({"message": "Sorry, no program data is currently available. Please try again later."})
+
+                with span("program_match"):
                     field_response = handle_specific_program_field_query(user_query, all_programs)
-                    print(f">>> Field response: {field_response}")
-                    
-                    if field_response:
-                        return JsonResponse({"message": field_response})
-                    else:
-                        print(">>> No field response returned")
-                        return JsonResponse({"message": f"Sorry, I couldn't find information about that specific field for the program. Please try a different query."})
+                logger.debug("Field response: %s", field_response)
+
+                if field_response:
+                    return cacheable(JsonResponse({"message": field_response}))
                 else:
-                    print(f">>> University API error: Status {university_response.status_code}, Response: {university_response.text[:200]}")
-                    return JsonResponse({"message": f"Sorry, there was an issue connecting to the university database (Status: {university_response.status_code}). Please try again later."})
+                    logger.debug("No field response returned")
+                    return cacheable(JsonResponse({"message": f"Sorry, I couldn't find information about that specific field for the program. Please try a different query."}))
+            except requests.exceptions.HTTPError as e:
+                status_code = e.response.status_code if e.response is not None else "unknown"
+                logger.warning("University API error: status %s", status_code)
+                return JsonResponse({"message": f"Sorry, there was an issue connecting to the university database (Status: {status_code}). Please try again later."})
             except requests.exceptions.ConnectionError as e:
-                print(f">>> Connection error to University API: {str(e)}")
+                logger.warning("Connection error to University API: %s", e)
                 return JsonResponse({"message": "Sorry, unable to connect to the university database. Please check your internet connection and try again later."})
             except requests.exceptions.Timeout as e:
-                print(f">>> Timeout error to University API: {str(e)}")
+                logger.warning("Timeout error to University API: %s", e)
                 return JsonResponse({"message": "Sorry, the connection to the university database timed out. Please try again later."})
             except Exception as e:
-                print(f">>> Error in field query handling: {str(e)}")
+                logger.exception("Error in field query handling")
                 return JsonResponse({"message": "Sorry, there was an unexpected error processing your request. Please try again later."})
 
         # Combined fee structure handling
-        if is_fee_query or request.session.get('waiting_for_fee_program'):
+        state = request.chat_state
+        if is_fee_query or state.pending_intent == FEE_PROGRAM:
+            set_branch("fee")
             program_name_to_query = None
 
             # Case 1: User is responding to a previous prompt for program name
-            if request.session.get('waiting_for_fee_program'):
+            if state.pending_intent == FEE_PROGRAM:
                 program_name_to_query = user_query.strip()
-                del request.session['waiting_for_fee_program'] # Clear the flag
-                print(f">>> Handling fee query response for program: {program_name_to_query}")
+                state.update(pending_intent=None) # Clear the flag
+                logger.debug("Handling fee query response for program: %s", program_name_to_query)
             # Case 2: Initial fee query, try to extract program name from current query
             elif is_fee_query:
-                match = re.search(r"(?:fee structure|fees|cost)\s+(?:for|of)\s+([\w\s]+)", normalized_query)
-                if match:
-                    program_name_to_query = match.group(1).strip()
-                print(f">>> Handling initial fee query. Extracted program: {program_name_to_query}")
+                program_name_to_query = intent.fee_program
+                logger.debug("Handling initial fee query. Extracted program: %s", program_name_to_query)
 
             if program_name_to_query:
                 query_for_api = f"fee structure for {program_name_to_query}"
-                print(f">>> Querying questioners API for fee structure: {query_for_api}")
+                logger.debug("Looking up the fee structure: %s", query_for_api)
                 try:
-                    api_url = QNA_API_URL
-                    headers = {"X-API-KEY": UNIVERSITY_API_KEY}
-                    response = requests.get(api_url, headers=headers, params={'query': query_for_api}, timeout=10)
-                    response.raise_for_status()
-                    questions_data = response.json()
-                    
-                    best_match = None
-                    best_similarity = 0
-                    questions_list = questions_data.get('question', [])
-
-                    for item in questions_list:
-                        if "question" in item and "answer" in item:
-                            api_question = item["question"]
-                            api_answer = item["answer"]
-                            
-                            combined_similarity = (SequenceMatcher(None, query_for_api.lower(), api_question.lower()).ratio() * 0.4) + \
-                                                  (enhanced_keyword_matching(query_for_api, api_question) * 0.6)
-                            
-                            if combined_similarity > best_similarity:
-                                best_match = {"question": api_question, "answer": api_answer, "similarity": combined_similarity}
-                                best_similarity = combined_similarity
-                    
-                    if best_match and best_similarity > 0.7: # Use a similar threshold as general QNA
-                        return JsonResponse({"message": best_match["answer"]}, status=200)
+                    # Matched against the whole QnA feed snapshot; the upstream is no longer queried with ?query=
+                    with span("qna"):
+                        best_match = matching.best_qna_match(query_for_api) # Same threshold as general QNA
+                    if best_match:
+                        return cacheable(JsonResponse({"message": best_match[1]}, status=200))
                     else:
-                        return JsonResponse({"message": f"Sorry, I couldn't find the fee structure for '{program_name_to_query}'. Please try rephrasing or check the program name."})
+                        return cacheable(JsonResponse({"message": f"Sorry, I couldn't find the fee structure for '{program_name_to_query}'. Please try rephrasing or check the program name."}))
 
                 except requests.exceptions.RequestException as e:
-                    print(f">>> Error fetching fee structure from questioners API: {e}")
+                    logger.warning("Error fetching fee structure from questioners API: %s", e)
                     return JsonResponse({"message": "Sorry, I'm having trouble fetching fee information right now. Please try again later."})
             else:
                 # If no program name was found and it was an initial fee query, prompt for program name
-                request.session['waiting_for_fee_program'] = True
-                return JsonResponse({"message": "Which program's fee structure do you want to know? Please tell me the program name."})
+                state.update(pending_intent=FEE_PROGRAM)
+                return cacheable(JsonResponse({"message": "Which program's fee structure do you want to know? Please tell me the program name."}))
             return JsonResponse({}) # Ensure a response is always returned from this block
 
-        # IMPROVED: Check questioners API for ALL non-specific queries (not just non-program/category/center/LSC)"(?:fee structure|fees|cost)\s+(?:for|of)\s+([\w\s]+)", normalized_query)
-            if match:
-                program_name_match = match.group(1).strip()
-            
-            if program_name_match:
-                query_for_api = f"fee structure for {program_name_match}"
-                print(f">>> Querying questioners API for fee structure: {query_for_api}")
-                try:
-                    api_url = QNA_API_URL
-                    headers = {"X-API-KEY": UNIVERSITY_API_KEY}
-                    response = requests.get(api_url, headers=headers, params={'query': query_for_api}, timeout=10)
-                    response.raise_for_status()
-                    questions_data = response.json()
-                    
-                    best_match = None
-                    best_similarity = 0
-                    questions_list = questions_data.get('question', [])
-
-                    for item in questions_list:
-                        if "question" in item and "answer" in item:
-                            api_question = item["question"]
-                            api_answer = item["answer"]
-                            
-                            combined_similarity = (SequenceMatcher(None, query_for_api.lower(), api_question.lower()).ratio() * 0.4) + \
-                                                  (enhanced_keyword_matching(query_for_api, api_question) * 0.6)
-                            
-                            if combined_similarity > best_similarity:
-                                best_match = {"question": api_question, "answer": api_answer, "similarity": combined_similarity}
-                                best_similarity = combined_similarity
-                    
-                    if best_match and best_similarity > 0.7: # Use a similar threshold as general QNA
-                        return JsonResponse({"message": best_match["answer"]}, status=200)
-                    else:
-                        return JsonResponse({"message": f"Sorry, I couldn't find the fee structure for '{program_name_match}'. Please try rephrasing or check the program name."})
-
-                except requests.exceptions.RequestException as e:
-                    print(f">>> Error fetching fee structure from questioners API: {e}")
-                    return JsonResponse({"message": "Sorry, I'm having trouble fetching fee information right now. Please try again later."})
-            else:
-                request.session['waiting_for_fee_program'] = True
-                return JsonResponse({"message": "Which program's fee structure do you want to know? Please tell me the program name."})
-
         # IMPROVED: Check questioners API for ALL non-specific queries (not just non-program/category/center/LSC)
         # Only skip API check for very specific structural queries like "list all programs" or "show all centers"
         skip_api_check = (
-            (is_program_query and any(word in normalized_query for word in ["list", "show", "all"])) or
-            (is_center_query and any(word in normalized_query for word in ["list", "show", "all"])) or
-            (is_lsc_query and any(word in normalized_query for word in ["list", "show", "all"]))
+            (is_program_query and intent.is_list_request) or
+            (is_center_query and intent.is_list_request) or
+            (is_lsc_query and intent.is_list_request)
         )
         
-        if not skip_api_check:
+        # A cold QnA feed is only worth fetching if the budget leaves time to answer afterwards
+        if not skip_api_check and (qna_snapshot.loaded or deadline.allows("qna")):
             try:
-                api_url = QNA_API_URL
-                print(f">>> Checking questioners API for query: {user_query}")
-                # Add Authorization header with API key
-                headers = {
-                    "X-API-KEY": UNIVERSITY_API_KEY  # Replace with your actual API key
-                }
-                response = requests.get(api_url, headers=headers, timeout=10)
-                response.raise_for_status()
-                questions_data = response.json()
-                print(f">>> Questions data structure: {type(questions_data)}")
-                
-                best_match = None
-                best_similarity = 0
-                
-                questions_list = questions_data.get('question', [])
-                print(f">>> Found {len(questions_list)} questions in API")
-                
-                for item in questions_list:
-                    if "question" in item and "answer" in item:
-                        api_question = item["question"]
-                        api_answer = item["answer"]
-                        
-                        # Check for exact match first (highest priority)
-                        if user_query.lower().strip() == api_question.lower().strip():
-                            print(f">>> EXACT MATCH found: {api_question}")
-                            return JsonResponse({"answer": api_answer}, status=200)
-                        
-                        # Enhanced similarity calculation
-                        sequence_similarity = SequenceMatcher(None, user_query.lower(), api_question.lower()).ratio()
-                        keyword_similarity = enhanced_keyword_matching(user_query, api_question)
-                        
-                        # Combined similarity score (giving more weight to keyword matching)
-                        combined_similarity = (sequence_similarity * 0.4) + (keyword_similarity * 0.6)
-                        
-                        print(f">>> Comparing:")
-                        print(f"    User: '{user_query}'")
-                        print(f"    API:  '{api_question}'")
-                        print(f"    Sequence: {sequence_similarity:.3f}, Keyword: {keyword_similarity:.3f}, Combined: {combined_similarity:.3f}")
-                        
-                        if combined_similarity > best_similarity:
-                            best_match = {"question": api_question, "answer": api_answer, "similarity": combined_similarity}
-                            best_similarity = combined_similarity
-                
-                # LOWERED threshold for better matching
-                similarity_threshold = 0.7  # Increased for stricter matching
-                
-                if best_match and best_similarity > similarity_threshold:
-                    print(f">>> BEST MATCH found (score: {best_similarity:.3f}): {best_match['question']}")
-                    print(f">>> Returning answer: {best_match['answer'][:100]}...")
-                    return JsonResponse({"answer": best_match["answer"]}, status=200)
+                set_branch("qna")
+                with span("qna"):
+                    qna_index = get_qna_index(qna_snapshot)
+
+                    # Check for exact match first (highest priority)
+                    exact_match = qna_index.exact_match(user_query)
+                    # Combined similarity score (giving more weight to keyword matching)
+                    best_match = None if exact_match else matching.best_qna_match(user_query)
+
+                if exact_match:
+                    logger.debug("Exact QnA match: %s", exact_match[0])
+                    return cacheable(JsonResponse({"answer": exact_match[1]}, status=200))
+
+                if best_match:
+                    question, answer, best_similarity = best_match
+                    logger.debug("Best QnA match (score %.3f): %s", best_similarity, question)
+                    return cacheable(JsonResponse({"answer": answer}, status=200))
                 else:
-                    print(f">>> No good match found. Best similarity: {best_similarity:.3f}")
-                
+                    logger.debug("No QnA match above the similarity threshold in %d questions", len(qna_index))
+
             except requests.exceptions.Timeout:
-                print(">>> Questioners API timeout - continuing with normal processing")
+                logger.warning("Questioners API timeout - continuing with normal processing")
             except requests.exceptions.RequestException as e:
-                print(f">>> Error checking questioners API: {e} - continuing with normal processing")
-            except Exception as e:
-                print(f">>> Unexpected error with questioners API: {e} - continuing with normal processing")
+                logger.warning("Error checking questioners API: %s - continuing with normal processing", e)
+            except Exception:
+                logger.exception("Unexpected error with questioners API - continuing with normal processing")
 
-        # Fetch all regional centers once
-        rc_name_mapping = {}
-        try:
-            centers_response = fetch_centers(request)
-            if centers_response.status_code == 200:
-                centers_data = json.loads(centers_response.content)
-                print(f"Debug: centers_data in process_query: {centers_data}")
-                formatted_centers_list = centers_data.get("formatted_centers", [])
-                raw_centers_list = centers_data.get("raw_centers", [])
-                print(f"Debug: formatted_centers_list extracted in process_query: {formatted_centers_list}")
-                print(f"Debug: raw_centers_list extracted in process_query: {raw_centers_list}")
-
-                for center in raw_centers_list:
-                    rc_id = center.get("id")
-                    rc_name = (
-                        center.get("rcname")
-                        or center.get("name")
-                        or center.get("center_name")
-                    )
-                    if rc_id and rc_name:
-                        # Normalize rc_name to handle special characters like '–', '\xa0', and Unicode replacement character
-                        rc_name = rc_name.replace('–', '-').replace('\xa0', ' ').replace('\ufffd', '-').strip()
-                        rc_name_mapping[rc_id] = rc_name
-        except Exception as e:
-            print(f"Error fetching regional centers for mapping: {e}")
+        # Load regional centers only when the query is about centers or LSCs
+        centers = None
+        if intent.rc_name is not None or is_center_query or is_lsc_query:
+            try:
+                centers = get_center_directory()
+            except Exception as e:
+                logger.warning("Error fetching regional centers for mapping: %s", e)
+        rc_name_mapping = centers.rc_name_mapping if centers else {}
 
         try:
-            regional_center_query_match = re.search(
-                r"lsc(?:'s)? under (.*)", normalized_query, re.IGNORECASE
-            )
-
-            if regional_center_query_match:
-                regional_center_name_raw = regional_center_query_match.group(1).strip()
+            if intent.rc_name is not None:
+                set_branch("rc_lsc_list")
+                regional_center_name_raw = intent.rc_name
                 
                 # Extract the actual regional center name from the raw query
                 if regional_center_name_raw.lower().startswith("regional centre – "):
@@ -365,288 +232,116 @@ def process_query(request):
                 # Normalize regional_center_name to handle special characters like '–' and '\xa0'
                 regional_center_name = regional_center_name.replace('–', '-').replace('\xa0', ' ').strip()
 
-                print(f"Debug: Extracted and normalized regional_center_name: '{regional_center_name}'")
-                print(f"Debug: rc_name_mapping content: {rc_name_mapping}")
-
-                lsc_data = fetch_lsc_data(regional_center_name, rc_name_mapping)
-                if lsc_data:
-                    lsc_dropdown_html = f"Here are the Learning Support Centers under {regional_center_name.title()} Regional Center:<br><br>"
-                    for lsc in lsc_data:
-                        rc_id = lsc.get("lscrc")
-                        if isinstance(rc_id, str) and rc_id.isdigit():
-                            rc_id = int(rc_id)
-                        elif not isinstance(rc_id, int):
-                            rc_id = None
-
-                        rc_name = rc_name_mapping.get(rc_id, "N/A")
-
-                        lsc_name = lsc.get("lscname", "N/A").replace("'", "&apos;")
-                        lsc_address = lsc.get("lscaddress", "N/A").replace("'", "&apos;")
-                        lsc_number = lsc.get("lscnumber", "N/A")
-                        lsc_coordinator = lsc.get("coordinatorname", "N/A").replace("'", "&apos;")
-                        lsc_email = lsc.get("coordinatormail", "N/A")
-
-                        lsc_dropdown_html += f'''
-                    <div class="lsc-item" style="border-radius:8px;">
-                    <div class="lsc-header" onclick="toggleDropdown(this)" style="cursor:pointer; display:flex; justify-content:space-between; font-weight:bold; color:#0066cc;">
-                        <span>{lsc_name}</span>
-                        <span class="lsc-arrow">&#9660;</span>
-                    </div>
-                    <div class="lsc-details" style="display:none; margin-top:8px;">
-                        <strong>Address:</strong> {lsc_address}<br>
-                        <strong>Contact:</strong> {lsc_number}<br>
-                        <strong>Coordinator:</strong> {lsc_coordinator}<br>
-                        <strong>Email:</strong> <a href="mailto:{lsc_email}" style="color:#0066cc;">{lsc_email}</a><br>
-                        <strong>RC ID:</strong> {rc_id}<br>
-                        <strong>RC Name:</strong> {rc_name}
-                    </div>
-                    </div>
-                    '''
-                    return JsonResponse({"message": lsc_dropdown_html})
-
-
-            elif any(keyword in normalized_query for keyword in center_keywords):
-                if formatted_centers_list:
-                    formatted_centers_html = "Here are the Regional Centers:\n<ol>"
-                    for center_html in formatted_centers_list:
-                        formatted_centers_html += f"<li>{center_html}</li>"
-                    formatted_centers_html += "</ol>"
-                    return JsonResponse({"message": formatted_centers_html})
+                logger.debug("Extracted and normalized regional_center_name: %r", regional_center_name)
+
+                # Without the center or LSC feeds there is no LSC answer; say so instead of falling through
+                if centers is None:
+                    return JsonResponse({"message": "Sorry, I couldn't fetch LSC data at the moment."})
+                try:
+                    with span("render"):
+                        lsc_answer = fetch_lsc_answer(regional_center_name, centers, answer_format)
+                except (requests.exceptions.RequestException, ValueError) as e:
+                    logger.warning("Error fetching LSC data: %s", e)
+                    return JsonResponse({"message": "Sorry, I couldn't fetch LSC data at the moment."})
+                if lsc_answer:
+                    return cacheable(JsonResponse(lsc_answer))
+
+
+            elif is_center_query:
+                set_branch("rc_list")
+                with span("render"):
+                    center_list = get_regional_center_fragments().list_bodies if centers else None
+                if center_list:
+                    return fragment_response(center_list[answer_format])
                 else:
                     return JsonResponse({"message": "Sorry, I couldn't fetch regional center data at the moment."})
                     
-            elif any(keyword in normalized_query for keyword in lsc_keywords):
-                print(">>> General LSC query detected, fetching all LSCs...")
-                lsc_data = fetch_lsc_data(rc_name_mapping=rc_name_mapping)
-                if lsc_data:
-                    all_lscs_html = "Here are our Learning Support Centers:<br><br>"
-                    for lsc in lsc_data:
-                        rc_id = lsc.get("lscrc")
-                        if isinstance(rc_id, str) and rc_id.isdigit():
-                            rc_id = int(rc_id)
-                        elif not isinstance(rc_id, int):
-                            rc_id = None
-
-                        rc_name = rc_name_mapping.get(rc_id, "N/A")
-
-                        # 🧠 Safe encoding to prevent HTML errors
-                        lsc_name = lsc.get("lscname", "N/A").replace("'", "&apos;")
-                        lsc_address = lsc.get("lscaddress", "N/A").replace("'", "&apos;")
-                        lsc_number = lsc.get("lscnumber", "N/A")
-                        lsc_coordinator = lsc.get("coordinatorname", "N/A").replace("'", "&apos;")
-                        lsc_email = lsc.get("coordinatormail", "N/A")
-
-                        all_lscs_html += f'''
-            <div class="lsc-item" style="border-radius:8px; ">
-            <div class="lsc-header" onclick="toggleDropdown(this)" style="cursor:pointer; display:flex; justify-content:space-between; font-weight:bold; color:#0066cc;">
-                <span>{lsc_name}</span>
-                <span class="lsc-arrow">&#9660;</span>
-            </div>
-            <div class="lsc-details" style="display:none; margin-top:8px;">
-                <strong>Address:</strong> {lsc_address}<br>
-                <strong>Contact:</strong> {lsc_number}<br>
-                <strong>Coordinator:</strong> {lsc_coordinator}<br>
-                <strong>Email:</strong> <a href="mailto:{lsc_email}" style="color:#0066cc;">{lsc_email}</a><br>
-                <strong>RC ID:</strong> {rc_id}<br>
-                <strong>RC Name:</strong> {rc_name}
-            </div>
-            </div>
-            '''
-                    return JsonResponse({"message": all_lscs_html})
+            elif is_lsc_query:
+                set_branch("lsc_list")
+                try:
+                    with span("render"):
+                        all_lscs = get_lsc_fragments(centers).all_bodies
+                except (requests.exceptions.RequestException, ValueError) as e:
+                    logger.warning("Error fetching LSC data: %s", e)
+                    all_lscs = None
+                if all_lscs:
+                    return fragment_response(all_lscs[answer_format])
                 else:
                     return JsonResponse({"message": "Sorry, I couldn't fetch LSC data at the moment."})
 
         except Exception as e:
-            print(f"Error in LSC/Center processing: {e}")
+            logger.exception("Error in LSC/Center processing")
 
         # Handle queries asking for the number of programs
-        if any(word in normalized_query for word in ["how many programs", "number of programs", "total programs", "programs count"]):
+        if intent.is_program_count_query:
+            set_branch("program_count")
             try:
-                university_response = requests.get(UNIVERSITY_API_URL, headers=university_headers, timeout=10)
-                university_response.raise_for_status()
-                all_programs = university_response.json().get("programme", [])
+                all_programs = programme_snapshot.get()
                 num_programs = len(all_programs)
-                return JsonResponse({"message": f"We have {num_programs} programs available."})
+                return cacheable(JsonResponse({"message": f"We have {num_programs} programs available."}))
             except requests.exceptions.RequestException as e:
-                print(f">>> Error fetching program count: {e}")
+                logger.warning("Error fetching program count: %s", e)
                 return JsonResponse({"message": "Sorry, I couldn't fetch the number of programs at the moment. Please try again later."})
 
         # Program and category handling
         if is_program_query and is_category_query:
-            print(">>> Detected query for programs within a category")
-            print(f"DEBUG: Original query: '{normalized_query}'")
-            print(f"DEBUG: is_program_query: {is_program_query}")
-            print(f"DEBUG: is_category_query: {is_category_query}")
-            
-            category_alias_map = {
-                "fyug": "FYUG",
-                "fyugp": "FYUG",
-                "four year": "FYUG",
-                "honour": "FYUG",
-                "honours": "FYUG",
-                "short term": "STP",
-                "shortterm": "STP",
-                "short term program": "STP",
-                "short term programs": "STP",
-                "short term programmes": "STP",
-                "stp": "STP",
-                "ugp": "UG",
-                "ug": "UG",
-                "pg": "PG",
-                "post graduate": "PG",
-                "postgrad": "PG",
-                "postgraduates": "PG",
-                "under graduates": "UG"
-            }
-
-            matched_category = None
-            for key in sorted(category_alias_map.keys(), key=len, reverse=True):
-                if key in normalized_query:
-                    matched_category = category_alias_map[key]
-                    print(f"DEBUG: Matched '{key}' -> {matched_category}")
-                    break
+            set_branch("category")
+            matched_category = intent.category
+            logger.debug("Category query %r: matched %r -> %s", normalized_query, intent.category_alias, matched_category)
 
             if not matched_category:
-                return JsonResponse({"message": "Please mention a valid category like UG, PG, FYUG, or STP."})
+                return cacheable(JsonResponse({"message": "Please mention a valid category like UG, PG, FYUG, or STP."}))
 
-            university_response = requests.get(UNIVERSITY_API_URL, headers=university_headers, timeout=10)
-            if university_response.status_code != 200:
+            try:
+                with span("render"):
+                    fragments = get_programme_fragments()
+                    filtered_programs, program_list = fragments.category(matched_category)
+            except (requests.exceptions.RequestException, ValueError):
                 return JsonResponse({"message": "Sorry, unable to fetch university data now."})
-
-            all_programs = university_response.json().get("programme", [])
-
-            categories_found = set()
-            category_counts = {}
-            for p in all_programs:
-                cat = p.get('pgm_category', '').strip()
-                if cat:
-                    categories_found.add(cat)
-                    category_counts[cat] = category_counts.get(cat, 0) + 1
-
-            print(f"DEBUG: Categories found in program data: {sorted(categories_found)}")
-            print(f"DEBUG: Category counts: {category_counts}")
-            print(f"DEBUG: Looking for matched category: '{matched_category}'")
-            
-            if matched_category == "STP":
-                print("DEBUG: Special STP debugging:")
-                stp_like_categories = []
-                for cat in categories_found:
-                    if "stp" in cat.lower() or "short" in cat.lower() or "term" in cat.lower() or "programme" in cat.lower():
-                        stp_like_categories.append(cat)
-                print(f"DEBUG: STP-like categories found: {stp_like_categories}")
-                
-                potential_stp_programs = []
-                for p in all_programs:
-                    pgm_name = p.get('pgm_name', '').lower()
-                    pgm_cat = p.get('pgm_category', '').lower()
-                    if any(word in pgm_name or word in pgm_cat for word in ['certificate', 'short', 'term', 'skill']):
-                        potential_stp_programs.append(p)
-                print(f"DEBUG: Found {len(potential_stp_programs)} potential STP programs")
-                if potential_stp_programs:
-                    for i, prog in enumerate(potential_stp_programs[:3]):
-                        print(f"DEBUG: STP candidate {i+1}: {prog.get('pgm_name')} — Category: '{prog.get('pgm_category')}'")
-
-            print(f"DEBUG: About to start filtering...")
-
-            filtered_programs = []
-            
-            # Method 1: Exact case match
-            for p in all_programs:
-                if p.get('pgm_category', '').strip() == matched_category:
-                    filtered_programs.append(p)
-            
-            print(f"DEBUG: Exact match found: {len(filtered_programs)} programs")
-            
-            # Method 2: Case insensitive match if exact failed
-            if not filtered_programs:
-                for p in all_programs:
-                    if p.get('pgm_category', '').strip().upper() == matched_category.upper():
-                        filtered_programs.append(p)
-                print(f"DEBUG: Case insensitive match found: {len(filtered_programs)} programs")
-            
-            # Method 3: Partial matching if still no results
-            if not filtered_programs:
-                for p in all_programs:
-                    cat = p.get('pgm_category', '').strip().upper()
-                    if matched_category.upper() in cat:
-                        filtered_programs.append(p)
-                print(f"DEBUG: Partial match found: {len(filtered_programs)} programs")
-
-            print(f"DEBUG: Matched Category: {matched_category}")
-            print(f"DEBUG: Total filtered programs: {len(filtered_programs)}")
-            
-            for i, prog in enumerate(filtered_programs[:5]):
-                print(f"DEBUG: {i+1}. {prog.get('pgm_name')} — Category: '{prog.get('pgm_category')}'")
+            logger.debug("%d programs under %s; categories: %s", len(filtered_programs), matched_category, fragments.categories)
 
             if filtered_programs:
-                request.session['programs'] = filtered_programs
-                program_list_html = f"Programs under {matched_category} category:<ol>"
-                for prog in filtered_programs:
-                    program_list_html += f"<li>{prog.get('pgm_name', 'N/A')}</li>"
-                program_list_html += "</ol><p>You can reply with a number to know more about a specific program.</p>"
-                return JsonResponse({"message": program_list_html})
+                remember_programs(request.chat_state, filtered_programs)
+                return fragment_response(program_list[answer_format])
             else:
-                available_categories = ", ".join(sorted(categories_found))
-                return JsonResponse({
+                available_categories = ", ".join(fragments.categories)
+                return cacheable(JsonResponse({
                     "message": f"No programs found under '{matched_category}' category. Available categories are: {available_categories}"
-                })
+                }))
 
-        elif any(keyword in normalized_query for keyword in program_keywords):
-            university_response = requests.get(UNIVERSITY_API_URL, headers=university_headers, timeout=10)
-
-            print(f">>> University API status: {university_response.status_code}")
-            print(f">>> University API response (preview): {university_response.text[:200]}")
-
-            if university_response.status_code != 200:
+        elif is_program_query:
+            set_branch("program_list")
+            try:
+                programs = programme_snapshot.get()
+            except (requests.exceptions.RequestException, ValueError):
                 return JsonResponse({"message": "Sorry, unable to fetch university data now."})
 
-            uni_data = university_response.json()
-            programs = uni_data.get("programme", [])
-            print(f"DEBUG: Programs data from API: {programs[:2]}")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Programs data from snapshot: %s", programs[:2])
             if not isinstance(programs, list):
                 return JsonResponse({"message": "Invalid data format received from university API."})
 
-            request.session['programs'] = programs
-
-            program_list_html = "Here are the programs offered:\n<ol>"
-            for i, program in enumerate(programs):
-                program_list_html += f"<li>{program.get('pgm_name', 'N/A')}</li>"
-            program_list_html += "</ol>"
-            program_list_html += "<p>If you would like to know about a specific program, type the corresponding number.</p>"
-
-            return JsonResponse({"message": program_list_html})
+            remember_programs(request.chat_state, programs)
+            with span("render"):
+                program_list = get_programme_fragments().list_bodies
+            return fragment_response(program_list[answer_format])
 
         # Handle general specific program queries
         elif len(normalized_query) > 3:
-            print(f">>> Specific program query detected: {normalized_query}")
+            set_branch("program_search")
+            logger.debug("Specific program query detected: %s", normalized_query)
             
             try:
-                university_response = requests.get(UNIVERSITY_API_URL, headers=university_headers, timeout=15)
-                
-                if university_response.status_code != 200:
-                    return JsonResponse({"message": "Sorry, unable to fetch university data now."})
-
-                uni_data = university_response.json()
-                all_programs = uni_data.get("programme", [])
-                
-                if not all_programs:
-                    return JsonResponse({"message": "Sorry, no program data is currently available. Please try again later."})
-            except Exception as e:
-                print(f">>> ERROR in process_query: {str(e)}")
-                return JsonResponse({"message": "There was an error processing your request."})
+                all_programs = programme_snapshot.get()
+            except (requests.exceptions.RequestException, ValueError) as e:
+                logger.warning("Error fetching programmes: %s", e)
+                return JsonResponse({"message": "Sorry, unable to fetch university data now."})
 
-            matching_programs = []
-            similarity_threshold = 0.6
+            if not all_programs:
+                return JsonResponse({"message": "Sorry, no program data is currently available. Please try again later."})
 
-            for program in all_programs:
-                pgm_name = program.get('pgm_name', '').lower()
-                similarity = SequenceMatcher(None, normalized_query, pgm_name).ratio()
-                
-                if similarity >= similarity_threshold:
-                    matching_programs.append((program, similarity))
-            
-            matching_programs.sort(key=lambda x: x[1], reverse=True)
-            matching_programs = [p[0] for p in matching_programs]
+            with span("program_match"):
+                matching_programs = [p[0] for p in matching.rank_programs(normalized_query, all_programs)]
 
             query_program_type = None
             for p_type in ['ba', 'ma', 'b.sc', 'm.sc', 'b.com', 'm.com', 'phd']:
@@ -664,138 +359,107 @@ def process_query(request):
             programs_to_display = filtered_by_type_programs if filtered_by_type_programs else matching_programs
 
             if len(programs_to_display) > 1:
-                request.session['programs'] = programs_to_display
+                remember_programs(request.chat_state, programs_to_display)
                 program_list_html = "Multiple programs found. Please specify by number:\n<ol>"
                 for i, program in enumerate(programs_to_display):
                     program_list_html += f"<li>{program.get('pgm_name', 'N/A')} ({program.get('pgm_category', 'N/A')})</li>"
                 program_list_html += "</ol>"
-                return JsonResponse({"message": program_list_html})
+                return cacheable(JsonResponse({"message": program_list_html}))
             else:
                 found_program = matching_programs[0] if matching_programs else None
 
             if found_program:
-                print(f">>> Program found (direct query): {found_program.get('pgm_name', 'N/A')}")
-                print(f"DEBUG: found_program pgm_year: {found_program.get('pgm_year')}, duration: {found_program.get('duration')}")
+                logger.debug("Program found (direct query): %s", found_program.get('pgm_name', 'N/A'))
                 program_details_html = f"<h3>{found_program.get('pgm_name', 'N/A')}</h3>"
                 program_details_html += f"<p><strong>Description:</strong> {found_program.get('pgm_desc', 'N/A')}</p>"
                 program_details_html += f"<p><strong>Category:</strong> {found_program.get('pgm_category', 'N/A')}</p>"
                 program_details_html += f"<p><strong>year:</strong> {found_program.get('pgm_year', 'N/A')}</p>"
-                return JsonResponse({"message": program_details_html})
+                return cacheable(JsonResponse({"message": program_details_html}))
                 
         elif user_query.isdigit():
-            stored_programs = request.session.get('programs')
-
-            if stored_programs and len(stored_programs) > 0:
-                program_index = int(user_query) - 1
-                if 0 <= program_index < len(stored_programs):
-                    program = stored_programs[program_index]
-                    print(f"DEBUG: Retrieved program details from session (by number): {program.get('pgm_name', 'N/A')}")
-                    print(f"DEBUG: session program pgm_year: {program.get('pgm_year')}, duration: {program.get('duration')}")
+            set_branch("program_number")
+            if listed_program_count(request.chat_state) > 0:
+                program = recall_program(request.chat_state, int(user_query))
+                if program:
+                    logger.debug("Listed program %s: %s", user_query, program.get('pgm_name', 'N/A'))
                     program_details_html = f"<p><b>Program Name:</b> {program.get('pgm_name', 'N/A')}</p>"
                     program_details_html += f"<p><b>Description:</b> {program.get('pgm_desc', 'N/A')}</p>"
                     program_details_html += f"<p><b>Category:</b> {program.get('pgm_category', 'N/A')}</p>"
                     program_details_html += f"<p><strong>year:</strong> {program.get('pgm_year', 'N/A')}</p>"
                     return JsonResponse({"message": program_details_html})
                 else:
-                    if 'programs' in request.session:
-                        del request.session['programs']
+                    forget_programs(request.chat_state)
                     return JsonResponse({"message": "The number you entered does not correspond to an available program. Please list programs first or enter a valid program number."})
             else:
-                if 'programs' in request.session:
-                    del request.session['programs']
+                forget_programs(request.chat_state)
                 return JsonResponse({"message": "Please list programs first before entering a number."})
         else:
             # Default processing with Groq API
+            set_branch("llm")
             centers = []
-            programs = []
-            
-            university_response = requests.get(UNIVERSITY_API_URL, headers=university_headers, timeout=10)
-
-            print(f">>> University API status: {university_response.status_code}")
-            print(f">>> University API response (preview): {university_response.text[:200]}")
 
-            if university_response.status_code != 200:
+            try:
+                programs = programme_snapshot.get()
+            except (requests.exceptions.RequestException, ValueError):
                 return JsonResponse({"message": "Sorry, unable to fetch university data now."})
 
-            uni_data = university_response.json()
-            programs = uni_data.get("programme", [])
-            print(f"DEBUG: Programs data from API: {programs[:2]}")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Programs data from snapshot: %s", programs[:2])
             if not isinstance(programs, list):
                 return JsonResponse({"message": "Invalid data format received from university API."})
 
-            prompt = build_prompt(user_query, programs, centers)
-            answer = call_groq_api(prompt, programs, centers)
+            with span("prompt"):
+                prompt = build_prompt(user_query, programs, centers)
+            if getattr(request, "stream_llm", False):
+                if not deadline.allows("llm"):
+                    return JsonResponse({"message": OUT_OF_TIME_ANSWER})
+                # The stream runs after this view returns, outside the deadline: hand it the budget left now
+                timeout = deadline.cap(upstream.timeout_for("groq"))
+                return sse_response(stream_groq_events(prompt, centers, user_query=user_query, timeout=timeout))
+            if getattr(request, "defer_llm", False):
+                return PendingCompletion(prompt, centers, user_query)
+            with span("llm"):
+                answer = call_groq_api(prompt, programs, centers, user_query=user_query)
 
             return JsonResponse({"message": answer})
 
     except json.JSONDecodeError:
-        print(">>> ERROR: Invalid JSON in request body")
+        set_branch("invalid")
+        logger.warning("Invalid JSON in request body")
         return JsonResponse({"message": "Invalid request format."})
-    except Exception as e:
-        print(f">>> ERROR in process_query: {str(e)}")
-        import traceback
-        traceback.print_exc()
+    except Exception:
+        set_branch("error")
+        logger.exception("Error in process_query")
         return JsonResponse({"message": "There was an error processing your request. Please try again later."})
     
     # Default return if no other condition is met
     return JsonResponse({"message": "I'm sorry, I couldn't understand your request. Please try rephrasing it."})
 
 
-def fetch_lsc_data(regional_center_name=None, rc_name_mapping=None):
+def fetch_lsc_answer(regional_center_name, centers=None, answer_format="html"):
     """
-    Fetches LSC data and optionally filters by regional center name.
-    Also formats LSCs in dropdown format for RC-specific queries.
+    The answer listing the LSCs of one regional center, in the requested
+    format, or None if it has none. Errors fetching the LSC data are
+    raised. `centers` is the CenterDirectory used to resolve the name to
+    an RC id.
     """
-    api_url = LSC_API_URL
-    headers = {"X-API-KEY": UNIVERSITY_API_KEY}
-    
-    try:
-        response = requests.get(api_url, headers=headers, timeout=10)
-        response.raise_for_status()
-        lsc_data = response.json().get("lsc", [])
+    lscs = get_lsc_fragments(centers)
 
-        if regional_center_name and rc_name_mapping:
-            target_rc_id = None
-            regional_center_name = regional_center_name.strip().lower()
-
-            for rc_id, rc_name in rc_name_mapping.items():
-                cleaned = rc_name.replace('–', '-').replace('—', '-').replace('\xa0', ' ')
-                if '-' in cleaned:
-                    after_dash = cleaned.split('-')[-1].strip().lower()
-                else:
-                    after_dash = cleaned.strip().lower()
-
-                print(f"Checking user input '{regional_center_name}' against trimmed RC part '{after_dash}'")
-                if regional_center_name == after_dash:
-                    target_rc_id = rc_id
-                    break
-
-            if target_rc_id is None:
-                print(f"No regional center matches '{regional_center_name}' after trimming")
-                return []
-
-            filtered_lscs = []
-            for lsc in lsc_data:
-                lsc_rc_id = lsc.get("lscrc")
-                if isinstance(lsc_rc_id, str) and lsc_rc_id.isdigit():
-                    lsc_rc_id = int(lsc_rc_id)
-                if lsc_rc_id == target_rc_id:
-                    filtered_lscs.append(lsc)
-            return filtered_lscs
-
-        else:
-            return lsc_data
-    except requests.exceptions.RequestException as e:
-        print(f"Error fetching LSC data: {e}")
+    target_rc_id = centers.find_rc_id(regional_center_name) if centers else None
+    if target_rc_id is None:
+        logger.debug("No regional center matches %r after trimming", regional_center_name)
         return None
+    return lscs.for_regional_center(target_rc_id, lsc_list_title(regional_center_name), answer_format)
 
 
-
-def handle_specific_program_field_query(user_query, all_programs):
+def handle_specific_program_field_query(user_query, all_programs=None):
     """
     Handle queries asking for specific fields of specific programs
     e.g., "category of MA History", "duration of BA English", etc.
+    Reads from the shared programme snapshot when no program list is given.
     """
+    if all_programs is None:
+        all_programs = programme_snapshot.get()
     normalized_query = user_query.lower()
 
     # Define field keywords and their corresponding API fields
@@ -834,30 +498,18 @@ def handle_specific_program_field_query(user_query, all_programs):
     # Clean up extra spaces and trim
     query_for_program = ' '.join(query_for_program.split()).strip()
     
-    print(f"DEBUG: Looking for program: '{query_for_program}'")
+    logger.debug("Looking for program: %r", query_for_program)
     
     # Find matching program with appropriate similarity threshold for field queries
-    best_match = None
-    best_similarity = 0
-    similarity_threshold = 0.6  # Lowered threshold to better match program names
-    
-    for program in all_programs:
-        pgm_name = program.get('pgm_name', '').lower()
-        similarity = SequenceMatcher(None, query_for_program, pgm_name).ratio()
-        
-        print(f"DEBUG: Comparing '{query_for_program}' with '{pgm_name}' - Similarity: {similarity}")
-        
-        if similarity >= similarity_threshold and similarity > best_similarity:
-            best_match = program
-            best_similarity = similarity
-    
-    if not best_match:
+    match = matching.best_program(query_for_program, all_programs)
+    if not match:
         return f"Sorry, I couldn't find a program matching '{query_for_program}'. Please be more specific with the program name."
-    
+
+    best_match, best_similarity = match
     program_name = best_match.get('pgm_name', 'N/A')
     field_value = best_match.get(api_field, 'N/A')
-    
-    print(f"DEBUG: Found program: {program_name}, Field: {detected_field}, Value: {field_value}")
+    logger.debug("Best match for %r: %r (similarity %s), %s: %s",
+                 query_for_program, program_name, best_similarity, detected_field, field_value)
     
     # Format response based on field type
     if detected_field in ['category']:
@@ -886,64 +538,16 @@ def handle_fee_structure_query(program_data):
         return f"Sorry, I couldn't find the fee structure for {pgm_name}."
 
 
-def build_prompt(user_query, programs, centers=None):
-    print(f"DEBUG: Programs received by build_prompt: {programs}")
-    # Only include program list if user explicitly asks about programs
-    program_text = ""
-    normalized_query = user_query.lower()
-    program_html_items = []
-    print(f"DEBUG: Programs data type: {type(programs)}")
-    print(f"DEBUG: Programs sample: {programs[:2] if programs else 'None'}")
-
-    # Check for category-specific program queries
-    category_keywords = ["ug", "pg", "diploma", "certificate", "doctoral", "post graduate", "under graduate"]
-    category_mapping = {
-        "ug": "undergraduate",
-        "under graduate": "undergraduate",
-        "pg": "postgraduate",
-        "post graduate": "postgraduate"
-    }
-    
-    found_category = None
-    for cat_kw in category_keywords:
-        if cat_kw in normalized_query and ("program" in normalized_query or "category" in normalized_query):
-            found_category = cat_kw
-            break
-
-    if found_category:
-        # Map abbreviated categories to their full names
-        search_category = category_mapping.get(found_category.lower(), found_category.lower())
-        print(f"DEBUG: Searching for category: {found_category} mapped to {search_category}")
-        filtered_programs = [p for p in programs if p.get("pgm_category", "").lower() == search_category]
-        if filtered_programs:   
-            for program in filtered_programs:
-                print(f"DEBUG: Program category: {program.get('pgm_category')}")
-                print(f"DEBUG: Program full data: {program}")
-                program_name = program.get("pgm_name", "Unknown")
-                program_html_items.append(f"<li>{program_name}</li>")
-            program_text = f"Here are our {found_category.upper()} programs:\n<ol>{''.join(program_html_items)}</ol>\n\n"
-        else:
-            program_text = f"No {found_category.upper()} programs found.\n\n"
-    elif any(
-        keyword in normalized_query
-        for keyword in ["program", "course", "study", "list programs", "show programs", "all programs", "what are the programs"]
-    ):
-        # Format all programs as HTML ordered list
-        for program in programs:
-            print(f"DEBUG: All Program category: {program.get('pgm_category')}")
-            program_name = program.get("pgm_name", "Unknown")
-            program_html_items.append(f"<li>{program_name}</li>")
-        program_text = f"Here are all our available programs:\n<ol>{''.join(program_html_items)}</ol>\n\n"
-
-    centers_text = ""
-    # Always include centers_text if centers data is available
-    if centers:
-        # Format centers as HTML ordered list
-        centers_html_items = []
-        for center in centers:
-            centers_html_items.append(f"<li>{center}</li>")
-
-        centers_text = f"Here are our regional centers:\n<ol>{''.join(centers_html_items)}</ol>\n\n"
+def build_prompt(user_query, programs=None, centers=None):
+    """
+    The Groq prompt for a query: fixed instructions plus the programmes,
+    QnA pairs and centers relevant to it, within CHAT_PROMPT_CONTEXT_TOKENS.
+    Reads the shared programme snapshot when no program list is given.
+    """
+    context, context_tokens = build_context(user_query, programs, centers)
+    logger.debug("Prompt context for %r: ~%d tokens", user_query, context_tokens)
+    if context:
+        context += "\n\n"
 
     prompt = (
         "You are an expert assistant for SGOU (Sri Guru Gobind Singh Tricentenary University). "
@@ -965,8 +569,7 @@ def build_prompt(user_query, programs, centers=None):
         "2. Each center must be in its own <li> tag\n"
         "3. Include all center information with proper HTML formatting\n"
         "4. Use <br> tags for line breaks within each center's information\n"
-        f"{program_text}"
-        f"{centers_text}"
+        f"{context}"
         f"User question: {user_query}\n"
         "Format your response appropriately - use paragraphs for general information and HTML ordered lists for both programs and centers. "
         "Avoid asking follow-up questions that require a 'yes' or 'no' response. Provide direct and complete answers to user queries."
@@ -976,7 +579,8 @@ def build_prompt(user_query, programs, centers=None):
     return prompt
 
 
-def call_groq_api(prompt, programs_data, centers_data=None):
+def groq_request(prompt, centers_data=None):
+    """Headers and JSON body of a Groq chat completion request for a prompt."""
     headers = {
         "Authorization": f"Bearer {GROQ_API_KEY}",
         "Content-Type": "application/json",
@@ -1005,149 +609,262 @@ def call_groq_api(prompt, programs_data, centers_data=None):
         "temperature": 0.7,
         "max_tokens": 1500,  # Increased from 500 to 1500
     }
+    return headers, body
+
+
+def groq_answer(body, response):
+    """The answer in a Groq completion response, and whether it is a real answer worth caching."""
+    if response.status_code != 200:
+        logger.warning("Groq API error %s: %s", response.status_code, response.text)
+        return "Sorry, I am having trouble accessing the knowledge base right now.", False
+    data = response.json()
+    metrics.record_llm_usage(body["model"], data.get("usage"))
+    content = data.get("choices", [{}])[0].get("message", {}).get("content")
+    if not content:
+        return "Sorry, no answer found.", False
+    return content, True
+
+
+def call_groq_api(prompt, programs_data, centers_data=None, user_query=None):
+    headers, body = groq_request(prompt, centers_data)
+
+    cached_answer = completion_cache.lookup(body, user_query)
+    if cached_answer is not None:
+        return cached_answer
+    if not deadline.allows("llm"):
+        return OUT_OF_TIME_ANSWER
 
     try:
-        response = requests.post(
-            GROQ_API_URL, headers=headers, json=body, timeout=30
-        )  # Increased timeout
-        if response.status_code == 200:
-            data = response.json()
-            return (
-                data.get("choices", [{}])[0]
-                .get("message", {})
-                .get("content", "Sorry, no answer found.")
-            )
-        else:
-            print("Groq API error:", response.status_code, response.text)
-            return "Sorry, I am having trouble accessing the knowledge base right now."
+        response = upstream.post("groq", GROQ_API_URL, headers=headers, json=body)
+        answer, complete = groq_answer(body, response)
+        if complete:
+            completion_cache.store(body, answer, user_query)
+        return answer
     except Exception as e:
-        print("Error calling Groq API:", e)
+        logger.warning("Error calling Groq API: %s", e)
         return "Sorry, I'm unable to generate a response right now."
 
-def fetch_centers(request):
+
+async def acall_groq_api(prompt, centers_data=None, user_query=None):
+    """call_groq_api for async views: Groq is awaited with the async upstream client."""
+    headers, body = groq_request(prompt, centers_data)
+
+    cached_answer = await sync_to_async(completion_cache.lookup)(body, user_query)
+    if cached_answer is not None:
+        return cached_answer
+    if not deadline.allows("llm"):
+        return OUT_OF_TIME_ANSWER
+
     try:
-        headers = {
-            "X-API-KEY": UNIVERSITY_API_KEY,
-            "Accept": "application/json",
-        }
+        response = await async_upstream.post("groq", GROQ_API_URL, headers=headers, json=body)
+        answer, complete = groq_answer(body, response)
+        if complete:
+            await sync_to_async(completion_cache.store)(body, answer, user_query)
+        return answer
+    except Exception as e:
+        logger.warning("Error calling Groq API: %s", e)
+        return "Sorry, I'm unable to generate a response right now."
 
-        response = requests.get(CENTERS_API_URL, headers=headers, timeout=10)
 
-        response.raise_for_status()
-        raw_centers_content = response.text
+def stream_groq_api(prompt, centers_data=None, user_query=None, timeout=None):
+    """
+    Yield the Groq answer to a prompt piece by piece as Groq streams it.
+    The completion is cached under the same key as call_groq_api's, so a
+    cached answer comes back as a single piece. `timeout` defaults to the
+    Groq endpoint's.
+    """
+    headers, body = groq_request(prompt, centers_data)
+
+    cached_answer = completion_cache.lookup(body, user_query)
+    if cached_answer is not None:
+        yield cached_answer
+        return
+
+    pieces = []
+    if timeout is None:
+        timeout = upstream.timeout_for("groq")
+    with upstream.post("groq", GROQ_API_URL, headers=headers, json={**body, "stream": True}, stream=True,
+                       timeout=timeout) as response:
+        if response.status_code != 200:
+            logger.warning("Groq API error %s: %s", response.status_code, response.text)
+            raise requests.exceptions.HTTPError(f"Groq API returned {response.status_code}", response=response)
+        for line in response.iter_lines(chunk_size=None, decode_unicode=True):
+            # Groq streams OpenAI-style SSE: "data: {chunk}" lines, then "data: [DONE]"
+            if not line or not line.startswith("data:"):
+                continue
+            payload = line[len("data:"):].strip()
+            if payload == "[DONE]":
+                break
+            chunk = json.loads(payload)
+            # Groq reports usage on the last chunk, under x_groq; OpenAI-style APIs at the top level
+            metrics.record_llm_usage(body["model"], chunk.get("usage") or chunk.get("x_groq", {}).get("usage"))
+            delta = (chunk.get("choices") or [{}])[0].get("delta", {}).get("content")
+            if delta:
+                pieces.append(delta)
+                yield delta
+
+    if pieces:
+        completion_cache.store(body, "".join(pieces), user_query)
+
+
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def sse_response(events):
+    response = StreamingHttpResponse(events, content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"  # keep nginx from buffering the stream
+    return response
+
+
+def stream_groq_events(prompt, centers_data=None, user_query=None, timeout=None):
+    """SSE events for a streamed Groq answer: "token" per piece, then "done" or "error"."""
+    try:
+        with span("llm"):
+            for piece in stream_groq_api(prompt, centers_data, user_query, timeout):
+                yield sse_event("token", {"content": piece})
+    except Exception as e:
+        logger.warning("Error streaming from Groq API: %s", e)
+        yield sse_event("error", {"message": "Sorry, I'm unable to generate a response right now."})
+        return
+    yield sse_event("done", {})
 
-        # Debug: Print the raw API response content
-        print(
-            f">>> Raw centers API response content: {raw_centers_content[:500]} (truncated to 500 chars)"
-        )
 
-        centers_data = {}
-        try:
-            centers_data = json.loads(raw_centers_content)
-        except json.JSONDecodeError:
-            print(
-                f"Error: Could not decode JSON from centers API response. Content: {raw_centers_content}"
-            )
-            return []  # Return empty list if JSON decoding fails
-
-        centers_list = []
-        if isinstance(centers_data, dict):
-            # Try different possible keys for centers data
-            centers_list = (
-                centers_data.get("rc", [])
-                or centers_data.get("centers", [])
-                or centers_data.get("data", [])
-            )
-        elif isinstance(centers_data, list):
-            centers_list = centers_data
+@csrf_exempt
+@require_POST
+@trace_request
+@compress_response
+@with_conversation_state
+def process_query_stream(request):
+    """
+    process_query over Server-Sent Events. Answers that don't need the LLM
+    arrive as one "message" event carrying the usual JSON payload, sent as
+    a complete (and so compressible) response; the Groq fallback streams
+    "token" events as Groq produces them.
+    """
+    request.stream_llm = True
+    response = process_query(request)
+    if response.streaming:
+        return response
+    # The JSON body has no raw newlines, so it is a valid single data line
+    events = b"event: message\ndata: " + response.content + b"\n\n" + sse_event("done", {}).encode()
+    response = HttpResponse(events, content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    return response
+
+
+class PendingCompletion(JsonResponse):
+    """
+    process_query's LLM answer when process_query_async asked it to defer
+    the Groq call: the prompt, to be answered by the async view.
+    """
 
-        print(f"Debug: centers_list before processing in fetch_centers: {centers_list}")
+    def __init__(self, prompt, centers, user_query):
+        super().__init__({})
+        self.prompt = prompt
+        self.centers = centers
+        self.user_query = user_query
+
+
+def feeds_for(intent):
+    """The feed snapshots process_query may read to answer a query with this intent."""
+    if intent.is_field_query:
+        return [programme_snapshot]
+    if intent.is_fee_query:
+        return [qna_snapshot]
+    wanted = []
+    if not (intent.is_list_request and (intent.is_program_query or intent.is_center_query or intent.is_lsc_query)):
+        wanted.append(qna_snapshot)
+    if intent.rc_name is not None or intent.is_center_query or intent.is_lsc_query:
+        wanted += [centers_snapshot, lsc_snapshot]
+    else:
+        wanted.append(programme_snapshot)
+    return wanted
 
-        # Ensure each item in centers_list is a dictionary
-        processed_centers_list = []
-        for item in centers_list:
-            print(f"Debug: Processing item type: {type(item)}, content: {item}")
-            if isinstance(item, str):
-                try:
-                    # Attempt to decode string-encoded JSON
-                    decoded_item = json.loads(item)
-                    if isinstance(decoded_item, dict):
-                        processed_centers_list.append(decoded_item)
-                    else:
-                        print(
-                            f"Warning: Decoded item is not a dictionary: {decoded_item}"
-                        )
-                except json.JSONDecodeError:
-                    print(f"Warning: Could not decode string item to JSON: {item}")
-            elif isinstance(item, dict):
-                processed_centers_list.append(item)
-            else:
-                print(
-                    f"Warning: Unexpected item type in centers_list: {type(item)} - {item}"
-                )
 
-        formatted_centers = []
-        for idx, center in enumerate(processed_centers_list):
-            # Try different possible field names
-            name = (center.get('rcname') or
-                    center.get('name') or
-                    center.get('center_name') or
-                    'Unknown Center')
-            address = (center.get('rcaddress') or
-                       center.get('address') or
-                       center.get('center_address') or
-                       'N/A')
-            headname = (center.get('headname') or
-                        center.get('director_name') or
-                        center.get('head_name') or
-                        'N/A')
-            headnumber = (center.get('headnumber') or
-                          center.get('director_phone') or
-                          center.get('phone') or
-                          center.get('contact_number') or
-                          'N/A')
-            headmail = (center.get('headmail') or
-                        center.get('director_email') or
-                        center.get('email') or
-                        center.get('contact_email') or
-                        'N/A')
-
-            # Only include centers with a known name
-            if name != 'Unknown Center' and name != 'N/A':
-                # Format each center with HTML formatting for better display
-                center_html = f"""
-<div class="rc-item">
-  <div class="rc-header" onclick="toggleDropdown(this)">
-    <span class="rc-title">{name}</span>
-    <span class="rc-arrow">&#9660;</span>
-  </div>
-  <div class="rc-details" style="display: none; margin-top: 5px;">
-    <strong>Address:</strong> {address}<br>
-    <strong>RC Director:</strong> {headname}<br>
-    <strong>Number:</strong> {headnumber}<br>
-    <strong>Email:</strong> <a href='mailto:{headmail}' style='color: #0066cc;'>{headmail}</a>
-  </div>
-</div>
-"""
-
-                formatted_centers.append(center_html)
-                print(f">>> Formatted center {idx + 1}: {center_html[:100]}...")
-
-        print(f">>> Total formatted centers: {len(formatted_centers)}")
-        return JsonResponse({"formatted_centers": formatted_centers, "raw_centers": processed_centers_list}) # Return both formatted and raw data
+def answered_by_qna(user_query):
+    qna_index = get_qna_index(qna_snapshot)
+    # best_qna_matches() leaves the match counters to process_query's own lookup
+    return bool(qna_index.exact_match(user_query) or matching.best_qna_matches([user_query])[0])
+
+
+async def prefetch_feeds(user_query, intent):
+    """
+    Load the cold feeds a query may need, all at once. When the QnA feed
+    turns out to answer the query, the fetches still running are
+    cancelled, since the answer no longer depends on them. Failures are
+    left to process_query, which reports them as it always has.
+    """
+    wanted = feeds_for(intent)
+    tasks = {snapshot: asyncio.ensure_future(snapshot.aget()) for snapshot in wanted if not snapshot.loaded}
+    if not tasks:
+        return
+    try:
+        if qna_snapshot in wanted and not intent.is_fee_query:
+            if qna_snapshot in tasks:
+                await asyncio.wait([tasks[qna_snapshot]])
+            # Building the index and fuzzy scoring are CPU work; keep them off the event loop
+            if qna_snapshot.loaded and await sync_to_async(answered_by_qna)(user_query):
+                return
+        await asyncio.wait(tasks.values())
+    finally:
+        for task in tasks.values():
+            task.cancel()
+        results = await asyncio.gather(*tasks.values(), return_exceptions=True)
+        for snapshot, result in zip(tasks, results):
+            if isinstance(result, Exception):
+                logger.warning("Fetching the %s feed failed: %s", snapshot.name, result)
+
+
+@csrf_exempt
+@require_POST
+@trace_request
+@with_deadline
+async def process_query_async(request):
+    """
+    process_query for ASGI servers. The cold feeds a query may need are
+    fetched concurrently with the async upstream client; process_query
+    then answers from memory on a thread, and a Groq answer is awaited
+    here, so waiting on upstreams holds no thread.
+    """
+    try:
+        user_query = normalize_query(json.loads(request.body).get("query", ""))
+    except (ValueError, AttributeError, TypeError):
+        user_query = ""  # process_query answers malformed requests
+    if user_query:
+        with span("prefetch"):
+            await prefetch_feeds(user_query, route(user_query.lower()))
+
+    request.defer_llm = True
+    response = await sync_to_async(process_query)(request)
+    if isinstance(response, PendingCompletion):
+        with span("llm"):
+            answer = await acall_groq_api(response.prompt, response.centers, response.user_query)
+        response.content = json.dumps({"message": answer})
+        compress(request, response)
+    return response
+
+
+def fetch_centers(request):
+    try:
+        centers = get_center_directory()
+        logger.debug("Total formatted centers: %d", len(centers.formatted_centers))
+        raw_centers = [dict(center) for center in centers.raw_centers]  # may be read from a shared snapshot
+        return JsonResponse({"formatted_centers": centers.formatted_centers, "raw_centers": raw_centers}) # Return both formatted and raw data
 
     except requests.exceptions.RequestException as e:
-        print(f">>> Error fetching centers: {e}")
+        logger.warning("Error fetching centers: %s", e)
         return JsonResponse(
             {"message": "Sorry, unable to fetch center data now."}, status=500
         )
     except ValueError as e:
-        print(f">>> Error parsing centers JSON: {e}")
+        logger.warning("Error parsing centers JSON: %s", e)
         return JsonResponse(
             {"message": "Sorry, invalid center data received."}, status=500
         )
     except Exception as e:
-        print(f">>> An unexpected error occurred: {e}")
+        logger.exception("Unexpected error fetching centers")
         return JsonResponse(
             {"message": "An unexpected error occurred while fetching centers."},
             status=500,
@@ -1161,7 +878,7 @@ def fetch_programs(request):
 
     try:
         # Call the SGOU API
-        response = requests.get(sgou_api_url, timeout=10)
+        response = upstream.get("sgou_programs", sgou_api_url)
         response.raise_for_status()
         data = response.json()
 
@@ -1202,8 +919,7 @@ def fetch_programs(request):
 
         # Format programs as HTML ordered list
         program_html_items = []
-        print(f"DEBUG: Programs data type: {type(programs)}")
-        print(f"DEBUG: Programs sample: {programs[:2] if programs else 'None'}")
+        logger.debug("%d programs from the SGOU API", len(programs_list))
         for program in programs_list:
             name = program.get("pgm_name", "")
             if name:  # Only add if name exists
@@ -1,19 +1,18 @@
 from django.shortcuts import render
-from django.http import JsonResponse
 from Chat.models import Program, ProgramCategory
+from api.rows import StreamingJsonResponse, value_rows
+
+PROGRAM_QUERY_FIELDS = (
+    ('name', 'name'),
+    ('category', 'category__name'),
+    ('duration', 'duration'),
+    ('description', 'description'),
+)
 
 
 def program_query(request):
+    # One query with the category joined in, streamed as a JSON array
     programs = Program.objects.all()
-    data = [
-        {
-            'name': program.name,
-            'category': program.category.name,
-            'duration': program.duration,
-            'description': program.description
-        }
-        for program in programs
-    ]
-    return JsonResponse(data, safe=False)
+    return StreamingJsonResponse(value_rows(programs, PROGRAM_QUERY_FIELDS))
 
-# Create your views here.
\ No newline at end of file
+# Create your views here.
@@ -137,9 +137,76 @@ STATICFILES_DIRS = [
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    # Chat conversation state. Per process; with several workers use a shared
+    # backend (Redis, Memcached, or FileBasedCache on one host) instead.
+    'chat_state': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'chat-state',
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+}
+
+
 OPENROUTER_API_KEY = "your_openrouter_key_here"
 
 
+# Upstream SGOU / Groq data
+CHAT_PROGRAMME_SNAPSHOT_TTL = 300  # seconds before the programme list is revalidated
+CHAT_QNA_SNAPSHOT_TTL = 300  # seconds before the QnA feed is revalidated
+CHAT_CENTERS_SNAPSHOT_TTL = 3600  # regional centers rarely change
+CHAT_LSC_SNAPSHOT_TTL = 3600  # nor do learning support centers
+CHAT_FEED_RETRY_INTERVAL = 30  # seconds between background refreshes of a feed after one failed
+CHAT_SNAPSHOT_PERSIST_DIR = None  # directory for the last fetch of each feed, served at startup and during outages, e.g. BASE_DIR / 'var' / 'feeds'
+CHAT_SHARED_SNAPSHOT_DIR = None  # directory for feed snapshots mapped by every worker (POSIX only); None keeps a copy per process
+CHAT_DATA_SOURCE = 'upstream'  # or 'database' to serve the rows mirrored by `manage.py sync_upstream`
+CHAT_RESPONSE_CACHE_SIZE = 512  # cached process_query answers; 0 disables the cache
+CHAT_RESPONSE_CACHE_TTL = 60  # seconds a cached answer is served
+CHAT_STATE_CACHE = 'chat_state'  # cache holding conversation state between chat messages
+CHAT_STATE_COOKIE = 'sgou_chat'  # cookie carrying the conversation id
+CHAT_STATE_TTL = 24 * 60 * 60  # seconds an idle conversation is remembered
+CHAT_RESPONSE_COMPRESSION = True  # gzip/brotli process_query answers for clients that accept it
+CHAT_COMPRESSION_MIN_BYTES = 1024  # smaller answers are sent uncompressed
+CHAT_GZIP_LEVEL = 6
+CHAT_BROTLI_QUALITY = 5  # used when the optional brotli package is installed
+CHAT_REQUEST_LOG = True  # one JSON line per chat request (branch, stage timings) on the chatbot logger
+CHAT_METRICS_ENABLED = True  # serve request, upstream, cache and LLM token metrics at /metrics
+CHAT_COMPLETION_CACHE_ENABLED = True  # reuse Groq answers for identical prompts
+CHAT_COMPLETION_CACHE_TTL = 24 * 60 * 60  # seconds a cached Groq answer stays valid
+CHAT_COMPLETION_CACHE_MAX_ENTRIES = 5000  # least recently used answers are evicted past this
+CHAT_COMPLETION_CACHE_NEAR_DUPLICATES = False  # also reuse answers for the same normalized query
+CHAT_PROMPT_CONTEXT_TOKENS = 1200  # estimated tokens of programmes/QnA/centers put in a Groq prompt
+CHAT_PROMPT_TOP_K = {'qna': 3, 'programmes': 8, 'centers': 4}  # most items retrieved per kind
+CHAT_MATCHING_ENGINE = 'difflib'  # or 'tfidf' (needs numpy and scipy)
+CHAT_REQUEST_BUDGET = 20  # seconds a chat request may take across all its upstream calls; None disables
+CHAT_UPSTREAM_MIN_BUDGET = 0.5  # upstream calls are skipped when less budget than this is left
+CHAT_DEADLINE_RESERVE = 0.25  # seconds of the budget kept back from upstream calls to send the answer in time
+CHAT_OPTIONAL_STAGE_BUDGET = {'qna': 2, 'llm': 5}  # budget a cold QnA lookup / Groq call needs, or it is skipped
+CHAT_UPSTREAM_POOL_HOSTS = 10  # hosts with a cached keep-alive pool
+CHAT_UPSTREAM_POOL_SIZE = 20  # keep-alive connections per host
+CHAT_UPSTREAM_RETRIES = 2
+CHAT_UPSTREAM_BACKOFF = 0.3
+CHAT_UPSTREAM_COALESCE_WAIT = None  # seconds to wait on another thread's fetch of the same feed; None = that endpoint's timeout
+CHAT_UPSTREAM_TIMEOUTS = {
+    'programmes': 15,
+    'centers': 10,
+    'lsc': 10,
+    'qna': 10,
+    'groq': 30,
+}
+
+
+# api app
+API_BULK_BATCH_SIZE = 500  # rows per INSERT/UPDATE when a list endpoint receives a JSON array
+API_BULK_MAX_ITEMS = 10000  # largest JSON array accepted in one request
+
+
 import os
 LOGGING = {
     'version': 1,
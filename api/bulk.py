@@ -0,0 +1,93 @@
+"""
+Bulk create / upsert for the ListCreate endpoints.
+
+POSTing a JSON array instead of a single object validates every item
+with the view's serializer (many=True) and writes them in one
+transaction with bulk_create, API_BULK_BATCH_SIZE rows per INSERT.
+
+A view with a `natural_key` (field names identifying a row, such as
+Faq.question) upserts: items whose key matches an existing row update
+that row with bulk_update instead of creating a duplicate, and within
+one request the last item with a key wins. Rows mirrored from the SGOU
+feeds by sync_upstream are never matched: the next sync would overwrite
+the edit, so an item with the key of a mirrored row creates a row of its
+own. The response reports how many rows were created and updated rather
+than echoing them back.
+
+These writes change the api tables and their ETags only; the chatbot
+reads the feeds, or just the rows sync_upstream mirrored.
+"""
+from django.conf import settings
+from django.db import transaction
+from rest_framework import status
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+
+from Chat import model_versions
+from Chat.models import UpstreamRecord
+
+
+class BulkCreateMixin:
+    natural_key = ()
+    bulk_batch_size = None
+
+    def get_bulk_batch_size(self):
+        return self.bulk_batch_size or getattr(settings, 'API_BULK_BATCH_SIZE', 500)
+
+    def create(self, request, *args, **kwargs):
+        if not isinstance(request.data, list):
+            return super().create(request, *args, **kwargs)
+        max_items = getattr(settings, 'API_BULK_MAX_ITEMS', 10000)
+        if len(request.data) > max_items:
+            raise ValidationError({'non_field_errors': [f'At most {max_items} items can be sent at once.']})
+        serializer = self.get_serializer(data=request.data, many=True)
+        serializer.is_valid(raise_exception=True)
+        created, updated = self.perform_bulk_create(serializer.validated_data)
+        return Response({'created': created, 'updated': updated}, status=status.HTTP_201_CREATED)
+
+    def natural_key_of(self, obj):
+        model = type(obj)
+        return tuple(getattr(obj, model._meta.get_field(name).attname) for name in self.natural_key)
+
+    def existing_rows(self, model, objs, batch_size):
+        """Existing rows sharing a natural key with one of `objs`, by key."""
+        first = model._meta.get_field(self.natural_key[0]).attname
+        values = sorted({getattr(obj, first) for obj in objs}, key=str)
+        rows = model.objects.all()
+        if issubclass(model, UpstreamRecord):
+            rows = rows.filter(source_id__isnull=True)
+        existing = {}
+        for start in range(0, len(values), batch_size):
+            for row in rows.filter(**{f'{first}__in': values[start:start + batch_size]}).order_by('pk'):
+                existing.setdefault(self.natural_key_of(row), row)
+        return existing
+
+    def perform_bulk_create(self, items):
+        model = self.get_queryset().model
+        batch_size = self.get_bulk_batch_size()
+        objs = [model(**attrs) for attrs in items]
+        to_create, to_update, update_fields = objs, [], set()
+
+        with transaction.atomic(), model_versions.batched():
+            if self.natural_key:
+                latest = {}
+                for obj, attrs in zip(objs, items):
+                    latest[self.natural_key_of(obj)] = (obj, attrs)
+                existing = self.existing_rows(model, objs, batch_size)
+                to_create = []
+                for key, (obj, attrs) in latest.items():
+                    row = existing.get(key)
+                    if row is None:
+                        to_create.append(obj)
+                        continue
+                    for name, value in attrs.items():
+                        setattr(row, name, value)
+                    update_fields.update(attrs)
+                    to_update.append(row)
+
+            model.objects.bulk_create(to_create, batch_size=batch_size)
+            if to_update:
+                model.objects.bulk_update(to_update, sorted(update_fields), batch_size=batch_size)
+            if to_create or to_update:
+                model_versions.bump(model)
+        return len(to_create), len(to_update)
@@ -0,0 +1,53 @@
+"""
+Conditional GET for the read endpoints.
+
+A view lists the models its responses are built from in `cache_models`.
+The ETag is derived from those models' version counters (see
+Chat.model_versions) plus the request path, query string and response
+media type, and Last-Modified is the latest change among them. A client
+revalidating with If-None-Match or If-Modified-Since gets a 304 before
+any row is read or serialized.
+"""
+import hashlib
+
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+from Chat import model_versions
+
+
+class ConditionalGetMixin:
+    cache_models = ()
+
+    def get_cache_models(self):
+        return self.cache_models or (self.get_queryset().model,)
+
+    def get_validators(self, request):
+        versions = model_versions.versions(*self.get_cache_models())
+        key = "|".join([
+            request.get_full_path(),
+            request.accepted_media_type or "",
+            ",".join(str(version) for version, _ in versions),
+        ])
+        etag = '"%s"' % hashlib.sha1(key.encode()).hexdigest()
+        changed = [changed_at for _, changed_at in versions if changed_at is not None]
+        last_modified = int(max(changed).timestamp()) if changed else None
+        return etag, last_modified
+
+    def get(self, request, *args, **kwargs):
+        etag, last_modified = self.get_validators(request)
+        not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if not_modified is not None:
+            return self.add_validators(not_modified, etag, last_modified)
+        response = super().get(request, *args, **kwargs)
+        if response.status_code == 200:
+            self.add_validators(response, etag, last_modified)
+        return response
+
+    def add_validators(self, response, etag, last_modified):
+        response['ETag'] = etag
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(last_modified)
+        # Caches may keep the response but must revalidate it every time
+        response['Cache-Control'] = 'no-cache'
+        return response
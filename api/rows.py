@@ -0,0 +1,74 @@
+"""
+Fast read path for listings.
+
+Read-only listings do not need the serializer field machinery: a view
+with `read_fields` builds its rows straight from queryset.values(), with
+related names such as the program's category name joined into the same
+query. `read_fields` pairs each output key with its ORM lookup, so the
+rows match what the serializer would have produced.
+
+Whole tables are sent with StreamingJsonResponse, which encodes the rows
+as one JSON array while they are read from the database, so memory stays
+flat however many rows there are.
+"""
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+
+CHUNK_SIZE = 2000
+ROWS_PER_WRITE = 500
+
+
+def lookups(fields):
+    return [lookup for _, lookup in fields]
+
+
+def rename(rows, fields):
+    """Dicts keyed by ORM lookup (values() rows) re-keyed by output name."""
+    for row in rows:
+        yield {name: row[lookup] for name, lookup in fields}
+
+
+def value_rows(queryset, fields, chunk_size=CHUNK_SIZE):
+    """Every row of `queryset` as a dict of `fields`, read in chunks with one query."""
+    names = [name for name, _ in fields]
+    for values in queryset.values_list(*lookups(fields)).iterator(chunk_size=chunk_size):
+        yield dict(zip(names, values))
+
+
+def json_array_chunks(rows, encoder=DjangoJSONEncoder):
+    """Encode `rows` as a JSON array, a few hundred rows per chunk."""
+    encode = encoder(separators=(",", ":")).encode
+    yield b"["
+    batch = []
+    first = True
+    for row in rows:
+        batch.append(encode(row))
+        if len(batch) == ROWS_PER_WRITE:
+            yield (("" if first else ",") + ",".join(batch)).encode()
+            batch, first = [], False
+    if batch:
+        yield (("" if first else ",") + ",".join(batch)).encode()
+    yield b"]"
+
+
+class StreamingJsonResponse(StreamingHttpResponse):
+    def __init__(self, rows, **kwargs):
+        kwargs.setdefault("content_type", "application/json")
+        super().__init__(json_array_chunks(rows), **kwargs)
+
+
+class ValuesListMixin:
+    """
+    list() from queryset.values() instead of the serializer. Paginated
+    views get the usual page envelope; unpaginated views stream the
+    whole queryset as a JSON array.
+    """
+    read_fields = ()
+
+    def list(self, request, *args, **kwargs):
+        fields = self.read_fields
+        queryset = self.filter_queryset(self.get_queryset())
+        if self.paginator is None:
+            return StreamingJsonResponse(value_rows(queryset, fields))
+        page = self.paginate_queryset(queryset.values(*lookups(fields)))
+        return self.get_paginated_response(list(rename(page, fields)))
@@ -1,6 +1,9 @@
 from rest_framework import serializers
 from Chat.models import ProgramCategory, Program, Admission, Exam, LearningSupportCenter, RegionalCenter, Faq, NewsUpdate, Feedback
 
+# Bookkeeping of `manage.py sync_upstream`, not part of the API
+UPSTREAM_FIELDS = ('source_id', 'source_order', 'source_data')
+
 
 class ProgramCategorySerializer(serializers.ModelSerializer):
     class Meta:
@@ -27,17 +30,17 @@ class ExamSerializer(serializers.ModelSerializer):
 class LearningSupportCenterSerializer(serializers.ModelSerializer):
     class Meta:
         model = LearningSupportCenter
-        fields = '__all__'
+        exclude = UPSTREAM_FIELDS
 
 class RegionalCenterSerializer(serializers.ModelSerializer):
     class Meta:
         model = RegionalCenter
-        fields = '__all__'
+        exclude = UPSTREAM_FIELDS
 
 class FaqSerializer(serializers.ModelSerializer):
     class Meta:
         model = Faq
-        fields = '__all__'
+        exclude = UPSTREAM_FIELDS
 
 class NewsUpdateSerializer(serializers.ModelSerializer):
     class Meta:
@@ -1,3 +1,253 @@
-from django.test import TestCase
+import json
 
-# Create your tests here.
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from Chat import model_versions
+from Chat.models import (
+    Admission, Exam, Faq, Feedback, LearningSupportCenter, ModelVersion, NewsUpdate, Program, ProgramCategory,
+    RegionalCenter,
+)
+from Chat.sync import sync
+
+
+class ApiTestCase(TestCase):
+    def setUp(self):
+        self.category = ProgramCategory.objects.create(name="UG", duration=36)
+        self.programs = [
+            Program.objects.create(name=name, category=self.category, duration=36, mode="ODL",
+                                   description="", fee_structure="", eligibility="")
+            for name in ("BA English", "BA History", "B.Com", "BA Malayalam", "BBA")
+        ]
+
+
+class PaginationTests(ApiTestCase):
+    def test_lists_are_paged_by_cursor(self):
+        names = []
+        url = "/api/programs/?page_size=2"
+        while url:
+            page = self.client.get(url).json()
+            self.assertLessEqual(len(page["results"]), 2)
+            names += [program["name"] for program in page["results"]]
+            url = page["next"]
+        self.assertEqual(names, sorted(program.name for program in self.programs))
+
+    def test_repeated_names_across_page_boundaries(self):
+        for n in range(4):
+            category = ProgramCategory.objects.create(name=f"PG {n}", duration=24)
+            Program.objects.create(name="BA English", category=category, duration=24, mode="ODL",
+                                   description="", fee_structure="", eligibility="")
+        expected = list(Program.objects.order_by("name", "id").values_list("id", flat=True))
+
+        pages, url = [], "/api/programs/?page_size=2"
+        with CaptureQueriesContext(connection) as queries:
+            while url:
+                page = self.client.get(url).json()
+                pages.append(page)
+                url = page["next"]
+        self.assertEqual([program["id"] for page in pages for program in page["results"]], expected)
+        self.assertFalse([query for query in queries if "OFFSET" in query["sql"].upper()])
+
+        previous = self.client.get(pages[-1]["previous"]).json()
+        self.assertEqual(previous["results"], pages[-2]["results"])
+        self.assertEqual(self.client.get("/api/programs/?cursor=bogus").status_code, 404)
+
+    def test_every_list_endpoint_is_paginated(self):
+        for path in ("program-categories", "admissions", "exams", "learning-centers", "regional-centers",
+                     "faqs", "news", "feedback"):
+            self.assertIn("results", self.client.get(f"/api/{path}/").json(), path)
+
+    def test_upstream_bookkeeping_is_not_serialized(self):
+        sync({"qna": [{"id": 7, "question": "What is SGOU?", "answer": "An open university."}]})
+        faq = self.client.get("/api/faqs/").json()["results"][0]
+        self.assertEqual(faq["question"], "What is SGOU?")
+        self.assertFalse({"source_id", "source_order", "source_data"} & set(faq))
+
+
+class ConditionalGetTests(ApiTestCase):
+    def test_unchanged_list_is_not_modified(self):
+        first = self.client.get("/api/programs/")
+        self.assertEqual(first.status_code, 200)
+        with self.assertNumQueries(1):
+            again = self.client.get("/api/programs/", HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(again.status_code, 304)
+        self.assertEqual(again["ETag"], first["ETag"])
+        self.assertEqual(self.client.get("/api/programs/", HTTP_IF_MODIFIED_SINCE=first["Last-Modified"]).status_code, 304)
+
+    def test_save_and_delete_change_the_etag(self):
+        etag = self.client.get("/api/programs/")["ETag"]
+        self.programs[0].name = "BA English Literature"
+        self.programs[0].save()
+        changed = self.client.get("/api/programs/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(changed.status_code, 200)
+
+        self.programs[1].delete()
+        self.assertEqual(self.client.get("/api/programs/", HTTP_IF_NONE_MATCH=changed["ETag"]).status_code, 200)
+
+    def test_category_changes_invalidate_programs(self):
+        etag = self.client.get("/api/programs/")["ETag"]
+        self.category.name = "Undergraduate"
+        self.category.save()
+        self.assertEqual(self.client.get("/api/programs/", HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_etag_depends_on_the_page(self):
+        self.assertNotEqual(self.client.get("/api/programs/")["ETag"], self.client.get("/api/programs/?page_size=1")["ETag"])
+
+    def test_program_detail(self):
+        program = self.programs[2]
+        response = self.client.get(f"/api/programs/{program.pk}/")
+        self.assertEqual(response.json()["name"], "B.Com")
+        self.assertEqual(response.json()["category_name"], "UG")
+        revalidated = self.client.get(f"/api/programs/{program.pk}/", HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(revalidated.status_code, 304)
+        self.assertEqual(self.client.get("/api/programs/999999/").status_code, 404)
+
+
+class ModelVersionTests(TestCase):
+    def test_sync_bumps_each_changed_model_once(self):
+        programmes = [{"id": i, "pgm_name": f"Programme {i}", "pgm_category": "UG", "pgm_year": "3"} for i in range(50)]
+        sync({"programmes": programmes, "centers": [], "lsc": [], "qna": []})
+        versions = dict(ModelVersion.objects.values_list("label", "version"))
+        self.assertEqual(versions, {"Chat.program": 1, "Chat.programcategory": 1})
+
+        sync({"programmes": programmes, "centers": [], "lsc": [], "qna": []})
+        self.assertEqual(model_versions.versions(Program)[0][0], 1)
+
+
+class BulkCreateTests(TestCase):
+    def post(self, path, data):
+        return self.client.post(path, json.dumps(data), content_type="application/json")
+
+    def faqs(self, count, answer="Answer"):
+        return [{"question": f"Question {i}?", "answer": f"{answer} {i}"} for i in range(count)]
+
+    def test_array_is_created_in_one_transaction(self):
+        response = self.post("/api/faqs/", self.faqs(3))
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json(), {"created": 3, "updated": 0})
+        self.assertEqual(Faq.objects.count(), 3)
+        self.assertEqual(model_versions.versions(Faq)[0][0], 1)
+
+    def test_natural_key_upserts(self):
+        self.post("/api/faqs/", self.faqs(3))
+        items = [{"question": "Question 1?", "answer": "Changed"}, {"question": "New?", "answer": "New"},
+                 {"question": "New?", "answer": "Newest"}]
+        self.assertEqual(self.post("/api/faqs/", items).json(), {"created": 1, "updated": 1})
+        self.assertEqual(Faq.objects.count(), 4)
+        self.assertEqual(Faq.objects.get(question="Question 1?").answer, "Changed")
+        self.assertEqual(Faq.objects.get(question="New?").answer, "Newest")
+
+    def test_foreign_keys_in_the_natural_key(self):
+        ug = ProgramCategory.objects.create(name="UG", duration=36)
+        pg = ProgramCategory.objects.create(name="PG", duration=24)
+        program = {"name": "BA English", "duration": 36, "mode": "ODL", "description": "Three years", "fee_structure": "Rs 5000",
+                   "eligibility": "Plus two"}
+        self.post("/api/programs/", [dict(program, category=ug.pk), dict(program, category=pg.pk)])
+        response = self.post("/api/programs/", [dict(program, category=ug.pk, mode="Online")])
+        self.assertEqual(response.json(), {"created": 0, "updated": 1})
+        self.assertEqual(sorted(Program.objects.values_list("category__name", "mode")), [("PG", "ODL"), ("UG", "Online")])
+
+    def test_admission_windows_of_one_program_are_kept_apart(self):
+        category = ProgramCategory.objects.create(name="UG", duration=36)
+        program = Program.objects.create(name="BA English", category=category, duration=36, mode="ODL",
+                                         description="", fee_structure="", eligibility="")
+        windows = [
+            {"program": program.pk, "application_start_date": start, "application_end_date": end,
+             "application_procedure": "Apply online"}
+            for start, end in (("2026-01-05", "2026-02-05"), ("2026-07-01", "2026-08-01"))
+        ]
+        self.assertEqual(self.post("/api/admissions/", windows).json(), {"created": 2, "updated": 0})
+        response = self.post("/api/admissions/", [dict(windows[1], application_end_date="2026-08-15")])
+        self.assertEqual(response.json(), {"created": 0, "updated": 1})
+        self.assertEqual(sorted(str(end) for end in Admission.objects.values_list("application_end_date", flat=True)),
+                         ["2026-02-05", "2026-08-15"])
+
+    def test_mirrored_rows_are_not_upserted(self):
+        mirrored = Faq.objects.create(question="Question 1?", answer="From SGOU", source_id="7",
+                                      source_data={"question": "Question 1?", "answer": "From SGOU"})
+        self.assertEqual(self.post("/api/faqs/", self.faqs(2)).json(), {"created": 2, "updated": 0})
+        mirrored.refresh_from_db()
+        self.assertEqual(mirrored.answer, "From SGOU")
+        self.assertEqual(self.post("/api/faqs/", self.faqs(2, "Changed")).json(), {"created": 0, "updated": 2})
+
+    def test_one_invalid_item_rejects_the_request(self):
+        response = self.post("/api/faqs/", self.faqs(2) + [{"question": "No answer?"}])
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("answer", response.json()["2"])
+        self.assertFalse(Faq.objects.exists())
+
+    @override_settings(API_BULK_BATCH_SIZE=2)
+    def test_batch_size(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.post("/api/faqs/", self.faqs(5))
+        inserts = [q for q in queries if q["sql"].startswith('INSERT INTO "Chat_faq"')]
+        self.assertEqual(len(inserts), 3)
+
+    @override_settings(API_BULK_MAX_ITEMS=2)
+    def test_size_limit(self):
+        self.assertEqual(self.post("/api/faqs/", self.faqs(3)).status_code, 400)
+
+    def test_single_objects_still_work(self):
+        response = self.post("/api/faqs/", {"question": "One?", "answer": "One"})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()["question"], "One?")
+
+
+class ReadPathTests(ApiTestCase):
+    def test_page_rows_match_the_serializer(self):
+        from api.serializers import ProgramSerializer
+        with self.assertNumQueries(2):  # model versions, then the page itself
+            page = self.client.get("/api/programs/?page_size=3").json()
+        expected = ProgramSerializer(Program.objects.order_by("name", "id")[:3], many=True).data
+        self.assertEqual(page["results"], [dict(row) for row in expected])
+        self.assertEqual(len(self.client.get(page["next"]).json()["results"]), 2)
+
+    def test_every_list_endpoint_matches_its_serializer(self):
+        from api import views
+        center = RegionalCenter.objects.create(name="Kollam", address="Kollam", contact_number="0474")
+        LearningSupportCenter.objects.create(name="SN College", address="Kollam", contact_number="0474",
+                                             regional_center=center, source_id="3", source_data={"name": "SN College"})
+        Admission.objects.create(program=self.programs[0], application_start_date="2026-07-01",
+                                 application_end_date="2026-08-01", application_procedure="Apply online")
+        Exam.objects.create(exam_name="Term end", date="2026-12-01", details="Hall tickets online")
+        Faq.objects.create(question="Fees?", answer="See the prospectus")
+        NewsUpdate.objects.create(title="Admissions open", content="Apply now", date="2026-07-01")
+        Feedback.objects.create(name="Asha", email="asha@example.com", message="Helpful")
+        for path, view in (
+            ("/api/admissions/", views.AdmissionList), ("/api/exams/", views.ExamList),
+            ("/api/learning-centers/", views.LearningSupportCenterList),
+            ("/api/regional-centers/", views.RegionalCenterList), ("/api/faqs/", views.FaqList),
+            ("/api/news/", views.NewsUpdateList), ("/api/feedback/", views.FeedbackList),
+        ):
+            with self.subTest(path=path):
+                expected = view.serializer_class(view.queryset.model.objects.order_by("id"), many=True).data
+                self.assertEqual(self.client.get(path).json()["results"], json.loads(json.dumps(expected)))
+
+    def test_existing_route_names_are_kept(self):
+        from django.urls import reverse
+        self.assertEqual(reverse("program-list"), "/api/program-categories/")
+        self.assertEqual(reverse("programs"), "/api/programs/")
+
+    def test_export_streams_every_program(self):
+        response = self.client.get("/api/programs/export/")
+        self.assertTrue(response.streaming)
+        rows = json.loads(b"".join(response.streaming_content))
+        self.assertEqual([row["name"] for row in rows], [program.name for program in self.programs])
+        self.assertEqual(rows[0]["category_name"], "UG")
+        self.assertEqual(self.client.get("/api/programs/export/", HTTP_IF_NONE_MATCH=response["ETag"]).status_code, 304)
+
+    def test_program_query_reads_in_one_query(self):
+        from django.test import RequestFactory
+        from Chatbot.api.views import program_query
+        response = program_query(RequestFactory().get("/programs/"))
+        with self.assertNumQueries(1):
+            rows = json.loads(b"".join(response.streaming_content))
+        self.assertEqual(rows[0], {"name": "B.Com", "category": "UG", "duration": 36, "description": ""})
+        self.assertEqual(len(rows), 5)
+
+    def test_json_array_chunks(self):
+        from api.rows import json_array_chunks
+        for count in (0, 1, 500, 1001):
+            rows = [{"n": i} for i in range(count)]
+            self.assertEqual(json.loads(b"".join(json_array_chunks(iter(rows)))), rows)
@@ -3,7 +3,9 @@ from .views import *
 
 urlpatterns = [
     path('program-categories/', ProgramCategoryList.as_view(), name='program-list'),
-    path('programs/<int:pk>/', ProgramList.as_view(), name='program-detail'),
+    path('programs/', ProgramList.as_view(), name='programs'),
+    path('programs/export/', ProgramExport.as_view(), name='program-export'),
+    path('programs/<int:pk>/', ProgramDetail.as_view(), name='program-detail'),
     path('admissions/', AdmissionList.as_view(), name='admission-list'),
     path('exams/', ExamList.as_view(), name='exam-list'),
     path('learning-centers/', LearningSupportCenterList.as_view(), name='learning-center-list'),
@@ -1,6 +1,10 @@
 from django.shortcuts import render
 from rest_framework import generics
 from Chat.models import ProgramCategory, Program, Admission, Exam, LearningSupportCenter, RegionalCenter, Faq, NewsUpdate, Feedback
+from .bulk import BulkCreateMixin
+from .caching import ConditionalGetMixin
+from .pagination import KeysetPagination
+from .rows import ValuesListMixin
 from .serializers import (
     ProgramCategorySerializer, ProgramSerializer, AdmissionSerializer, 
     ExamSerializer, LearningSupportCenterSerializer, RegionalCenterSerializer, 
@@ -9,39 +13,86 @@ from .serializers import (
 
 # Create your views here.
 
-class ProgramCategoryList(generics.ListCreateAPIView):
+class CachedListCreateAPIView(BulkCreateMixin, ConditionalGetMixin, generics.ListCreateAPIView):
+    """ListCreateAPIView with bulk upserts, keyset pagination and ETag/Last-Modified revalidation."""
+    pagination_class = KeysetPagination
+
+class ProgramCategoryList(CachedListCreateAPIView):
     queryset = ProgramCategory.objects.all()
     serializer_class = ProgramCategorySerializer
+    ordering = ('name', 'id')
+    natural_key = ('name',)
+
+PROGRAM_READ_FIELDS = (
+    ('id', 'id'), ('name', 'name'), ('category', 'category_id'), ('category_name', 'category__name'),
+    ('duration', 'duration'), ('mode', 'mode'), ('description', 'description'),
+    ('fee_structure', 'fee_structure'), ('eligibility', 'eligibility'),
+)
 
-class ProgramList(generics.ListCreateAPIView):
-    queryset = Program.objects.select_related('category').all().order_by('name')
+class ProgramList(ValuesListMixin, CachedListCreateAPIView):
+    queryset = Program.objects.select_related('category').all()
     serializer_class = ProgramSerializer
+    read_fields = PROGRAM_READ_FIELDS
+    ordering = ('name', 'id')
+    cache_models = (Program, ProgramCategory)
+    natural_key = ('name', 'category')
+
+class ProgramExport(ValuesListMixin, ConditionalGetMixin, generics.ListAPIView):
+    """Every program as one streamed JSON array, in id order."""
+    queryset = Program.objects.order_by('id')
+    serializer_class = ProgramSerializer
+    read_fields = PROGRAM_READ_FIELDS
     pagination_class = None
+    cache_models = (Program, ProgramCategory)
+
+class ProgramDetail(ConditionalGetMixin, generics.RetrieveUpdateDestroyAPIView):
+    queryset = Program.objects.select_related('category').all()
+    serializer_class = ProgramSerializer
+    cache_models = (Program, ProgramCategory)
 
-class AdmissionList(generics.ListCreateAPIView):
+class AdmissionList(ValuesListMixin, CachedListCreateAPIView):
     queryset = Admission.objects.all()
-    serializer_class = AdmissionSerializer  
+    serializer_class = AdmissionSerializer
+    read_fields = (
+        ('id', 'id'), ('program', 'program_id'), ('application_start_date', 'application_start_date'),
+        ('application_end_date', 'application_end_date'), ('application_procedure', 'application_procedure'),
+    )
+    natural_key = ('program', 'application_start_date')  # a program can have several admission windows
 
-class ExamList(generics.ListCreateAPIView):
+class ExamList(ValuesListMixin, CachedListCreateAPIView):
     queryset = Exam.objects.all()
     serializer_class = ExamSerializer
+    read_fields = (('id', 'id'), ('exam_name', 'exam_name'), ('date', 'date'), ('details', 'details'))
+    natural_key = ('exam_name', 'date')
 
-class LearningSupportCenterList(generics.ListCreateAPIView):
+class LearningSupportCenterList(ValuesListMixin, CachedListCreateAPIView):
     queryset = LearningSupportCenter.objects.all()
     serializer_class = LearningSupportCenterSerializer
+    read_fields = (
+        ('id', 'id'), ('name', 'name'), ('address', 'address'), ('contact_number', 'contact_number'),
+        ('regional_center', 'regional_center_id'),
+    )
+    natural_key = ('name', 'address')
 
-class RegionalCenterList(generics.ListCreateAPIView):
+class RegionalCenterList(ValuesListMixin, CachedListCreateAPIView):
     queryset = RegionalCenter.objects.all()
     serializer_class = RegionalCenterSerializer
+    read_fields = (('id', 'id'), ('name', 'name'), ('address', 'address'), ('contact_number', 'contact_number'))
+    natural_key = ('name',)  # one row per center; a changed address or number updates it
 
-class FaqList(generics.ListCreateAPIView):
+class FaqList(ValuesListMixin, CachedListCreateAPIView):
     queryset = Faq.objects.all()
     serializer_class = FaqSerializer
+    read_fields = (('id', 'id'), ('question', 'question'), ('answer', 'answer'))
+    natural_key = ('question',)  # the chatbot serves one answer per question
 
-class NewsUpdateList(generics.ListCreateAPIView):
+class NewsUpdateList(ValuesListMixin, CachedListCreateAPIView):
     queryset = NewsUpdate.objects.all()
     serializer_class = NewsUpdateSerializer
+    read_fields = (('id', 'id'), ('title', 'title'), ('content', 'content'), ('date', 'date'))
+    natural_key = ('title', 'date')
 
-class FeedbackList(generics.ListCreateAPIView):
+class FeedbackList(ValuesListMixin, CachedListCreateAPIView):
     queryset = Feedback.objects.all()
-    serializer_class = FeedbackSerializer
\ No newline at end of file
+    serializer_class = FeedbackSerializer
+    read_fields = (('id', 'id'), ('name', 'name'), ('email', 'email'), ('message', 'message'))
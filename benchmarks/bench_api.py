@@ -0,0 +1,72 @@
+"""
+Read endpoints of the api app: a full program list, the first and a deep
+keyset page, and a conditional revalidation of an unchanged list.
+
+    python benchmarks/bench_api.py [--programmes 5000] [--rounds 50]
+
+Runs against a throwaway on-disk SQLite test database filled through
+`sync` with sample_programmes().
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+from unittest import mock
+
+from stubs import sample_programmes, setup_django
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--programmes", type=int, default=5000)
+    parser.add_argument("--rounds", type=int, default=50)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.db import connection
+    from django.test import Client
+    from django.test.utils import setup_test_environment
+    from Chat.sync import sync
+    from api.views import ProgramList
+
+    setup_test_environment()
+    workdir = tempfile.mkdtemp()
+    connection.settings_dict["TEST"]["NAME"] = os.path.join(workdir, "bench_api.sqlite3")
+    connection.creation.create_test_db(verbosity=0)
+    sync({"programmes": sample_programmes(args.programmes), "centers": [], "lsc": [], "qna": []})
+
+    client = Client()
+
+    def timed(path, **headers):
+        timings = []
+        for _ in range(args.rounds):
+            start = time.perf_counter()
+            response = client.get(path, **headers)
+            timings.append(time.perf_counter() - start)
+        return statistics.median(timings), response
+
+    first = client.get("/api/programs/")
+    deep = "/api/programs/?page_size=100"
+    for _ in range(args.programmes // 200):
+        deep = client.get(deep).json()["next"]
+
+    print(f"{args.programmes} programmes, median of {args.rounds} requests")
+    with mock.patch.object(ProgramList, "pagination_class", None):
+        seconds, response = timed("/api/programs/")
+    print(f"  {'unpaginated':<28} {seconds * 1000:8.2f} ms   {response.status_code}   {len(response.content):9d} bytes")
+
+    cases = [
+        ("largest page (1000)", "/api/programs/?page_size=1000", {}),
+        ("first page (100)", "/api/programs/", {}),
+        ("middle page (100)", deep, {}),
+        ("revalidate, unchanged", "/api/programs/", {"HTTP_IF_NONE_MATCH": first["ETag"]}),
+    ]
+    for label, path, headers in cases:
+        seconds, response = timed(path, **headers)
+        print(f"  {label:<28} {seconds * 1000:8.2f} ms   {response.status_code}   {len(response.content):9d} bytes")
+    connection.creation.destroy_test_db(connection.settings_dict["TEST"]["NAME"], verbosity=0)
+
+
+if __name__ == "__main__":
+    main()
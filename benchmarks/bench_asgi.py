@@ -0,0 +1,191 @@
+"""
+The chat endpoint under WSGI against ASGI, with every upstream a local
+stub. WSGI is process_query on a fixed pool of --threads worker threads,
+as gunicorn --threads runs it; ASGI is process_query_async under uvicorn.
+
+    python benchmarks/bench_asgi.py [--clients 64] [--requests 640] [--threads 8]
+
+Two measurements:
+
+  cold start  one "lsc under ernakulam" right after the server starts.
+              process_query fetches the QnA, centers and LSC feeds one
+              after another; the async endpoint fetches them all at once.
+  load        --clients concurrent clients sending --requests requests,
+              alternating the Groq fallback ("hey", answered by the stub in
+              --llm-delay seconds) with answers from the warm feeds.
+
+Every server runs in its own process (this script with --serve), with the
+completion cache off so every fallback reaches the Groq stub. Clients
+close the connection after each request, so keep-alive connections do
+not pin WSGI threads.
+"""
+import argparse
+import asyncio
+import itertools
+import os
+import socket
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from stubs import FakeCompletion, StubServer, sample_programmes, setup_django
+
+SAMPLE_QNA = [
+    {"question": f"What is the admission process for programme {i}?", "answer": f"Apply online for programme {i}."}
+    for i in range(200)
+]
+SAMPLE_CENTERS = [{"id": 1, "rcname": "REGIONAL CENTRE - ERNAKULAM", "rcaddress": "Kalamassery", "headname": "Dr. A"}]
+SAMPLE_LSCS = [{"lscname": f"College {i}", "lscrc": "1", "coordinatorname": f"C{i}"} for i in range(40)]
+LOAD_QUERIES = ["hey", "how many programs", "hey", "list pg programs"]
+
+
+def serve(kind, port, threads):
+    setup_django()
+    from django.conf import settings
+
+    settings.DEBUG = False
+    settings.ALLOWED_HOSTS = ["127.0.0.1"]
+    settings.CHAT_REQUEST_LOG = False
+    settings.CHAT_COMPLETION_CACHE_ENABLED = False
+
+    if kind == "asgi":
+        import uvicorn
+        from django.core.asgi import get_asgi_application
+        uvicorn.run(get_asgi_application(), host="127.0.0.1", port=port, log_level="warning", lifespan="off")
+        return
+
+    from django.core.servers.basehttp import WSGIRequestHandler, WSGIServer
+    from django.core.wsgi import get_wsgi_application
+
+    class PooledWSGIServer(WSGIServer):
+        """Django's development server, handling requests on a fixed thread pool."""
+        pool = ThreadPoolExecutor(threads)
+        request_queue_size = 1024
+
+        def process_request(self, request, client_address):
+            self.pool.submit(self._handle, request, client_address)
+
+        def _handle(self, request, client_address):
+            try:
+                self.finish_request(request, client_address)
+            except Exception:
+                self.handle_error(request, client_address)
+            finally:
+                self.shutdown_request(request)
+
+    class QuietHandler(WSGIRequestHandler):
+        def log_message(self, *args):
+            pass
+
+    server = PooledWSGIServer(("127.0.0.1", port), QuietHandler)
+    server.set_app(get_wsgi_application())
+    server.serve_forever()
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(kind, threads, env):
+    port = free_port()
+    process = subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__), "--serve", kind, "--port", str(port), "--threads", str(threads)],
+        env={**os.environ, **env},
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.1).close()
+            return process, f"http://127.0.0.1:{port}"
+        except OSError:
+            time.sleep(0.05)
+    process.kill()
+    raise RuntimeError(f"The {kind} server did not start")
+
+
+async def load(url, clients, total):
+    import httpx
+
+    queries = itertools.cycle(LOAD_QUERIES)
+    remaining = iter(range(total))
+    latencies, errors = [], 0
+
+    async def client(http):
+        nonlocal errors
+        for _ in remaining:
+            start = time.perf_counter()
+            try:
+                response = await http.post(url, json={"query": next(queries)}, headers={"Connection": "close"})
+                response.raise_for_status()
+            except httpx.HTTPError:
+                errors += 1
+            latencies.append(time.perf_counter() - start)
+
+    async with httpx.AsyncClient(timeout=120, limits=httpx.Limits(max_connections=clients)) as http:
+        start = time.perf_counter()
+        await asyncio.gather(*(client(http) for _ in range(clients)))
+        elapsed = time.perf_counter() - start
+    return elapsed, sorted(latencies), errors
+
+
+def percentile(values, fraction):
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--clients", type=int, default=64)
+    parser.add_argument("--requests", type=int, default=640)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--upstream-delay", type=float, default=0.3)
+    parser.add_argument("--llm-delay", type=float, default=0.5)
+    parser.add_argument("--serve", choices=("wsgi", "asgi"))
+    parser.add_argument("--port", type=int)
+    args = parser.parse_args()
+    if args.serve:
+        serve(args.serve, args.port, args.threads)
+        return
+
+    import httpx
+
+    feeds = StubServer({
+        "/api/programmes": {"programme": sample_programmes(2000)},
+        "/api/qna": {"question": SAMPLE_QNA},
+        "/api/centers": {"rc": SAMPLE_CENTERS},
+        "/api/lsc": {"lsc": SAMPLE_LSCS},
+    }, delay=args.upstream_delay)
+    groq = StubServer({"/chat/completions": FakeCompletion(["Hello", " from", " SGOU"], args.llm_delay / 3)})
+    with feeds, groq:
+        env = {
+            "UNIVERSITY_API_URL": f"{feeds.url}/api/programmes",
+            "QNA_API_URL": f"{feeds.url}/api/qna",
+            "CENTERS_API_URL": f"{feeds.url}/api/centers",
+            "LSC_API_URL": f"{feeds.url}/api/lsc",
+            "GROQ_API_URL": f"{groq.url}/chat/completions",
+        }
+        print(f"Upstream feeds answer in {args.upstream_delay * 1000:.0f} ms, Groq in {args.llm_delay * 1000:.0f} ms;"
+              f" WSGI on {args.threads} threads")
+        for kind, path in (("wsgi", "/process_query"), ("asgi", "/process_query_async")):
+            process, base = start_server(kind, args.threads, env)
+            try:
+                url = base + path
+                start = time.perf_counter()
+                httpx.post(url, json={"query": "lsc under ernakulam"}, timeout=60).raise_for_status()
+                cold = time.perf_counter() - start
+                httpx.post(url, json={"query": "how many programs"}, timeout=60).raise_for_status()
+
+                elapsed, latencies, errors = asyncio.run(load(url, args.clients, args.requests))
+                print(f"  {kind:<5} cold start {cold * 1000:7.0f} ms   {args.requests / elapsed:7.1f} req/s"
+                      f"   p50 {percentile(latencies, 0.5) * 1000:7.0f} ms"
+                      f"   p99 {percentile(latencies, 0.99) * 1000:7.0f} ms   {errors} errors"
+                      f"   ({args.clients} clients)")
+            finally:
+                process.terminate()
+                process.wait()
+
+
+if __name__ == "__main__":
+    main()
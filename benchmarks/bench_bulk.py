@@ -0,0 +1,64 @@
+"""
+Loading FAQs through the api app: one POST per row against a single bulk
+POST of the same rows, and a bulk re-POST that upserts every row.
+
+    python benchmarks/bench_bulk.py [--rows 10000] [--single 500]
+
+The per-row case posts only --single rows and is scaled up to --rows.
+Runs against a throwaway on-disk SQLite test database.
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+from stubs import setup_django
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--single", type=int, default=500)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.db import connection
+    from django.test import Client
+    from django.test.utils import setup_test_environment
+    from Chat.models import Faq
+
+    setup_test_environment()
+    workdir = tempfile.mkdtemp()
+    connection.settings_dict["TEST"]["NAME"] = os.path.join(workdir, "bench_bulk.sqlite3")
+    connection.creation.create_test_db(verbosity=0)
+    client = Client()
+
+    def rows(prefix, count, answer="Answer"):
+        return [{"question": f"{prefix} question {i}?", "answer": f"{answer} {i}"} for i in range(count)]
+
+    def post(data):
+        return client.post("/api/faqs/", json.dumps(data), content_type="application/json")
+
+    start = time.perf_counter()
+    for row in rows("Single", args.single):
+        post(row)
+    per_row = (time.perf_counter() - start) / args.single
+
+    start = time.perf_counter()
+    created = post(rows("Bulk", args.rows)).json()
+    bulk = time.perf_counter() - start
+
+    start = time.perf_counter()
+    upserted = post(rows("Bulk", args.rows, answer="Changed")).json()
+    upsert = time.perf_counter() - start
+
+    print(f"{args.rows} FAQ rows, {Faq.objects.count()} in the table afterwards")
+    print(f"  {'one POST per row':<24} {per_row * args.rows:8.2f} s   ({per_row * 1000:.2f} ms/row over {args.single} rows)")
+    print(f"  {'bulk POST':<24} {bulk:8.2f} s   {created}")
+    print(f"  {'bulk upsert re-POST':<24} {upsert:8.2f} s   {upserted}")
+    connection.creation.destroy_test_db(connection.settings_dict["TEST"]["NAME"], verbosity=0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+First chat answer after a restart, with and without the persisted feed
+snapshots, and while the upstream is down.
+
+    python benchmarks/bench_cold_start.py [--programmes 50000] [--delay 1.5]
+
+A restart is simulated by dropping every in-memory snapshot and the
+response cache. "cold" is how a process started before: the first
+request fetches the programme feed from a stub upstream that answers in
+--delay seconds. "restored" runs restore_snapshots(), as Chat's
+AppConfig.ready() does, before the first request. For the outage the
+upstream URL points at a closed port and the TTL is zero, so the
+restored data is past it and the answer is marked stale.
+"""
+import argparse
+import json
+import socket
+import tempfile
+import time
+from unittest import mock
+
+from stubs import StubServer, sample_programmes, setup_django
+
+
+def closed_port_url():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        host, port = sock.getsockname()
+    return f"http://{host}:{port}/api/programmes"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--programmes", type=int, default=50000)
+    parser.add_argument("--delay", type=float, default=1.5)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.conf import settings
+    from django.test import Client
+    from django.test.utils import setup_test_environment
+    from Chat import feeds
+    from Chat.response_cache import response_cache
+    from Chat.tracing import STALE_HEADER
+
+    setup_test_environment()
+    settings.CHAT_SNAPSHOT_PERSIST_DIR = tempfile.mkdtemp()
+    settings.CHAT_REQUEST_LOG = False
+    client = Client()
+
+    def restart():
+        for snapshot in feeds.SNAPSHOTS:
+            snapshot.invalidate()
+        response_cache.clear()
+
+    def first_answer(startup=None):
+        restart()
+        start = time.perf_counter()
+        if startup:
+            startup()
+        started = time.perf_counter()
+        response = client.post("/process_query", json.dumps({"query": "how many programs"}),
+                               content_type="application/json")
+        answered = time.perf_counter()
+        return started - start, answered - started, response
+
+    def report(label, startup_seconds, request_seconds, response):
+        stale = response.get(STALE_HEADER, "-")
+        print(f"  {label:<22} startup {startup_seconds * 1000:8.1f} ms   first answer {request_seconds * 1000:8.1f} ms"
+              f"   {response.json()['message'][:40]!r}  stale: {stale}")
+
+    routes = {"/api/programmes": {"programme": sample_programmes(args.programmes)}}
+    with StubServer(routes, delay=args.delay) as server:
+        print(f"{args.programmes} programmes, upstream answering in {args.delay * 1000:.0f} ms")
+        with mock.patch.object(feeds, "UNIVERSITY_API_URL", f"{server.url}/api/programmes"):
+            report("cold", *first_answer())  # also persists the snapshot for the cases below
+            report("restored", *first_answer(feeds.restore_snapshots))
+
+        with mock.patch.object(feeds, "UNIVERSITY_API_URL", closed_port_url()), \
+                mock.patch.object(settings, "CHAT_PROGRAMME_SNAPSHOT_TTL", 0, create=True):
+            with mock.patch.object(settings, "CHAT_SNAPSHOT_PERSIST_DIR", None):
+                report("outage, no snapshot", *first_answer())
+            report("outage, restored", *first_answer(feeds.restore_snapshots))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Many simultaneous chat conversations: throughput, latency and database
+writes for list -> numeric follow-up -> fee prompt -> fee answer.
+
+    python benchmarks/bench_conversations.py [--users 64] [--rounds 10] [--threads 32]
+
+Every simulated user has its own cookie jar. Runs against a throwaway
+on-disk SQLite test database, so any per-message writes contend the way
+they would with the real db.sqlite3.
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+from stubs import sample_programmes, setup_django
+
+CONVERSATION = ("list all programs", "2", "fees", "Programme 3 in Subject 3")
+
+
+class WriteCounter:
+    """connection.execute_wrapper counting INSERT/UPDATE/DELETE statements."""
+
+    def __init__(self):
+        self.writes = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, execute, sql, params, many, context):
+        if sql.lstrip()[:6].upper() in ("INSERT", "UPDATE", "DELETE"):
+            with self._lock:
+                self.writes += 1
+        return execute(sql, params, many, context)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=64)
+    parser.add_argument("--rounds", type=int, default=10)
+    parser.add_argument("--threads", type=int, default=32)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.db import connection, connections
+    from django.test import Client
+    from django.test.utils import setup_test_environment
+    from Chat.feeds import programme_snapshot, qna_snapshot
+
+    setup_test_environment()
+    workdir = tempfile.mkdtemp()
+    connection.settings_dict["TEST"]["NAME"] = os.path.join(workdir, "bench_conversations.sqlite3")
+    connection.creation.create_test_db(verbosity=0)
+
+    qna = [{"question": f"fee structure for {p['pgm_name']}", "answer": f"Fees for {p['pgm_name']}"}
+           for p in sample_programmes()]
+    clients = [Client() for _ in range(args.users)]
+    counter = WriteCounter()
+    latencies = []
+    errors = []
+    local = threading.local()
+
+    def converse(client):
+        if not getattr(local, "wrapped", False):
+            # execute_wrapper is per connection, and every thread has its own
+            connections["default"].execute_wrappers.append(counter)
+            local.wrapped = True
+        for _ in range(args.rounds):
+            for query in CONVERSATION:
+                start = time.perf_counter()
+                try:
+                    response = client.post("/process_query", {"query": query}, content_type="application/json")
+                    if response.status_code != 200 or "error processing" in response.content.decode():
+                        errors.append(query)
+                except Exception as e:
+                    errors.append(f"{query}: {e}")
+                latencies.append(time.perf_counter() - start)
+
+    with mock.patch.object(programme_snapshot, "loader", return_value=sample_programmes()), \
+            mock.patch.object(qna_snapshot, "loader", return_value=qna):
+        programme_snapshot.get()
+        qna_snapshot.get()
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.threads) as pool:
+            list(pool.map(converse, clients))
+        elapsed = time.perf_counter() - start
+
+    total = len(latencies)
+    latencies.sort()
+    print(f"{args.users} users x {args.rounds} rounds x {len(CONVERSATION)} messages on {args.threads} threads")
+    print(f"{total / elapsed:8.1f} messages/s   p50 {statistics.median(latencies) * 1000:7.2f} ms   "
+          f"p99 {latencies[int(total * 0.99) - 1] * 1000:7.2f} ms")
+    print(f"{counter.writes} database writes ({counter.writes / total:.2f} per message), {len(errors)} errors")
+    connection.creation.destroy_test_db(connection.settings_dict["TEST"]["NAME"], verbosity=0)
+
+
+if __name__ == "__main__":
+    main()
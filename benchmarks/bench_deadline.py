@@ -0,0 +1,82 @@
+"""
+Chat answers while every upstream is slow, with and without the request
+time budget.
+
+    python benchmarks/bench_deadline.py [--budget 8] [--feed-delay 3] [--llm-delay 6]
+
+Each query is asked with every feed cold, so process_query has to fetch
+what it needs from stub upstreams that answer in --feed-delay seconds
+(Groq in --llm-delay). "no budget" is how requests ran before: every
+call waits out its own timeout, one after another. With --budget each
+call gets only what is left of it and optional stages are skipped, so
+the answer (possibly an apology) comes back around the deadline. The
+outcome column is what chat_deadline_outcomes_total counted.
+"""
+import argparse
+import json
+import time
+from unittest import mock
+
+from stubs import FakeCompletion, StubServer, sample_programmes, setup_django
+
+SAMPLE_QNA = [{"question": f"What is the admission process for programme {i}?", "answer": f"Apply online for {i}."}
+              for i in range(200)]
+SAMPLE_CENTERS = [{"id": 1, "rcname": "REGIONAL CENTRE - ERNAKULAM", "rcaddress": "Kalamassery", "headname": "Dr. A"}]
+SAMPLE_LSCS = [{"lscname": f"College {i}", "lscrc": "1", "coordinatorname": f"C{i}"} for i in range(40)]
+QUERIES = ["hey", "how many programs", "lsc under ernakulam"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--budget", type=float, default=8)
+    parser.add_argument("--feed-delay", type=float, default=3)
+    parser.add_argument("--llm-delay", type=float, default=6)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.conf import settings
+    from django.test import Client
+    from django.test.utils import setup_test_environment
+    from Chat import feeds, metrics, views
+    from Chat.response_cache import response_cache
+
+    setup_test_environment()
+    settings.CHAT_REQUEST_LOG = False
+    settings.CHAT_COMPLETION_CACHE_ENABLED = False
+    client = Client()
+
+    def ask(query):
+        for snapshot in feeds.SNAPSHOTS:
+            snapshot.invalidate()
+        response_cache.clear()
+        metrics.registry.clear()
+        start = time.perf_counter()
+        response = client.post("/process_query", json.dumps({"query": query}), content_type="application/json")
+        elapsed = time.perf_counter() - start
+        body = response.json()
+        outcome = next((o for o in ("met", "degraded", "exceeded") if metrics.deadline_outcomes.value(outcome=o)), "-")
+        return elapsed, str(body.get("message") or body.get("answer")), outcome
+
+    feed_server = StubServer({
+        "/api/programmes": {"programme": sample_programmes(500)},
+        "/api/qna": {"question": SAMPLE_QNA},
+        "/api/centers": {"rc": SAMPLE_CENTERS},
+        "/api/lsc": {"lsc": SAMPLE_LSCS},
+    }, delay=args.feed_delay)
+    groq = StubServer({"/chat/completions": FakeCompletion(["Hello", " from", " SGOU"], args.llm_delay / 3)})
+    with feed_server, groq, \
+            mock.patch.object(feeds, "UNIVERSITY_API_URL", f"{feed_server.url}/api/programmes"), \
+            mock.patch.object(feeds, "QNA_API_URL", f"{feed_server.url}/api/qna"), \
+            mock.patch.object(feeds, "CENTERS_API_URL", f"{feed_server.url}/api/centers"), \
+            mock.patch.object(feeds, "LSC_API_URL", f"{feed_server.url}/api/lsc"), \
+            mock.patch.object(views, "GROQ_API_URL", f"{groq.url}/chat/completions"):
+        print(f"Feeds answer in {args.feed_delay * 1000:.0f} ms, Groq in {args.llm_delay * 1000:.0f} ms")
+        for label, budget in (("no budget", None), (f"{args.budget:g}s budget", args.budget)):
+            settings.CHAT_REQUEST_BUDGET = budget
+            for query in QUERIES:
+                elapsed, answer, outcome = ask(query)
+                print(f"  {label:<11} {query!r:<24} {elapsed * 1000:7.0f} ms   {outcome:<8}  {answer[:50]!r}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Time to answer the listing queries (regional centers, LSCs, programmes)
+with the response cache turned off, so every request renders its HTML.
+
+    python benchmarks/bench_fragments.py [--programmes 400] [--lscs 300] [--rounds 200]
+"""
+import argparse
+import contextlib
+import io
+import json
+import statistics
+import time
+from unittest import mock
+
+from stubs import sample_programmes, setup_django
+
+RC_NAMES = ["ERNAKULAM", "KOZHIKODE", "THIRUVANANTHAPURAM", "THALASSERY", "PATTAMBI", "KOLLAM"]
+
+QUERIES = (
+    "regional centers",
+    "list all lsc",
+    "lsc under ernakulam",
+    "list all programs",
+    "ug programs",
+)
+
+
+def sample_centers():
+    return [
+        {"id": i, "rcname": f"REGIONAL CENTRE – {name}", "rcaddress": f"{name.title()} campus, Kerala",
+         "headname": f"Dr. Director {i}", "headnumber": f"04{i}4 2000{i}", "headmail": f"rc{i}@sgou.ac.in"}
+        for i, name in enumerate(RC_NAMES, start=1)
+    ]
+
+
+def sample_lscs(count):
+    return [
+        {"lscname": f"Study Centre {i}, Govt. College", "lscaddress": f"College Road {i}, Kerala",
+         "lscnumber": f"0484 27{i:04d}", "coordinatorname": f"Coordinator {i}",
+         "coordinatormail": f"lsc{i}@sgou.ac.in", "lscrc": str(1 + i % len(RC_NAMES))}
+        for i in range(count)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--programmes", type=int, default=400)
+    parser.add_argument("--lscs", type=int, default=300)
+    parser.add_argument("--rounds", type=int, default=200)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.test import RequestFactory, override_settings
+    from Chat.feeds import centers_snapshot, lsc_snapshot, programme_snapshot, qna_snapshot
+    from Chat.views import process_query
+
+    factory = RequestFactory()
+    patches = [
+        mock.patch.object(programme_snapshot, "loader", return_value=sample_programmes(args.programmes)),
+        mock.patch.object(qna_snapshot, "loader", return_value=[]),
+        mock.patch.object(centers_snapshot, "loader", return_value=sample_centers()),
+        mock.patch.object(lsc_snapshot, "loader", return_value=sample_lscs(args.lscs)),
+        override_settings(CHAT_RESPONSE_CACHE_SIZE=0),
+    ]
+    with contextlib.ExitStack() as stack:
+        for patch in patches:
+            stack.enter_context(patch)
+        # process_query prints its progress; keep that out of the timings' output
+        stack.enter_context(contextlib.redirect_stdout(io.StringIO()))
+
+        results = []
+        for query in QUERIES:
+            body = json.dumps({"query": query})
+            timings = []
+            for _ in range(args.rounds + 1):
+                request = factory.post("/process_query", body, content_type="application/json")
+                start = time.perf_counter()
+                response = process_query(request)
+                timings.append(time.perf_counter() - start)
+            results.append((query, statistics.median(timings[1:]), len(response.content)))
+
+    print(f"{args.programmes} programmes, {len(RC_NAMES)} regional centers, {args.lscs} LSCs, "
+          f"median of {args.rounds} requests")
+    for query, seconds, size in results:
+        print(f"  {query:<22} {seconds * 1000:7.3f} ms   {size:8d} bytes")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+difflib vs TF-IDF matching: per-query latency and top-1 agreement.
+
+    python benchmarks/bench_matching.py [--queries 300] [--copies 5]
+
+Program names come from a realistic SGOU-style list; QnA questions from
+Chat/faq_data.json plus generated variants. Queries are candidates with
+typos, dropped words and reordered words. `--copies` multiplies the
+candidate lists to see how each engine scales.
+"""
+import argparse
+import json
+import os
+import random
+import time
+
+from stubs import ROOT, setup_django
+
+PROGRAMME_NAMES = [
+    "BA English Language and Literature", "BA Malayalam Language & Literature", "BA Hindi Language and Literature",
+    "BA Arabic Language and Literature", "BA Sanskrit", "BA History", "BA Economics", "BA Political Science",
+    "BA Sociology", "BA Philosophy", "BA Psychology", "BA Islamic History", "BA Tamil", "BA Urdu",
+    "B.Com Finance", "B.Com Co-operation", "B.Com Computer Applications", "BBA", "BCA", "B.Sc Mathematics",
+    "B.Sc Statistics", "B.Sc Physics", "B.Sc Data Science", "MA English Language and Literature",
+    "MA Malayalam", "MA Hindi", "MA Arabic", "MA Sanskrit", "MA History", "MA Economics",
+    "MA Political Science", "MA Sociology", "MA Philosophy", "MA Tamil", "MA Urdu", "M.Com", "MBA", "MCA",
+    "M.Sc Mathematics", "M.Sc Psychology", "Certificate in Yoga", "Certificate in Communicative English",
+    "Certificate in Data Analytics", "Certificate in Digital Marketing", "Certificate in Counselling",
+    "Diploma in Early Childhood Care", "FYUG Bachelor of Arts Honours in English", "FYUG B.Com Honours",
+]
+
+
+def perturb(text, rng):
+    words = text.split()
+    choice = rng.random()
+    if choice < 0.3 and len(words) > 2:
+        words.pop(rng.randrange(1, len(words)))
+    elif choice < 0.5 and len(words) > 1:
+        i = rng.randrange(len(words) - 1)
+        words[i], words[i + 1] = words[i + 1], words[i]
+    text = " ".join(words)
+    chars = list(text)
+    for _ in range(rng.randint(0, 2)):
+        i = rng.randrange(len(chars))
+        chars[i] = rng.choice("abcdefghijklmnopqrstuvwxyz")
+    return "".join(chars).lower()
+
+
+def timed(fn, queries):
+    start = time.perf_counter()
+    results = [fn(query) for query in queries]
+    return results, (time.perf_counter() - start) * 1000 / len(queries)
+
+
+def report(label, difflib_results, difflib_ms, tfidf_results, tfidf_ms, batch_ms):
+    answered = [(a, b) for a, b in zip(difflib_results, tfidf_results) if a is not None]
+    agreement = sum(a == b for a, b in answered) / len(answered) if answered else 0.0
+    print(f"{label}")
+    print(f"  difflib   {difflib_ms:8.3f} ms/query  hits {sum(r is not None for r in difflib_results)}")
+    print(f"  tfidf     {tfidf_ms:8.3f} ms/query  hits {sum(r is not None for r in tfidf_results)}")
+    print(f"  tfidf x N {batch_ms:8.3f} ms/query  (batch API)")
+    print(f"  top-1 agreement where difflib answered: {agreement:.1%} of {len(answered)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--queries", type=int, default=300)
+    parser.add_argument("--copies", type=int, default=5)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.test import override_settings
+    from Chat import matching
+    from Chat.feeds import FeedSnapshot
+    from Chat.qna_index import QUESTION_PATTERNS
+
+    rng = random.Random(7)
+
+    with open(os.path.join(ROOT, "Chat", "faq_data.json"), encoding="utf-8") as f:
+        faq = json.load(f)
+    qna = []
+    for copy in range(args.copies):
+        for item in faq:
+            qna.append({"question": item["question"] if copy == 0 else perturb(item["question"], rng), "answer": item["answer"]})
+        for pattern in QUESTION_PATTERNS:
+            qna.append({"question": f"{pattern} {rng.choice(PROGRAMME_NAMES)} at SGOU?", "answer": pattern})
+    snapshot = FeedSnapshot("bench-qna", lambda: qna, "BENCH_TTL", 3600)
+    programmes = [{"pgm_name": name} for _ in range(args.copies) for name in PROGRAMME_NAMES]
+
+    qna_queries = [perturb(rng.choice(qna)["question"], rng) for _ in range(args.queries)]
+    program_queries = [perturb(rng.choice(PROGRAMME_NAMES), rng) for _ in range(args.queries)]
+    print(f"{len(qna)} QnA questions, {len(programmes)} program names, {args.queries} queries each\n")
+
+    def qna_key(result):
+        return result and result[1]
+
+    def program_key(result):
+        return result and result[0]["pgm_name"]
+
+    results = {}
+    for engine in ("difflib", "tfidf"):
+        with override_settings(CHAT_MATCHING_ENGINE=engine):
+            matching.best_qna_match("warm up", snapshot)
+            matching.best_program("warm up", programmes)
+            qna_results, qna_ms = timed(lambda q: qna_key(matching.best_qna_match(q, snapshot)), qna_queries)
+            program_results, program_ms = timed(lambda q: program_key(matching.best_program(q, programmes)), program_queries)
+            start = time.perf_counter()
+            matching.best_qna_matches(qna_queries, snapshot)
+            batch_ms = (time.perf_counter() - start) * 1000 / len(qna_queries)
+            results[engine] = (qna_results, qna_ms, program_results, program_ms, batch_ms)
+
+    d, t = results["difflib"], results["tfidf"]
+    report("QnA", d[0], d[1], t[0], t[1], t[4])
+    print(f"Program names")
+    print(f"  difflib   {d[3]:8.3f} ms/query  hits {sum(r is not None for r in d[2])}")
+    print(f"  tfidf     {t[3]:8.3f} ms/query  hits {sum(r is not None for r in t[2])}")
+    answered = [(a, b) for a, b in zip(d[2], t[2]) if a is not None]
+    agreement = sum(a == b for a, b in answered) / len(answered) if answered else 0.0
+    print(f"  top-1 agreement where difflib answered: {agreement:.1%} of {len(answered)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Wire size and server CPU of the largest process_query answers, as HTML
+and as structured JSON, uncompressed and with gzip / brotli.
+
+    python benchmarks/bench_payloads.py [--lscs 300] [--programmes 400] [--rounds 200]
+
+CPU is process time per request through the whole view with the
+response cache on (the steady state for these repeated queries) and off.
+"""
+import argparse
+import contextlib
+import io
+import json
+import time
+from unittest import mock
+
+from bench_fragments import RC_NAMES, sample_centers, sample_lscs
+from stubs import sample_programmes, setup_django
+
+QUERIES = ("list all lsc", "lsc under ernakulam", "list all programs", "regional centers")
+
+MODES = (
+    ("html", None),
+    ("html", "gzip"),
+    ("html", "br"),
+    ("structured", None),
+    ("structured", "gzip"),
+    ("structured", "br"),
+)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--programmes", type=int, default=400)
+    parser.add_argument("--lscs", type=int, default=300)
+    parser.add_argument("--rounds", type=int, default=200)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.test import RequestFactory, override_settings
+    from Chat.feeds import centers_snapshot, lsc_snapshot, programme_snapshot, qna_snapshot
+    from Chat.response_cache import response_cache
+    from Chat.views import process_query
+
+    factory = RequestFactory()
+
+    def measure(query, response_format, encoding):
+        payload = {"query": query}
+        if response_format == "structured":
+            payload["format"] = "structured"
+        headers = {"HTTP_ACCEPT_ENCODING": encoding} if encoding else {}
+        body = json.dumps(payload)
+        process_query(factory.post("/process_query", body, content_type="application/json", **headers))
+        start = time.process_time()
+        for _ in range(args.rounds):
+            response = process_query(factory.post("/process_query", body, content_type="application/json", **headers))
+        cpu = (time.process_time() - start) / args.rounds
+        return len(response.content), response.get("Content-Encoding", "identity"), cpu
+
+    patches = [
+        mock.patch.object(programme_snapshot, "loader", return_value=sample_programmes(args.programmes)),
+        mock.patch.object(qna_snapshot, "loader", return_value=[]),
+        mock.patch.object(centers_snapshot, "loader", return_value=sample_centers()),
+        mock.patch.object(lsc_snapshot, "loader", return_value=sample_lscs(args.lscs)),
+    ]
+    rows = []
+    with contextlib.ExitStack() as stack:
+        for patch in patches:
+            stack.enter_context(patch)
+        # process_query prints its progress; keep that out of the report
+        stack.enter_context(contextlib.redirect_stdout(io.StringIO()))
+        for query in QUERIES:
+            for response_format, encoding in MODES:
+                response_cache.clear()
+                size, sent_encoding, cached_cpu = measure(query, response_format, encoding)
+                with override_settings(CHAT_RESPONSE_CACHE_SIZE=0):
+                    _, _, uncached_cpu = measure(query, response_format, encoding)
+                rows.append((query, response_format, encoding or "identity", sent_encoding, size, cached_cpu, uncached_cpu))
+
+    print(f"{args.programmes} programmes, {len(RC_NAMES)} regional centers, {args.lscs} LSCs, {args.rounds} requests each")
+    print(f"  {'query':<20} {'format':<10} {'accept':<8} {'sent':<8} {'bytes':>8} {'cpu cached':>11} {'cpu uncached':>13}")
+    for query, response_format, accept, sent, size, cached_cpu, uncached_cpu in rows:
+        print(f"  {query:<20} {response_format:<10} {accept:<8} {sent:<8} {size:8d} "
+              f"{cached_cpu * 1000:8.3f} ms {uncached_cpu * 1000:10.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
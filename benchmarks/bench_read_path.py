@@ -0,0 +1,105 @@
+"""
+Read throughput of the program listings: the DRF serializers against the
+values() read path, for the whole table and for one 1000-row page, and
+the old per-row program_query against the joined, streamed one.
+
+    python benchmarks/bench_read_path.py [--programmes 50000] [--rounds 3]
+
+Runs against a throwaway on-disk SQLite test database filled through
+`sync` with sample_programmes().
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+from unittest import mock
+
+from stubs import sample_programmes, setup_django
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--programmes", type=int, default=50000)
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.db import connection
+    from django.http import JsonResponse
+    from django.test import Client, RequestFactory
+    from django.test.utils import setup_test_environment
+    from rest_framework import generics
+    from rest_framework.renderers import JSONRenderer
+    from Chat.models import Program
+    from Chat.sync import sync
+    from Chatbot.api.views import program_query
+    from api.rows import json_array_chunks, value_rows
+    from api.serializers import ProgramSerializer
+    from api.views import PROGRAM_READ_FIELDS, ProgramList
+
+    setup_test_environment()
+    workdir = tempfile.mkdtemp()
+    connection.settings_dict["TEST"]["NAME"] = os.path.join(workdir, "bench_read_path.sqlite3")
+    connection.creation.create_test_db(verbosity=0)
+    sync({"programmes": sample_programmes(args.programmes), "centers": [], "lsc": [], "qna": []})
+
+    def old_program_query(request):
+        programs = Program.objects.all()
+        data = [
+            {
+                'name': program.name,
+                'category': program.category.name,
+                'duration': program.duration,
+                'description': program.description
+            }
+            for program in programs
+        ]
+        return JsonResponse(data, safe=False)
+
+    def body(response):
+        return b"".join(response.streaming_content) if response.streaming else response.content
+
+    def timed(run):
+        timings = []
+        for _ in range(args.rounds):
+            queries = []
+            with connection.execute_wrapper(lambda execute, sql, *rest: queries.append(sql) or execute(sql, *rest)):
+                start = time.perf_counter()
+                size = len(run())
+                timings.append(time.perf_counter() - start)
+        return statistics.median(timings), len(queries), size
+
+    client = Client()
+    request = RequestFactory().get("/programs/")
+
+    def queryset():
+        return Program.objects.select_related("category").order_by("id")
+
+    cases = [
+        ("whole table, serializer",
+         lambda: JSONRenderer().render(ProgramSerializer(queryset(), many=True).data)),
+        ("whole table, values()",
+         lambda: b"".join(json_array_chunks(value_rows(queryset(), PROGRAM_READ_FIELDS)))),
+        ("1000-row page, serializer", None),
+        ("1000-row page, values()",
+         lambda: client.get("/api/programs/?page_size=1000").content),
+        ("program_query, per row", lambda: body(old_program_query(request))),
+        ("program_query, joined", lambda: body(program_query(request))),
+    ]
+
+    print(f"{args.programmes} programmes, median of {args.rounds} runs")
+    for label, run in cases:
+        if run is None:
+            with mock.patch.object(ProgramList, "list", generics.ListAPIView.list):
+                seconds, queries, size = timed(lambda: client.get("/api/programs/?page_size=1000").content)
+        else:
+            seconds, queries, size = timed(run)
+        rows = args.programmes if "page" not in label else 1000
+        print(f"  {label:<28} {seconds * 1000:9.1f} ms   {rows / seconds:9.0f} rows/s"
+              f"   {queries:6d} queries   {size:10d} bytes")
+    connection.creation.destroy_test_db(connection.settings_dict["TEST"]["NAME"], verbosity=0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Intent routing cost per query: the old per-list any() scans vs the compiled router.
+
+    python benchmarks/bench_router.py [--rounds 2000]
+"""
+import argparse
+import re
+import time
+
+from stubs import setup_django
+
+QUERIES = [
+    "List all programs", "Our Regional Centers", "How long is the BA program?",
+    "What are the admission requirements?", "lsc under regional center kozhikode",
+    "fee structure for ba english", "list pg programs", "show me four year honours courses",
+    "category of ma history", "what is the full form of sgou", "ma history", "3",
+    "Can you tell me which learning support centers are available near Thrissur for the MA English programme?",
+]
+
+
+def legacy_route(normalized_query):
+    """The routing work process_query did before the compiled router."""
+    from Chat import router
+    flags = {
+        "program": any(k in normalized_query for k in router.PROGRAM_KEYWORDS),
+        "category": any(k in normalized_query for k in router.CATEGORY_KEYWORDS),
+        "center": any(k in normalized_query for k in router.CENTER_KEYWORDS),
+        "lsc": any(k in normalized_query for k in router.LSC_KEYWORDS)
+        or re.search(r"lsc(?:'s)? under regional center ([\w\s]+)", normalized_query),
+        "fee": any(k in normalized_query for k in router.FEE_KEYWORDS),
+        "field": any(k in normalized_query for k in router.FIELD_KEYWORDS)
+        and ('of' in normalized_query or 'for' in normalized_query),
+        "list": any(w in normalized_query for w in router.LIST_WORDS),
+        "count": any(w in normalized_query for w in router.PROGRAM_COUNT_PHRASES),
+    }
+    category = None
+    for key in sorted(router.CATEGORY_ALIASES.keys(), key=len, reverse=True):
+        if key in normalized_query:
+            category = router.CATEGORY_ALIASES[key]
+            break
+    fee = re.search(r"(?:fee structure|fees|cost)\s+(?:for|of)\s+([\w\s]+)", normalized_query)
+    rc = re.search(r"lsc(?:'s)? under (.*)", normalized_query, re.IGNORECASE)
+    return flags, category, fee, rc
+
+
+def bench(label, fn, queries, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for query in queries:
+            fn(query)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<16} {elapsed * 1e6 / (rounds * len(queries)):8.2f} us/query")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rounds", type=int, default=2000)
+    args = parser.parse_args()
+
+    setup_django()
+    from Chat.router import route
+
+    queries = [q.lower() for q in QUERIES]
+    print(f"{len(queries)} queries x {args.rounds} rounds")
+    bench("any() scans", legacy_route, queries, args.rounds)
+    bench("compiled router", route, queries, args.rounds)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+"""
+Conversation state cost of program listings: bytes stored per
+conversation and database time per request for "list all programs"
+followed by a numeric follow-up.
+
+    python benchmarks/bench_session.py [--programmes 120] [--rounds 50]
+
+Two runs against a throwaway on-disk SQLite test database:
+
+  legacy  how process_query kept state before: the listed program dicts
+          (descriptions included) in the database-backed Django session,
+          read and rewritten on every message.
+  cache   the ConversationState in CHAT_STATE_CACHE: program references
+          only, and no database queries.
+"""
+import argparse
+import os
+import pickle
+import random
+import statistics
+import tempfile
+import time
+from unittest import mock
+
+from stubs import sample_programmes, setup_django
+
+
+WORDS = (
+    "learning open distance university programme course students study regional centre semester "
+    "examination english malayalam history economics commerce science mathematics literature "
+    "language culture society research project credit assignment counselling degree kerala"
+).split()
+
+
+def varied_programmes(count):
+    """sample_programmes() with descriptions that don't compress away."""
+    rng = random.Random(3)
+    programmes = sample_programmes(count)
+    for programme in programmes:
+        programme["pgm_desc"] = " ".join(rng.choice(WORDS) for _ in range(rng.randint(30, 80))).capitalize() + "."
+    return programmes
+
+
+class QueryTimer:
+    """connection.execute_wrapper that adds up the time spent in the database."""
+
+    def __init__(self):
+        self.seconds = 0.0
+        self.queries = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - start
+            self.queries += 1
+
+
+def legacy_session(programmes):
+    """load_state/save_state replacements that keep state the old way, in database sessions."""
+    from django.contrib.sessions.backends.db import SessionStore
+    from django.contrib.sessions.models import Session
+    from Chat.conversation import ConversationState, program_ref
+
+    by_ref = {program_ref(program): program for program in programmes}
+    known = set()
+
+    class SessionState(ConversationState):
+        __slots__ = ()
+
+        def update(self, **fields):
+            super().update(**fields)
+            self.changed = True  # assigning to request.session always marked it modified
+
+    def load_state(conversation_id):
+        data = SessionStore(conversation_id).load() if conversation_id else None
+        if data:
+            known.add(conversation_id)
+        return SessionState.from_dict(data) if data else SessionState()
+
+    def save_state(conversation_id, state):
+        # What SessionStore.save() writes: an UPDATE of the row, or an INSERT for a new session
+        data = {**state.to_dict(), "programs": [by_ref[ref] for ref in (state.last_list or {}).get("refs", [])]}
+        store = SessionStore()
+        row = {"session_data": store.encode(data), "expire_date": store.get_expiry_date()}
+        if conversation_id in known:
+            Session.objects.filter(session_key=conversation_id).update(**row)
+        else:
+            Session.objects.create(session_key=conversation_id, **row)
+            known.add(conversation_id)
+        state.changed = False
+
+    return load_state, save_state
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--programmes", type=int, default=120)
+    parser.add_argument("--rounds", type=int, default=50)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.contrib.sessions.models import Session
+    from django.db import connection
+    from django.test import Client
+    from django.test.utils import setup_test_environment
+    from Chat import conversation
+    from Chat.feeds import programme_snapshot, qna_snapshot
+    from Chat.response_cache import response_cache
+
+    setup_test_environment()
+    workdir = tempfile.mkdtemp()
+    connection.settings_dict["TEST"]["NAME"] = os.path.join(workdir, "bench_session.sqlite3")
+    connection.creation.create_test_db(verbosity=0)
+    programmes = varied_programmes(args.programmes)
+
+    def run():
+        client = Client()
+        per_query = {"list all programs": [], "1": []}
+        for _ in range(args.rounds):
+            response_cache.clear()
+            for query, samples in per_query.items():
+                timer = QueryTimer()
+                start = time.perf_counter()
+                with connection.execute_wrapper(timer):
+                    client.post("/process_query", {"query": query}, content_type="application/json")
+                samples.append((timer.seconds, timer.queries, time.perf_counter() - start))
+        return client.cookies[conversation.cookie_name()].value, per_query
+
+    def report(label, stored, per_query):
+        print(f"{label}: {stored} bytes stored per conversation")
+        for query, samples in per_query.items():
+            print(f"  {query!r:22} db {statistics.median(s[0] for s in samples) * 1000:7.3f} ms  "
+                  f"{statistics.median(s[1] for s in samples):.0f} queries  "
+                  f"request {statistics.median(s[2] for s in samples) * 1000:7.3f} ms")
+
+    with mock.patch.object(programme_snapshot, "loader", return_value=programmes), \
+            mock.patch.object(qna_snapshot, "loader", return_value=[]):
+        print(f"{args.programmes} programmes, {args.rounds} rounds")
+        load_state, save_state = legacy_session(programmes)
+        with mock.patch.object(conversation, "load_state", load_state), \
+                mock.patch.object(conversation, "save_state", save_state):
+            session_key, per_query = run()
+        report("legacy (database session)", len(Session.objects.get(session_key=session_key).session_data), per_query)
+
+        conversation_id, per_query = run()
+        stored = len(pickle.dumps(conversation.state_cache().get(f"chat:{conversation_id}")))
+        report(f"cache (ConversationState, {len(conversation_id)}-byte cookie)", stored, per_query)
+        connection.creation.destroy_test_db(connection.settings_dict["TEST"]["NAME"], verbosity=0)
+
+
+if __name__ == "__main__":
+    main()
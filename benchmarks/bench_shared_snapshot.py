@@ -0,0 +1,107 @@
+"""
+Memory of the programme feed across worker processes: every worker parsing
+the JSON into its own dicts, against one shared snapshot file that every
+worker maps. Also measures how long a refresh written by one worker takes
+to be seen by another.
+
+    python benchmarks/bench_shared_snapshot.py [--programmes 50000] [--workers 4]
+
+Workers are forked, as gunicorn does, after the parent has imported
+everything. Memory is read from /proc/self/smaps_rollup (Linux only):
+Private is what the feed costs each worker, Pss splits shared pages
+between the processes that map them.
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+from stubs import sample_programmes, setup_django
+
+
+def memory_kb():
+    fields = {}
+    with open("/proc/self/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == "kB":
+                fields[parts[0].rstrip(":")] = int(parts[1])
+    return fields["Private_Clean"] + fields["Private_Dirty"], fields["Pss"]
+
+
+def run_workers(count, load):
+    """Fork `count` workers that each load() the feed and read every record; returns their (private, pss) growth."""
+    pipes = []
+    for _ in range(count):
+        read_end, write_end = os.pipe()
+        if os.fork() == 0:
+            os.close(read_end)
+            before = memory_kb()
+            records = load()
+            names = sum(len(record["pgm_name"]) for record in records)  # touch every record, as a search does
+            after = memory_kb()
+            os.write(write_end, json.dumps([after[0] - before[0], after[1] - before[1], names]).encode())
+            os._exit(0)
+        os.close(write_end)
+        pipes.append(read_end)
+    results = []
+    for read_end in pipes:
+        with os.fdopen(read_end) as f:
+            results.append(json.loads(f.read()))
+        os.wait()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--programmes", type=int, default=50000)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    setup_django()
+    from Chat.shared_snapshot import MappedSnapshot, SharedFeedFile
+
+    feed = json.dumps(sample_programmes(args.programmes))
+    directory = tempfile.mkdtemp()
+    shared = SharedFeedFile(directory, "programmes")
+    with shared.locked():
+        shared.publish(json.loads(feed))
+    size = os.path.getsize(shared.path)
+
+    print(f"{args.programmes} programmes ({len(feed) / 1e6:.1f} MB of JSON, {size / 1e6:.1f} MB snapshot),"
+          f" {args.workers} workers")
+    cases = [
+        ("parsed per worker", lambda: json.loads(feed)),
+        ("shared snapshot", lambda: MappedSnapshot(shared.path).records),
+    ]
+    for label, load in cases:
+        results = run_workers(args.workers, load)
+        private = sum(result[0] for result in results) / len(results)
+        pss = sum(result[1] for result in results) / len(results)
+        print(f"  {label:<18} private {private / 1024:7.1f} MB/worker   pss {pss / 1024:7.1f} MB/worker"
+              f"   {private * args.workers / 1024:7.1f} MB for all workers")
+
+    # One worker publishes a new generation; another notices on its next access
+    reader = SharedFeedFile(directory, "programmes")
+    writer = SharedFeedFile(directory, "programmes")
+    records = json.loads(feed)
+    timings = []
+    for i in range(args.rounds):
+        records[0]["pgm_name"] = f"Renamed {i}"
+        start = time.perf_counter()
+        with writer.locked():
+            generation = writer.publish(records).generation
+        published = time.perf_counter()
+        while reader.current().generation != generation:
+            pass
+        timings.append((published - start, time.perf_counter() - published))
+    timings.sort(key=lambda timing: timing[1])
+    publish_ms = sorted(timing[0] for timing in timings)[len(timings) // 2] * 1000
+    seen_ms = timings[len(timings) // 2][1] * 1000
+    print(f"  refresh: publish {publish_ms:.1f} ms, seen by the other worker {seen_ms:.3f} ms later (median)")
+
+
+if __name__ == "__main__":
+    main()
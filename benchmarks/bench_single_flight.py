@@ -0,0 +1,72 @@
+"""
+Thundering herd on a cold feed: many threads needing the programme list at
+the moment it has to be fetched, with and without single-flight coalescing.
+
+    python benchmarks/bench_single_flight.py [--threads 64] [--delay 0.5]
+
+"uncoalesced" has every thread call the feed loader itself, which is what
+each request did when the cache was empty. The stub upstream sleeps
+--delay seconds per request.
+"""
+import argparse
+import threading
+import time
+from unittest import mock
+
+from stubs import StubServer, sample_programmes, setup_django
+
+
+def herd(fn, threads):
+    barrier = threading.Barrier(threads)
+    timings = []
+    lock = threading.Lock()
+
+    def run():
+        barrier.wait()
+        start = time.perf_counter()
+        fn()
+        with lock:
+            timings.append(time.perf_counter() - start)
+
+    workers = [threading.Thread(target=run) for _ in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return sorted(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--threads", type=int, default=64)
+    parser.add_argument("--delay", type=float, default=0.5)
+    args = parser.parse_args()
+
+    setup_django()
+    from Chat import feeds
+    from program_model import ProgramModel
+
+    routes = {"/api/programmes": {"programme": sample_programmes(2000)}}
+    with StubServer(routes, delay=args.delay) as server:
+        url = f"{server.url}/api/programmes"
+        print(f"{args.threads} threads, upstream answering in {args.delay * 1000:.0f} ms")
+        with mock.patch.object(feeds, "UNIVERSITY_API_URL", url):
+            model = ProgramModel()
+            model.api_url = url
+            cases = [
+                ("uncoalesced", feeds.load_programmes),
+                ("programme snapshot", feeds.programme_snapshot.get),
+                ("ProgramModel", model.fetch_programs),
+            ]
+            for label, fn in cases:
+                feeds.programme_snapshot.invalidate()
+                server.requests = 0
+                timings = herd(fn, args.threads)
+                p50 = timings[len(timings) // 2]
+                p99 = timings[min(len(timings) - 1, int(len(timings) * 0.99))]
+                print(f"  {label:<20} {server.requests:4d} upstream requests   "
+                      f"p50 {p50 * 1000:7.1f} ms   p99 {p99 * 1000:7.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""
+Time to first token: /process_query (blocking) vs /process_query_stream (SSE).
+
+    python benchmarks/bench_streaming.py [--tokens 200] [--interval 0.01] [--runs 5]
+
+A local fake Groq generates `--tokens` pieces, one every `--interval`
+seconds, streamed or all at once depending on the request. "hi" goes to
+the Groq fallback. The completion cache is disabled so every run reaches
+the fake.
+"""
+import argparse
+import statistics
+import time
+from unittest import mock
+
+from stubs import FakeCompletion, StubServer, sample_programmes, setup_django
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--tokens", type=int, default=200)
+    parser.add_argument("--interval", type=float, default=0.01)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.test import Client, override_settings
+    from django.test.utils import setup_test_environment
+    from Chat import views
+    from Chat.feeds import programme_snapshot, qna_snapshot
+
+    setup_test_environment()
+    client = Client()
+    completion = FakeCompletion([f"word{i} " for i in range(args.tokens)], args.interval)
+    with StubServer({"/chat/completions": completion}) as groq, \
+            mock.patch.object(views, "GROQ_API_URL", f"{groq.url}/chat/completions"), \
+            mock.patch.object(programme_snapshot, "loader", return_value=sample_programmes()), \
+            mock.patch.object(qna_snapshot, "loader", return_value=[]), \
+            override_settings(CHAT_COMPLETION_CACHE_ENABLED=False):
+        print(f"{args.tokens} tokens at {args.interval * 1000:.0f} ms each, {args.runs} runs\n")
+        for label, path in (("blocking", "/process_query"), ("streaming", "/process_query_stream")):
+            first, total = [], []
+            for _ in range(args.runs):
+                start = time.perf_counter()
+                response = client.post(path, {"query": "hi"}, content_type="application/json")
+                if response.streaming:
+                    chunks = iter(response.streaming_content)
+                    next(chunks)
+                    first.append(time.perf_counter() - start)
+                    for _ in chunks:
+                        pass
+                else:
+                    response.content
+                    first.append(time.perf_counter() - start)
+                total.append(time.perf_counter() - start)
+            print(f"{label:<10} first token {statistics.median(first) * 1000:8.1f} ms   "
+                  f"complete {statistics.median(total) * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
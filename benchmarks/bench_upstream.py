@@ -0,0 +1,43 @@
+"""
+Connection reuse: bare requests.get vs the pooled upstream client.
+
+    python benchmarks/bench_upstream.py [--requests 500] [--threads 8]
+"""
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from stubs import StubServer, sample_programmes, setup_django
+
+
+def run(label, call, url, total, threads, server):
+    server.connections = 0
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        for response in pool.map(lambda _: call(url), range(total)):
+            response.raise_for_status()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<18} {elapsed * 1000 / total:8.3f} ms/request  "
+          f"{total / elapsed:9.1f} req/s  {server.connections:5d} TCP connections")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--threads", type=int, default=8)
+    args = parser.parse_args()
+
+    setup_django()
+    from Chat.upstream import client
+
+    with StubServer({"/api/programmes": {"programme": sample_programmes()}}) as server:
+        url = f"{server.url}/api/programmes"
+        print(f"{args.requests} GETs against {url} from {args.threads} threads")
+        run("requests.get", lambda u: requests.get(u, timeout=10), url, args.requests, args.threads, server)
+        run("pooled client", lambda u: client.get("programmes", u), url, args.requests, args.threads, server)
+
+
+if __name__ == "__main__":
+    main()
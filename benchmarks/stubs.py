@@ -0,0 +1,159 @@
+"""
+Local stand-ins for the SGOU and Groq APIs used by the benchmarks.
+"""
+import json
+import os
+import socket
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def setup_django():
+    """Make the project importable and configure Django settings."""
+    if ROOT not in sys.path:
+        sys.path.insert(0, ROOT)
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "Chatbot.settings")
+    import django
+    from django.conf import settings
+
+    # Benchmarks fill the feeds with stub data; keep it out of any persisted snapshots
+    settings.CHAT_SNAPSHOT_PERSIST_DIR = None
+    django.setup()
+
+
+def sample_programmes(count=120):
+    categories = ["UG", "PG", "FYUG", "STP"]
+    return [
+        {
+            "id": i,
+            "pgm_name": f"Programme {i} in Subject {i % 17}",
+            "pgm_desc": "A programme offered through open and distance learning. " * 4,
+            "pgm_category": categories[i % len(categories)],
+            "pgm_year": str(1 + i % 4),
+        }
+        for i in range(1, count + 1)
+    ]
+
+
+class FakeCompletion:
+    """
+    A Groq chat completion generated at a fixed pace. Requests with
+    "stream": true get OpenAI-style SSE chunks, one piece every `interval`
+    seconds; other requests wait for the whole answer and get it as JSON.
+    """
+
+    def __init__(self, pieces, interval=0.02):
+        self.pieces = pieces
+        self.interval = interval
+
+    def reply(self, handler, request_body):
+        if json.loads(request_body or b"{}").get("stream"):
+            # Chunked transfer encoding, one SSE event per chunk, as Groq sends it
+            handler.send_response(200)
+            handler.send_header("Content-Type", "text/event-stream")
+            handler.send_header("Transfer-Encoding", "chunked")
+            handler.end_headers()
+
+            def write_chunk(data):
+                handler.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+                handler.wfile.flush()
+
+            for piece in self.pieces:
+                threading.Event().wait(self.interval)
+                chunk = {"choices": [{"delta": {"content": piece}}]}
+                write_chunk(f"data: {json.dumps(chunk)}\n\n".encode())
+            write_chunk(b"data: [DONE]\n\n")
+            handler.wfile.write(b"0\r\n\r\n")
+            return
+        threading.Event().wait(self.interval * len(self.pieces))
+        body = json.dumps({"choices": [{"message": {"content": "".join(self.pieces)}}]}).encode()
+        handler.send_response(200)
+        handler.send_header("Content-Type", "application/json")
+        handler.send_header("Content-Length", str(len(body)))
+        handler.end_headers()
+        handler.wfile.write(body)
+
+
+class StubServer:
+    """
+    Threaded HTTP/1.1 server answering GET/POST with canned JSON bodies.
+
+    `routes` maps a path to a JSON-serializable body, or to an object with
+    a `reply(handler, request_body)` method (see FakeCompletion) that
+    writes the response itself. `delay` (seconds) is slept before each
+    response to mimic upstream latency. The number of distinct TCP
+    connections accepted is kept in `connections`, the number of requests
+    answered in `requests`.
+    """
+
+    def __init__(self, routes, delay=0.0):
+        self.routes = {
+            path: body if hasattr(body, "reply") else json.dumps(body).encode()
+            for path, body in routes.items()
+        }
+        self.delay = delay
+        self.connections = 0
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address
+        return f"http://{host}:{port}"
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def setup(self):
+                super().setup()
+                self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                with stub._lock:
+                    stub.connections += 1
+
+            def _reply(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                request_body = self.rfile.read(length) if length else b""
+                with stub._lock:
+                    stub.requests += 1
+                body = stub.routes.get(self.path.split("?")[0])
+                if stub.delay:
+                    threading.Event().wait(stub.delay)
+                if hasattr(body, "reply"):
+                    body.reply(self, request_body)
+                    return
+                if body is None:
+                    self.send_response(404)
+                    body = b"{}"
+                else:
+                    self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            do_GET = _reply
+            do_POST = _reply
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def __enter__(self):
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
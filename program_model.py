@@ -1,8 +1,13 @@
+import logging
+import threading
 import requests
 import json
+from Chat.upstream import client as upstream
 from typing import Dict, List, Optional
 from datetime import datetime, timedelta
 
+logger = logging.getLogger('chatbot')
+
 class ProgramModel:
     def __init__(self):
         self.api_url = 'https://sgou.ac.in/api/programmes'
@@ -10,6 +15,7 @@ class ProgramModel:
         self.cache = {}
         self.cache_duration = timedelta(minutes=5)
         self.last_fetch = None
+        self._lock = threading.Lock()
 
     def _is_cache_valid(self) -> bool:
         """Check if the cached data is still valid."""
@@ -17,27 +23,33 @@ class ProgramModel:
             return False
         return datetime.now() - self.last_fetch < self.cache_duration
 
+    def _download(self) -> Optional[List[Dict]]:
+        headers = {'X-API-KEY': self.api_key}
+        response = upstream.get('programmes', self.api_url, headers=headers)
+        response.raise_for_status()
+        return response.json().get('programme')
+
     def fetch_programs(self) -> List[Dict]:
-        """Fetch programs from API with caching."""
+        """
+        Fetch programs from API with caching. Concurrent callers share one
+        download; if it fails or takes too long, the last programs are returned.
+        """
         if self._is_cache_valid():
             return self.cache.get('programs', [])
 
         try:
-            headers = {'X-API-KEY': self.api_key}
-            response = requests.get(self.api_url, headers=headers)
-            response.raise_for_status()
-            data = response.json()
-            
-            if 'programme' in data:
-                self.cache['programs'] = data['programme']
-                self.last_fetch = datetime.now()
-                return self.cache['programs']
-            return []
-
+            programs = upstream.coalesce('programmes', self.api_url, self._download)
         except requests.exceptions.RequestException as e:
-            print(f'Error fetching programs: {str(e)}')
+            logger.warning('Error fetching programs: %s', e)
             return self.cache.get('programs', [])
 
+        if programs is None:
+            return []
+        with self._lock:
+            self.cache = {'programs': programs}
+            self.last_fetch = datetime.now()
+        return programs
+
     def get_program_by_name(self, name: str) -> Optional[Dict]:
         """Find a program by its name."""
         programs = self.fetch_programs()
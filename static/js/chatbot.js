@@ -274,6 +274,129 @@ document.addEventListener('DOMContentLoaded', function () {
         }
     }
 
+    function escapeHtml(value) {
+        return String(value ?? 'N/A')
+            .replace(/&/g, '&amp;')
+            .replace(/</g, '&lt;')
+            .replace(/>/g, '&gt;')
+            .replace(/"/g, '&quot;')
+            .replace(/'/g, '&#39;');
+    }
+
+    // A collapsible entry; toggleDropdown() opens the details under a header
+    function dropdownItem(kind, title, details) {
+        const rows = details
+            .map(([label, value]) => `<strong>${label}:</strong> ${value}`)
+            .join('<br>');
+        return `<div class="${kind}-item"><div class="${kind}-header" onclick="toggleDropdown(this)">`
+            + `<span class="${kind}-title">${escapeHtml(title)}</span><span class="${kind}-arrow">&#9660;</span></div>`
+            + `<div class="${kind}-details" style="display:none;">${rows}</div></div>`;
+    }
+
+    function mailLink(email) {
+        const address = escapeHtml(email);
+        return `<a href="mailto:${address}">${address}</a>`;
+    }
+
+    // Templates for the typed payloads /process_query sends when asked for "format": "structured"
+    const responseTemplates = {
+        rc_list: data => `${escapeHtml(data.title)}<ol>` + data.items.map(center => '<li>' + dropdownItem('rc', center.name, [
+            ['Address', escapeHtml(center.address)],
+            ['RC Director', escapeHtml(center.director)],
+            ['Number', escapeHtml(center.phone)],
+            ['Email', mailLink(center.email)],
+        ]) + '</li>').join('') + '</ol>',
+        lsc_list: data => `${escapeHtml(data.title)}<br><br>` + data.items.map(lsc => dropdownItem('lsc', lsc.name, [
+            ['Address', escapeHtml(lsc.address)],
+            ['Contact', escapeHtml(lsc.phone)],
+            ['Coordinator', escapeHtml(lsc.coordinator)],
+            ['Email', mailLink(lsc.email)],
+            ['RC ID', escapeHtml(lsc.rc_id)],
+            ['RC Name', escapeHtml(lsc.rc_name)],
+        ])).join(''),
+        program_list: data => `${escapeHtml(data.title)}<ol>`
+            + data.items.map(name => `<li>${escapeHtml(name)}</li>`).join('')
+            + `</ol><p>${escapeHtml(data.footer)}</p>`,
+    };
+
+    // Turn a /process_query JSON payload into the text to display
+    function responseTextFor(data) {
+        if (data.type && responseTemplates[data.type]) {
+            return responseTemplates[data.type](data);
+        } else if (data.answer) {
+            return data.answer;
+        } else if (data.programs && Array.isArray(data.programs)) {
+            // Format numbered list with details
+            let responseText = 'Here are the programs offered at Sreenarayanaguru Open University:<br><ol>';
+            data.programs.forEach(prog => {
+                responseText += `<li><strong>${prog.name}</strong> - Duration: ${prog.duration}</li>`;
+            });
+            responseText += '</ol>';
+            return responseText;
+        } else if (data.message) {
+            return data.message;
+        }
+        return 'Sorry, I could not process your query at this time.';
+    }
+
+    // POST a query to /process_query_stream and dispatch each Server-Sent Event
+    // ("message", "token", "error", "done") to the matching handler
+    function streamQuery(query, handlers) {
+        const request = {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ query: query, format: 'structured' }),
+        };
+
+        // Browsers without readable fetch streams get the whole answer at once
+        if (!window.ReadableStream || !window.TextDecoder) {
+            return fetch('/process_query', request)
+                .then(response => response.json())
+                .then(data => handlers.message(data));
+        }
+
+        return fetch('/process_query_stream', request).then(response => {
+            if (!response.ok || !response.body) {
+                throw new Error(`HTTP error! status: ${response.status}`);
+            }
+            const reader = response.body.getReader();
+            const decoder = new TextDecoder();
+            let buffer = '';
+
+            function dispatch(block) {
+                let event = 'message';
+                const dataLines = [];
+                block.split('\n').forEach(line => {
+                    if (line.startsWith('event:')) {
+                        event = line.slice(6).trim();
+                    } else if (line.startsWith('data:')) {
+                        dataLines.push(line.slice(5).trim());
+                    }
+                });
+                if (dataLines.length && handlers[event]) {
+                    handlers[event](JSON.parse(dataLines.join('\n')));
+                }
+            }
+
+            function read() {
+                return reader.read().then(({ done, value }) => {
+                    if (done) {
+                        if (buffer.trim()) dispatch(buffer);
+                        return;
+                    }
+                    buffer += decoder.decode(value, { stream: true });
+                    let boundary;
+                    while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                        dispatch(buffer.slice(0, boundary));
+                        buffer = buffer.slice(boundary + 2);
+                    }
+                    return read();
+                });
+            }
+            return read();
+        });
+    }
+
     // Send message functionality - UPDATED
     function sendMessage() {
         const messageText = messageInput.value.trim();
@@ -298,54 +421,46 @@ document.addEventListener('DOMContentLoaded', function () {
 
         const startTime = Date.now(); // Record start time
 
-        fetch('/process_query', {
-            method: 'POST',
-            headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({ query: messageText }),
-        })
-        .then(response => response.json())
-        .then(data => {
-            let responseText;
-            
-            if (data.answer) {
-                responseText = data.answer;
-            } else if (data.programs && Array.isArray(data.programs)) {
-                // Format numbered list with details
-                responseText = 'Here are the programs offered at Sreenarayanaguru Open University:<br><ol>';
-                data.programs.forEach(prog => {
-                    responseText += `<li><strong>${prog.name}</strong> - Duration: ${prog.duration}</li>`;
-                });
-                responseText += '</ol>';
-            } else if (data.message) {
-                responseText = data.message;
-            } else {
-                responseText = 'Sorry, I could not process your query at this time.';
+        function removeAnimation() {
+            if (clonedBouncingBallAnimation) {
+                clonedBouncingBallAnimation.remove();
+                clonedBouncingBallAnimation = null;
             }
+        }
 
+        // Keep the animation up for at least a second for answers that arrive in one piece
+        function showFinalText(text) {
             const elapsedTime = Date.now() - startTime;
             const minAnimationDisplayTime = 1000; // Minimum 1 second display for animation
             const timeToWait = Math.max(0, minAnimationDisplayTime - elapsedTime);
 
             setTimeout(() => {
-                updateMessage(processingMessage, responseText);
-                if (clonedBouncingBallAnimation) {
-                    clonedBouncingBallAnimation.remove();
-                }
+                updateMessage(processingMessage, text);
+                removeAnimation();
             }, timeToWait);
+        }
+
+        // Streamed LLM tokens are rendered as soon as they arrive
+        let streamedText = '';
+        function appendToken(token) {
+            removeAnimation();
+            streamedText += token;
+            processingMessage.innerHTML = formatProgramList(streamedText);
+            messagesContainer.scrollTop = messagesContainer.scrollHeight;
+        }
+
+        streamQuery(messageText, {
+            message: data => showFinalText(responseTextFor(data)),
+            token: data => appendToken(data.content),
+            error: data => showFinalText(data.message),
         })
-        
         .catch(error => {
             console.error('Error:', error);
-            const elapsedTime = Date.now() - startTime;
-            const minAnimationDisplayTime = 1000;
-            const timeToWait = Math.max(0, minAnimationDisplayTime - elapsedTime);
-
-            setTimeout(() => {
-                updateMessage(processingMessage, 'There was an error processing your request. Please try again.');
-                if (clonedBouncingBallAnimation) {
-                    clonedBouncingBallAnimation.remove();
-                }
-            }, timeToWait);
+            if (streamedText) {
+                removeAnimation();
+                return;
+            }
+            showFinalText('There was an error processing your request. Please try again.');
         });
     }
     window.sendMessage = sendMessage;